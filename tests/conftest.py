@@ -0,0 +1,11 @@
+import xml.etree.ElementTree as ETree
+
+import pytest
+
+from xpath_core import XmlDocument, XmlNode
+
+@pytest.fixture
+def parseDocument():
+    def parse(text, *, filePath = "test.xml") -> XmlDocument:
+        return XmlDocument(filePath=filePath, root=XmlNode.fromElement(ETree.fromstring(text)))
+    return parse
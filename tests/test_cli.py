@@ -0,0 +1,75 @@
+import os
+import subprocess
+import sys
+
+import pytest
+
+from xpath_cli import EXIT_FAILED, EXIT_OK, getPatchTarget, main
+
+ITEMS = """<items>
+    <item name="gunPistol"><property name="Stacknumber" value="1"/></item>
+    <item name="resourceWood"><property name="Stacknumber" value="500"/></item>
+</items>"""
+
+PATCH = """<configs>
+    <set xpath="/items/item[@name='resourceWood']/property[@name='Stacknumber']/@value">1000</set>
+    <append xpath="/items"><item name="resourceStone"/></append>
+</configs>"""
+
+@pytest.fixture
+def gameRoot(tmp_path):
+    configFolder = tmp_path / "Data" / "Config"
+    configFolder.mkdir(parents=True)
+    (configFolder / "items.xml").write_text(ITEMS)
+    (configFolder / "blocks.xml").write_text("<blocks><block name='air'/></blocks>")
+    modConfigFolder = tmp_path / "Mods" / "BigStacks" / "Config"
+    modConfigFolder.mkdir(parents=True)
+    (modConfigFolder / "items.xml").write_text(PATCH)
+    return tmp_path
+
+def run(gameRoot, *arguments) -> int:
+    return main(["--game-root", str(gameRoot), "--no-cache", *arguments])
+
+def testMissingConfigFolder(tmp_path, capsys):
+    assert run(tmp_path, "load") == EXIT_FAILED
+    assert "No readable config folder" in capsys.readouterr().err
+
+def testLoad(gameRoot, capsys):
+    assert run(gameRoot, "load") == EXIT_OK
+    assert capsys.readouterr().out.startswith("2 files loaded, 0 failed")
+    (gameRoot / "Data" / "Config" / "broken.xml").write_text("<items>")
+    assert run(gameRoot, "load") == EXIT_FAILED
+    assert capsys.readouterr().out.startswith("broken.xml: ")
+
+def testQuery(gameRoot, capsys):
+    assert run(gameRoot, "query", "//property/@value") == EXIT_OK
+    assert capsys.readouterr().out.splitlines() == [
+        "items.xml: /items/item[1]/property[1]/@value = 1",
+        "items.xml: /items/item[2]/property[1]/@value = 500",
+    ]
+    assert run(gameRoot, "query", "--mods", "--limit", "1", "//item[@name='resourceWood']/property/@value") == EXIT_OK
+    assert capsys.readouterr().out.splitlines() == ["items.xml: /items/item[2]/property[1]/@value = 1000"]
+    assert run(gameRoot, "query", "//block[@name='missing']") == EXIT_FAILED
+    assert run(gameRoot, "query", "//item[") == EXIT_FAILED
+    assert "Invalid XPath" in capsys.readouterr().err
+
+def testApplyAndDiffPrintTheChanges(gameRoot, capsys):
+    expected = [
+        "+ items.xml: /items/item[3]",
+        "~ items.xml: /items/item[2]/property[1]/@value: '500' -> '1000'",
+    ]
+    assert run(gameRoot, "apply", str(gameRoot / "Mods" / "BigStacks" / "Config" / "items.xml")) == EXIT_OK
+    assert capsys.readouterr().out.splitlines() == expected
+    assert run(gameRoot, "diff") == EXIT_OK
+    assert capsys.readouterr().out.splitlines() == expected
+
+def testPatchTarget():
+    assert getPatchTarget(os.path.join("Mods", "A", "Config", "XUi", "windows.xml")) == "XUi/windows.xml"
+    assert getPatchTarget("items.xml") == "items.xml"
+
+def testStartsWithoutTheCoreOrTkinter():
+    #--help and argument errors must not pay for the core's imports
+    code = "import sys, xpath_cli; xpath_cli.createArgumentParser(); print(sorted({'xpath_core', 'tkinter'} & set(sys.modules)))"
+    output = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True,
+                            cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__)))).stdout
+    assert output.strip() == "[]"
@@ -0,0 +1,150 @@
+import pytest
+
+from xpath_core import (BulkEdit, BulkEditError, BulkTransform, EditOverlay, EditSet, InheritanceResolver, ModPatchApplier, ModPatchFile, ModPatchWriter,
+                        XmlModification, flattenXmlTree, streamXmlDocument)
+
+ITEMS = """<items>
+    <item name="a"><property name="Stacknumber" value="10"/><property class="Action0"><property name="Delay" value="1"/></property></item>
+    <item name="b"><property name="Stacknumber" value="20"/></item>
+    <item name="c"><property name="Stacknumber" value="40"/></item>
+    <item name="c"><property name="Stacknumber" value="10"/></item>
+</items>"""
+
+@pytest.mark.parametrize("text, expected", [
+    ("set 7", ["7", "7", "7", "7"]),
+    ("scale 0.5", ["2.5", "25.25", "-1.5", "a,b"]),
+    ("clamp 0 *", ["5", "50.5", "0", "a,b"]),
+    ("clamp * 10", ["5", "10", "-3", "a,b"]),
+    ("replace |a|b|", ["5", "50.5", "-3", "b,b"]),
+])
+def testBulkTransforms(text, expected):
+    #scale and clamp leave values that are not plain numbers alone
+    assert BulkTransform(text).apply(["5", "50.5", "-3", "a,b"]) == expected
+
+@pytest.mark.parametrize("text", ["", "bogus 1", "scale x", "clamp 1", "replace /a/"])
+def testInvalidBulkTransforms(text):
+    with pytest.raises(BulkEditError):
+        BulkTransform(text)
+
+def editSet(originalValue, value, xPath = None) -> EditSet:
+    return EditSet("items.xml", xPath or f"//property[@value='{originalValue}']/@value", "value", originalValue, value)
+
+def testOrderEditSetsRunsWritersAfterFilters():
+    #10 -> 20 has to run after 20 -> 40, or 20 -> 40 would also pick up the values it just wrote
+    first, second = editSet("10", "20"), editSet("20", "40")
+    assert EditOverlay.orderEditSets([first, second]) == [second, first]
+    third = editSet("40", "80")
+    assert EditOverlay.orderEditSets([first, second, third]) == [third, second, first]
+
+def testOrderEditSetsLeavesCyclesOut():
+    swapped = [editSet("10", "20"), editSet("20", "10")]
+    independent = editSet("40", "41")
+    assert EditOverlay.orderEditSets(swapped + [independent]) == [independent]
+
+def testOrderEditSetsWithoutFilters():
+    unfiltered = editSet(None, "5", "//property/@value")
+    assert EditOverlay.orderEditSets([unfiltered]) == [unfiltered]
+
+def applyOperations(tmp_path, document, operations):
+    patchPath = tmp_path / "items.xml"
+    patchPath.write_text("".join(ModPatchWriter().iterPatchLines(operations)))
+    return ModPatchApplier(document).applyPatchFile(ModPatchFile("mod", "items.xml", str(patchPath), None))
+
+def testPatchXPathsUseUniqueNames(tmp_path, parseDocument):
+    document = parseDocument(ITEMS)
+    edits = EditOverlay()
+    delay = document.root.children[0].children[1].children[0]
+    duplicate = document.root.children[3].children[0]
+    edits.setAttribute(XmlModification(element=delay, fileKey="items.xml"), "value", "2")
+    edits.setAttribute(XmlModification(element=duplicate, fileKey="items.xml"), "param1", "x")
+    operations = edits.getPatchOperations("items.xml")
+    assert [(operation.operation, operation.xPath, operation.name) for operation in operations] == [
+        ("set", "/items/item[@name='a']/property[@class='Action0']/property[@name='Delay']/@value", None),
+        ("setattribute", "/items/item[4]/property[@name='Stacknumber']", "param1"),
+    ]
+    patched = parseDocument(ITEMS)
+    #A sibling inserted in front does not shift the name based XPaths
+    patched.root.children[0:0] = [parseDocument("<item name='new'/>").root]
+    patched.root.children[0].parent = patched.root
+    assert applyOperations(tmp_path, patched, operations[:1]).errors == []
+    assert patched.root.children[1].children[1].children[0].attrib["value"] == "2"
+
+def testEditsInUnloadedSubtreesAreWritten(tmp_path, parseDocument):
+    #A streamed file drops the rows of collapsed elements, the edited element then no longer is among its parent's children
+    sourcePath = tmp_path / "source.xml"
+    sourcePath.write_text(ITEMS)
+    document, _ = streamXmlDocument(str(sourcePath))
+    item = document.root.children[0]
+    document.loadChildren(item)
+    stacknumber = item.children[0]
+    edits = EditOverlay()
+    edits.setAttribute(XmlModification(element=stacknumber, fileKey="items.xml"), "value", "2")
+    document.unloadChildren(item)
+    assert not stacknumber.parent.isLoaded()
+    operations = edits.getPatchOperations("items.xml", document)
+    assert [(operation.xPath, operation.value) for operation in operations] == [("/items/item[@name='a']/property[@name='Stacknumber']/@value", "2")]
+    #Without the document the siblings are unknown and the position is used
+    assert [operation.xPath for operation in edits.getPatchOperations("items.xml")] == ["/items/item[@name='a']/property[1]/@value"]
+    writer = ModPatchWriter()
+    outputFolder = tmp_path / "output"
+    pendingFiles = writer.getPendingFiles(edits, {"items.xml": document})
+    assert writer.writeFiles(str(outputFolder), pendingFiles) == ["items.xml"]
+    patched = parseDocument(ITEMS)
+    result = ModPatchApplier(patched).applyPatchFile(ModPatchFile("mod", "items.xml", str(outputFolder / "Config" / "items.xml"), None))
+    assert result.errors == []
+    assert patched.root.children[0].children[0].attrib["value"] == "2"
+
+def testRevertingAnEditRemovesIt(parseDocument):
+    document = parseDocument(ITEMS)
+    edits = EditOverlay()
+    modification = XmlModification(element=document.root.children[0], fileKey="items.xml")
+    edits.setAttribute(modification, "name", "renamed")
+    assert edits.getNodeAttributes("items.xml", document.root.children[0])["name"] == "renamed"
+    edits.setAttribute(modification, "name", "a")
+    assert edits.isEmpty()
+    assert edits.getPatchOperations("items.xml") == []
+    assert flattenXmlTree(document.root) == flattenXmlTree(parseDocument(ITEMS).root)
+
+def testEditsFollowElementsReadAgain(tmp_path):
+    #Collapsing and expanding a row of a streamed file reads the elements again as new nodes
+    sourcePath = tmp_path / "items.xml"
+    sourcePath.write_text(ITEMS)
+    document, _ = streamXmlDocument(str(sourcePath))
+    item = document.root.children[0]
+    document.loadChildren(item)
+    edits = EditOverlay()
+    edits.setAttribute(XmlModification(element=item.children[0], fileKey="items.xml"), "value", "11")
+    document.unloadChildren(item)
+    document.loadChildren(item)
+    assert edits.getNodeAttributes("items.xml", item.children[0])["value"] == "11"
+    assert edits.getNodeAttributes("other.xml", item.children[0])["value"] == "10"
+    document.unloadChildren(item)
+    resolver = InheritanceResolver(document, fileKey="items.xml", getAttributes=edits.getNodeAttributes)
+    assert resolver.getEffectiveProperties("a")["Stacknumber"] == ("11", "a")
+    assert resolver.getLocalProperties(item)["Stacknumber"] == "11"
+
+def testBulkEditPatchReproducesTheEdits(tmp_path, parseDocument):
+    #The compact edit set operations, applied to the unedited file, give the same values as the edits themselves
+    document = parseDocument(ITEMS)
+    edits = EditOverlay()
+    bulkEdit = BulkEdit(selector="//item/property[@name='Stacknumber']/@value", transform=BulkTransform("scale 2"),
+                        documents={"items.xml": document}, getAttributes=edits.getNodeAttributes)
+    for fileKey, node, name, _, newValue in bulkEdit.getChanges():
+        edits.setAttribute(XmlModification(element=node, fileKey=fileKey), name, newValue)
+    for bulkEditSet in bulkEdit.getEditSets():
+        edits.addEditSet(bulkEditSet)
+    operations = edits.getPatchOperations("items.xml", document)
+    assert len(operations) == 3
+    assert all(operation.operation == "set" for operation in operations)
+    patched = parseDocument(ITEMS)
+    assert applyOperations(tmp_path, patched, operations).errors == []
+    assert [item.children[0].attrib["value"] for item in patched.root] == ["20", "40", "80", "20"]
+
+def testEditSetsThatNoLongerHoldFallBackToElements(parseDocument):
+    document = parseDocument(ITEMS)
+    edits = EditOverlay()
+    node = document.root.children[1].children[0]
+    edits.setAttribute(XmlModification(element=node, fileKey="items.xml"), "value", "99")
+    edits.addEditSet(editSet("20", "98", "//item/property[@value='20']/@value"))
+    operations = edits.getPatchOperations("items.xml", document)
+    assert [(operation.xPath, operation.value) for operation in operations] == [("/items/item[@name='b']/property[@name='Stacknumber']/@value", "99")]
@@ -0,0 +1,65 @@
+from xpath_core import EditOverlay, InheritanceResolver, XmlModification
+
+BLOCKS = """<blocks>
+    <block name="base">
+        <property name="Material" value="Mwood"/>
+        <property name="CreativeMode" value="None"/>
+        <property name="Shape" value="Cube"/>
+        <property class="RepairItems"><property name="resourceWood" value="5"/></property>
+    </block>
+    <block name="frame">
+        <property name="Extends" value="base" param1="Shape"/>
+        <property name="Material" value="Mplywood"/>
+    </block>
+    <block name="ramp"><property name="Extends" value="frame" param1="RepairItems"/></block>
+    <block name="loopA"><property name="Extends" value="loopB"/></block>
+    <block name="loopB"><property name="Extends" value="loopA"/><property name="Weight" value="1"/></block>
+</blocks>"""
+
+def testEffectivePropertiesFollowTheExtendsChain(parseDocument):
+    resolver = InheritanceResolver(parseDocument(BLOCKS), fileKey="blocks.xml")
+    assert resolver.getEffectiveProperties("frame") == {
+        "Material": ("Mplywood", "frame"),
+        "RepairItems.resourceWood": ("5", "base"),
+        "Extends": ("base", "frame"),
+    }
+    #param1 excludes whole property classes as well, CreativeMode is never inherited
+    assert resolver.getEffectiveProperties("ramp") == {"Material": ("Mplywood", "frame"), "Extends": ("frame", "ramp")}
+
+def testCyclesStop(parseDocument):
+    resolver = InheritanceResolver(parseDocument(BLOCKS), fileKey="blocks.xml")
+    #The walk up stops at the element it started from, which then inherits from the rest of the loop
+    assert resolver.getEffectiveProperties("loopA") == {"Extends": ("loopB", "loopA"), "Weight": ("1", "loopB")}
+    assert resolver.getEffectiveProperties("loopB") == {"Extends": ("loopA", "loopB"), "Weight": ("1", "loopB")}
+    assert resolver.getEffectiveProperties("unknown") == dict()
+
+def testResolveStepsRunParentsFirst(parseDocument):
+    resolver = InheritanceResolver(parseDocument(BLOCKS), fileKey="blocks.xml")
+    order = resolver.getTopologicalOrder()
+    assert order.index("base") < order.index("frame") < order.index("ramp")
+    assert sum(1 for _ in resolver.resolveSteps()) == len(order)
+    assert set(resolver.effective) == set(order)
+
+def testEditsInvalidateTheInheritingElements(parseDocument):
+    document = parseDocument(BLOCKS)
+    edits = EditOverlay()
+    resolver = InheritanceResolver(document, fileKey="blocks.xml", getAttributes=edits.getNodeAttributes)
+    resolver.getEffectiveProperties("ramp")
+    base, frame = document.root.children[0], document.root.children[1]
+    repair = base.children[3].children[0]
+    edits.setAttribute(XmlModification(element=repair, fileKey="blocks.xml"), "value", "9")
+    resolver.onElementChanged(repair)
+    assert resolver.getEffectiveProperties("frame")["RepairItems.resourceWood"] == ("9", "base")
+    #Changing Extends moves the element in the graph
+    edits.setAttribute(XmlModification(element=frame.children[0], fileKey="blocks.xml"), "value", "loopB")
+    resolver.onElementChanged(frame.children[0])
+    assert resolver.getEffectiveProperties("ramp")["Weight"] == ("1", "loopB")
+    assert "ramp" not in resolver.children.get("base", ())
+
+def testExtendsAttribute(parseDocument):
+    document = parseDocument("""<entity_classes>
+        <entity_class name="zombieTemplate"><property name="Mass" value="170"/><property name="Class" value="EntityZombie"/></entity_class>
+        <entity_class name="zombieBoe" extends="zombieTemplate" ignore="Mass"><property name="Tags" value="walker"/></entity_class>
+    </entity_classes>""")
+    resolver = InheritanceResolver(document, fileKey="entityclasses.xml")
+    assert resolver.getEffectiveProperties("zombieBoe") == {"Class": ("EntityZombie", "zombieTemplate"), "Tags": ("walker", "zombieBoe")}
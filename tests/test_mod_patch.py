@@ -0,0 +1,104 @@
+import pytest
+
+from xpath_core import ModPatchApplier, ModPatchFile, XPathQueryIndex, compileXPath, iterPreorder
+
+BLOCKS = """<blocks>
+    <block name="wood"><property name="Material" value="Mwood"/><property name="Tags" value="a,b"/></block>
+    <block name="stone"><property name="Material" value="Mstone"/></block>
+    <block name="iron"/>
+</blocks>"""
+
+@pytest.fixture
+def applyPatch(tmp_path, parseDocument):
+    def apply(operations, document = None):
+        document = document or parseDocument(BLOCKS)
+        patchPath = tmp_path / "blocks.xml"
+        patchPath.write_text(f"<configs>{operations}</configs>")
+        result = ModPatchApplier(document).applyPatchFile(ModPatchFile("mod", "blocks.xml", str(patchPath), None))
+        return document, result
+    return apply
+
+def names(document, xPath = "/blocks/block") -> list:
+    return [node.attrib.get("name") for node in compileXPath(xPath).evaluate(document)]
+
+def testSet(applyPatch):
+    document, result = applyPatch("<set xpath=\"//block[@name='wood']/property[@name='Material']/@value\">Mmetal</set>")
+    assert result.errors == [] and result.operationCount == 1
+    assert names(document, "//property[@value='Mmetal']/..") == ["wood"]
+
+def testSetAttributeAndRemoveAttribute(applyPatch):
+    document, result = applyPatch("<setattribute xpath=\"/blocks/block[@name='iron']\" name=\"hp\">5</setattribute>"
+                                            "<removeattribute xpath=\"/blocks/block[@name='stone']/@name\"/>")
+    assert result.errors == []
+    assert document.root.children[2].attrib == {"name": "iron", "hp": "5"}
+    assert names(document) == ["wood", None, "iron"]
+
+def testRemove(applyPatch):
+    document, result = applyPatch("<remove xpath=\"/blocks/block[@name='stone']\"/>")
+    assert result.errors == []
+    assert names(document) == ["wood", "iron"]
+    assert document.root.children[1].xPath == "/blocks/block[2]"
+
+def testInsertions(applyPatch):
+    document, result = applyPatch("<append xpath=\"/blocks\"><block name=\"last\"/></append>"
+                                            "<prepend xpath=\"/blocks\"><block name=\"first\"/></prepend>"
+                                            "<insertAfter xpath=\"/blocks/block[@name='wood']\"><block name=\"afterWood\"/></insertAfter>"
+                                            "<insertBefore xpath=\"/blocks/block[@name='iron']\"><block name=\"beforeIron\"/><block name=\"beforeIron2\"/></insertBefore>")
+    assert result.errors == [] and result.operationCount == 4
+    assert names(document) == ["first", "wood", "afterWood", "stone", "beforeIron", "beforeIron2", "iron", "last"]
+    assert [node.index for node in document.root] == list(range(1, 9))
+
+def testAppendAndPrependToAttributes(applyPatch):
+    document, _ = applyPatch("<append xpath=\"//block[@name='wood']/property[@name='Tags']/@value\">,c</append>"
+                                       "<prepend xpath=\"//block[@name='wood']/property[@name='Tags']/@value\">z,</prepend>")
+    assert document.root.children[0].children[1].attrib["value"] == "z,a,b,c"
+
+@pytest.mark.parametrize("mode, text, expected", [("add", "b,c", "a,b,c"), ("remove", "a", "b")])
+def testCsv(applyPatch, mode, text, expected):
+    document, result = applyPatch(f"<csv xpath=\"//property[@name='Tags']/@value\" op=\"{mode}\">{text}</csv>")
+    assert result.errors == []
+    assert document.root.children[0].children[1].attrib["value"] == expected
+
+@pytest.mark.parametrize("operation, error", [
+    ("<set xpath=\"/blocks/block[@name='none']/@name\">x</set>", "matched nothing"),
+    ("<replace xpath=\"/blocks\"/>", "unsupported operation"),
+    ("<set>x</set>", "missing xpath"),
+    ("<remove xpath=\"/blocks\"/>", "the root element cannot be removed"),
+    ("<setattribute xpath=\"/blocks/block/@name\" name=\"a\">x</setattribute>", "expected elements, not attributes"),
+    ("<csv xpath=\"//property/@value\" op=\"merge\">x</csv>", "op must be"),
+])
+def testErrorsAreReportedPerOperation(applyPatch, operation, error):
+    document, result = applyPatch(operation + "<remove xpath=\"/blocks/block[@name='iron']\"/>")
+    assert result.operationCount == 1
+    assert len(result.errors) == 1 and error in result.errors[0]
+    assert names(document) == ["wood", "stone"]
+
+def testFlatTreeIsASnapshot(applyPatch):
+    document, result = applyPatch("<set xpath=\"/blocks/block[1]/@name\">changed</set>")
+    before = result.flatTree
+    applyPatch("<set xpath=\"/blocks/block[1]/@name\">again</set>", document)
+    assert "changed" in repr(before) and "again" not in repr(before)
+
+def assertIndexIsFresh(document):
+    index = document.getQueryIndex()
+    fresh = XPathQueryIndex(document.root)
+    assert sorted(index.order, key=index.order.get) == list(iterPreorder(document.root))
+    for lookup, freshLookup in ((index.byTag, fresh.byTag), (index.byAttribute, fresh.byAttribute)):
+        assert {key: nodes for key, nodes in lookup.items() if nodes} == freshLookup
+
+@pytest.mark.parametrize("spacing", [1, 2, XPathQueryIndex.ORDER_SPACING])
+def testQueryIndexIsUpdatedInPlace(applyPatch, parseDocument, monkeypatch, spacing):
+    #The query index survives structure changes; with a small spacing inserts run out of room and renumber
+    monkeypatch.setattr(XPathQueryIndex, "ORDER_SPACING", spacing)
+    document = parseDocument(BLOCKS)
+    document.getQueryIndex()
+    operations = "".join(f"<insertBefore xpath=\"/blocks/block[@name='stone']\"><block name=\"new{i}\"><property name=\"Material\" value=\"M{i}\"/></block></insertBefore>"
+                         f"<append xpath=\"//block[@name='new{i}']\"><property name=\"Tags\" value=\"t{i}\"/></append>"
+                         for i in range(5))
+    operations += "<remove xpath=\"//block[@name='new2']\"/><set xpath=\"//block[@name='new3']/property/@value\">x</set>"
+    index = document.getQueryIndex()
+    document, result = applyPatch(operations, document)
+    assert result.errors == []
+    assert document.getQueryIndex() is index
+    assertIndexIsFresh(document)
+    assert names(document, "//block[property/@value='x']") == ["new3"]
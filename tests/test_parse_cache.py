@@ -0,0 +1,69 @@
+import os
+import struct
+
+from xpath_core import XmlParseCache, flattenXmlTree, parseXmlDocument
+
+CONTENT = '<items><item name="a"><property name="Weight" value="1"/></item></items>'
+
+def createCachedFile(tmp_path, content = CONTENT):
+    filePath = tmp_path / "items.xml"
+    filePath.write_text(content)
+    cacheFolder = tmp_path / "cache"
+    document = parseXmlDocument(str(filePath), str(cacheFolder))
+    return str(filePath), XmlParseCache(str(cacheFolder)), document
+
+def getCachedMTime(cache, filePath) -> int:
+    with open(cache.getCacheFilePath(filePath), "rb") as file:
+        return struct.unpack_from(XmlParseCache.HEADER_FORMAT, file.read(XmlParseCache.HEADER_SIZE))[1]
+
+def touch(filePath, *, seconds = 10) -> None:
+    stat = os.stat(filePath)
+    os.utime(filePath, ns=(stat.st_atime_ns, stat.st_mtime_ns + seconds * 1_000_000_000))
+
+def testHit(tmp_path):
+    filePath, cache, document = createCachedFile(tmp_path)
+    cached = cache.load(filePath)
+    assert flattenXmlTree(cached.root) == flattenXmlTree(document.root)
+    assert (cache.hits, cache.misses, cache.invalidations) == (1, 0, 0)
+
+def testChangedSizeInvalidates(tmp_path):
+    filePath, cache, _ = createCachedFile(tmp_path)
+    with open(filePath, "w") as file:
+        file.write(CONTENT.replace('value="1"', 'value="100"'))
+    assert cache.load(filePath) is None
+    assert (cache.misses, cache.invalidations) == (1, 1)
+    assert not os.path.exists(cache.getCacheFilePath(filePath))
+
+def testTouchedButUnchangedIsStillValid(tmp_path):
+    filePath, cache, _ = createCachedFile(tmp_path)
+    touch(filePath)
+    assert cache.load(filePath) is not None
+    assert getCachedMTime(cache, filePath) == os.stat(filePath).st_mtime_ns
+    assert (cache.hits, cache.invalidations) == (1, 0)
+
+def testSameSizeNewContentInvalidates(tmp_path):
+    filePath, cache, _ = createCachedFile(tmp_path)
+    with open(filePath, "w") as file:
+        file.write(CONTENT.replace('value="1"', 'value="2"'))
+    touch(filePath)
+    assert cache.load(filePath) is None
+    assert cache.invalidations == 1
+
+def testCorruptCacheFileIsAMiss(tmp_path):
+    filePath, cache, _ = createCachedFile(tmp_path)
+    with open(cache.getCacheFilePath(filePath), "r+b") as file:
+        file.seek(XmlParseCache.HEADER_SIZE)
+        file.write(b"\xff" * 8)
+        file.truncate()
+    assert cache.load(filePath) is None
+    assert cache.misses == 1
+
+def testMissingSourceIsAMiss(tmp_path):
+    filePath, cache, _ = createCachedFile(tmp_path)
+    os.remove(filePath)
+    assert cache.load(filePath) is None
+
+def testFailedParseIsNotCached(tmp_path):
+    filePath, cache, document = createCachedFile(tmp_path, "<items><item></items>")
+    assert document.error
+    assert cache.load(filePath) is None
@@ -0,0 +1,74 @@
+from xpath_core import ReferenceIndex, streamXmlDocument
+
+ITEMS = """<items>
+    <item name="gunPistol"><property name="Tags" value="gun"/></item>
+    <item name="resourceWood"><property name="Stacknumber" value="500"/></item>
+</items>"""
+
+RECIPES = """<recipes>
+    <recipe name="gunPistol"><ingredient name="resourceWood" count="5"/><ingredient name="resourceUnknown" count="1"/></recipe>
+    <recipe name="resourceWood"><ingredient name="resourceWood" count="1"/></recipe>
+</recipes>"""
+
+PROGRESSION = """<progression><perks><perk name="perkGunslinger">
+    <effect_group>
+        <passive_effect name="RecipeTagUnlocked" operation="base_set" value="1" tags="gunPistol,resourceWood"/>
+        <passive_effect name="EntityDamage" operation="perc_add" value="0.1" tags="gunPistol"/>
+    </effect_group>
+</perk></perks></progression>"""
+
+def addDocument(index, fileKey, document) -> None:
+    for _ in index.addDocumentSteps(fileKey, document):
+        pass
+
+def describe(references) -> list:
+    return [(reference.fileKey, reference.node.xPath, reference.attributeName) for reference in references]
+
+def createIndex(parseDocument) -> ReferenceIndex:
+    index = ReferenceIndex()
+    for fileKey, text in (("items.xml", ITEMS), ("recipes.xml", RECIPES), ("progression.xml", PROGRESSION)):
+        addDocument(index, fileKey, parseDocument(text, filePath=fileKey))
+    return index
+
+def testDefinitionsAndUsages(parseDocument):
+    index = createIndex(parseDocument)
+    assert describe(index.getDefinitions("resourceWood")) == [("items.xml", "/items/item[2]", "name")]
+    assert describe(index.getUsages("resourceWood")) == [
+        ("recipes.xml", "/recipes/recipe[1]/ingredient[1]", "name"),
+        ("recipes.xml", "/recipes/recipe[2]", "name"),
+        ("recipes.xml", "/recipes/recipe[2]/ingredient[1]", "name"),
+        ("progression.xml", "/progression/perks[1]/perk[1]/effect_group[1]/passive_effect[1]", "tags"),
+    ]
+    assert len(index.getUsages("resourceWood", limit=2)) == 2
+    #Only passive effects that unlock recipe tags refer to names
+    assert [reference.node.attrib["name"] for reference in index.getUsages("gunPistol") if reference.fileKey == "progression.xml"] == ["RecipeTagUnlocked"]
+
+def testNamesOfAnElement(parseDocument):
+    index = createIndex(parseDocument)
+    items = index.fileDocuments["items.xml"].root
+    recipe = index.fileDocuments["recipes.xml"].root.children[0]
+    assert index.getDefinedName("items.xml", items.children[0]) == "gunPistol"
+    assert index.getDefinedName("items.xml", items.children[0].children[0]) is None
+    assert index.getDefinedName("recipes.xml", recipe) is None
+    assert index.getReferencedNames("recipes.xml", recipe) == ["gunPistol"]
+    #Undefined names are indexed but not listed as references
+    assert index.getReferencedNames("recipes.xml", recipe.children[1]) == []
+    assert len(index.getUsages("resourceUnknown")) == 1
+
+def testReindexingAFileReplacesItsEntries(parseDocument):
+    index = createIndex(parseDocument)
+    addDocument(index, "recipes.xml", parseDocument("<recipes/>", filePath="recipes.xml"))
+    assert [reference.fileKey for reference in index.getUsages("resourceWood")] == ["progression.xml"]
+    index.removeDocument("items.xml")
+    assert index.getDefinitions("resourceWood") == [] and not index.isDefined("resourceWood")
+
+def testStreamedUsagesAreLoadedWhenReturned(tmp_path):
+    filePath = tmp_path / "recipes.xml"
+    filePath.write_text(RECIPES)
+    document, _ = streamXmlDocument(str(filePath))
+    index = ReferenceIndex()
+    addDocument(index, "recipes.xml", document)
+    recipes = document.root.children
+    assert not any(recipe.isLoaded() for recipe in recipes)
+    assert describe(index.getUsages("resourceWood", limit=1)) == [("recipes.xml", "/recipes/recipe[1]/ingredient[1]", "name")]
+    assert [recipe.isLoaded() for recipe in recipes] == [True, False]
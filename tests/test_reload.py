@@ -0,0 +1,72 @@
+import pytest
+
+from xpath_core import (XML_CHANGE_ADDED, XML_CHANGE_ATTRIBUTE, XML_CHANGE_REMOVED, InotifyFileWatcher, PollingFileWatcher,
+                        createFileWatcher, diffXmlDocuments, streamXmlDocument)
+
+ITEMS = """<items>
+    <item name="gunPistol"><property name="Stacknumber" value="1"/></item>
+    <item name="resourceWood"><property name="Stacknumber" value="500"/></item>
+    <item name="resourceStone"><property name="Stacknumber" value="500"/></item>
+</items>"""
+
+def describe(changes) -> list:
+    return [(change.kind, (change.oldNode if change.newNode is None else change.newNode).xPath, change.attributeName, change.oldValue, change.newValue)
+            for change in changes]
+
+@pytest.mark.parametrize("old, new, expected", [
+    (ITEMS, ITEMS.replace('value="1"', 'value="2" param1="x"').replace('name="resourceStone"', 'name="resourceStone" tags="ore"'), [
+        (XML_CHANGE_ATTRIBUTE, "/items/item[1]/property[1]", "value", "1", "2"),
+        (XML_CHANGE_ATTRIBUTE, "/items/item[1]/property[1]", "param1", None, "x"),
+        (XML_CHANGE_ATTRIBUTE, "/items/item[3]", "tags", None, "ore"),
+    ]),
+    #Children are paired by tag and name, so the siblings after an inserted element do not change
+    (ITEMS, ITEMS.replace("<items>", "<items><item name='new'/>"), [(XML_CHANGE_ADDED, "/items/item[1]", None, None, None)]),
+    (ITEMS, ITEMS.replace("resourceStone", "resourceIron"), [
+        (XML_CHANGE_REMOVED, "/items/item[3]", None, None, None),
+        (XML_CHANGE_ADDED, "/items/item[3]", None, None, None),
+    ]),
+    (ITEMS, "<blocks/>", [(XML_CHANGE_REMOVED, "/items", None, None, None), (XML_CHANGE_ADDED, "/blocks", None, None, None)]),
+    (ITEMS, ITEMS, []),
+])
+def testDiff(old, new, expected, parseDocument):
+    assert describe(diffXmlDocuments(parseDocument(old), parseDocument(new))) == expected
+
+def testDiffReadsUnloadedSubtrees(tmp_path):
+    oldPath, newPath = tmp_path / "old.xml", tmp_path / "new.xml"
+    oldPath.write_text(ITEMS)
+    newPath.write_text(ITEMS.replace('value="1"', 'value="2"'))
+    changes = diffXmlDocuments(streamXmlDocument(str(oldPath))[0], streamXmlDocument(str(newPath))[0])
+    assert describe(changes) == [(XML_CHANGE_ATTRIBUTE, "/items/item[1]/property[1]", "value", "1", "2")]
+
+@pytest.mark.parametrize("createWatcher", [PollingFileWatcher, createFileWatcher])
+def testWatcherReportsChangedFiles(tmp_path, createWatcher):
+    subFolder = tmp_path / "XUi"
+    subFolder.mkdir()
+    changed, removed, added = tmp_path / "items.xml", subFolder / "windows.xml", subFolder / "controls.xml"
+    changed.write_text(ITEMS)
+    removed.write_text("<windows/>")
+    (tmp_path / "notes.txt").write_text("")
+    watcher = createWatcher([str(tmp_path), str(tmp_path / "missing")])
+    try:
+        assert watcher.poll() == set()
+        changed.write_text(ITEMS + "\n")
+        removed.unlink()
+        added.write_text("<controls/>")
+        (tmp_path / "notes.txt").write_text("ignored")
+        assert watcher.poll() == {str(changed), str(removed), str(added)}
+        assert watcher.poll() == set()
+    finally:
+        watcher.close()
+
+def testInotifyReportsNewFolders(tmp_path):
+    watcher = createFileWatcher([str(tmp_path)])
+    if not isinstance(watcher, InotifyFileWatcher):
+        pytest.skip("inotify is not available")
+    try:
+        folder = tmp_path / "Mods"
+        folder.mkdir()
+        assert watcher.poll() == {str(folder)}
+        (folder / "items.xml").write_text(ITEMS)
+        assert watcher.poll() == {str(folder / "items.xml")}
+    finally:
+        watcher.close()
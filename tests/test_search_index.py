@@ -0,0 +1,62 @@
+import pytest
+
+from xpath_core import SearchIndex
+
+@pytest.fixture
+def createDocument(parseDocument):
+    def create(prefix, count = 20):
+        items = "".join(f'<item name="{prefix}Item{i}"><property name="Weight" value="{i}"/></item>' for i in range(count))
+        return parseDocument(f"<items>{items}</items>", filePath=f"{prefix}.xml")
+    return create
+
+def addDocument(index, document) -> None:
+    for _ in index.addDocumentSteps(document):
+        pass
+
+def testRanksExactBeforePrefixBeforeSubstring(parseDocument):
+    index = SearchIndex()
+    addDocument(index, parseDocument('<items><item name="woodFrame"/><item name="wood"/><item name="plywood"/></items>'))
+    assert [node.attrib["name"] for node in index.search("wood")] == ["wood", "woodFrame", "plywood"]
+
+def testAllWordsHaveToMatch(createDocument):
+    index = SearchIndex()
+    addDocument(index, createDocument("gun"))
+    assert [node.attrib["name"] for node in index.search("weight=3")] == ["Weight"]
+    assert index.search("gunitem3 weight") == []
+    assert [node.attrib["name"] for node in index.search("gunitem3")] == ["gunItem3"]
+
+def testRemovedDocumentsAreNotFound(createDocument):
+    index = SearchIndex()
+    first, second = createDocument("first"), createDocument("second")
+    addDocument(index, first)
+    addDocument(index, second)
+    index.removeDocument(first)
+    assert {index.getDocument(node) for node in index.search("item")} == {second}
+
+def testCompactionWhileIndexing(createDocument):
+    #Removing documents compacts the index while another document is still being indexed
+    index = SearchIndex()
+    others = [createDocument(f"other{i}") for i in range(3)]
+    for document in others:
+        addDocument(index, document)
+    indexed = createDocument("late")
+    steps = index.addDocumentSteps(indexed)
+    next(steps)
+    for document in others:
+        index.removeDocument(document)
+    for _ in steps:
+        pass
+    assert index.search("lateitem1")[0].attrib["name"] == "lateItem1"
+    assert {index.getDocument(node) for node in index.search("item")} == {indexed}
+    index.removeDocument(indexed)
+    assert index.search("item") == []
+
+def testRemovalStopsAPendingJob(createDocument):
+    index = SearchIndex()
+    document = createDocument("removed")
+    steps = index.addDocumentSteps(document)
+    next(steps)
+    index.removeDocument(document)
+    for _ in steps:
+        pass
+    assert index.search("removeditem1") == []
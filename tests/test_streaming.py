@@ -0,0 +1,55 @@
+import xpath_core
+from xpath_core import XmlParseCache, flattenXmlTree, parseXmlDocument, streamXmlDocument
+
+BLOCKS = """<?xml version="1.0" encoding="UTF-8"?>
+<!-- Streamed files keep the root and its children, deeper elements are read on demand -->
+<blocks>
+    <block name="a"><property name="Material" value="Mwood"/><drop event="Harvest" name="resourceWood"/></block>
+    <block name="b"/>
+    <block name="c"><property class="RepairItems"><property name="resourceWood" value="5"/></property><property name="Extends" value="a"/></block>
+</blocks>
+"""
+
+def writeFile(tmp_path, content, *, encoding = "utf-8") -> str:
+    filePath = tmp_path / "blocks.xml"
+    filePath.write_bytes(content.encode(encoding))
+    return str(filePath)
+
+def testStreamedTreeMatchesTheFullParse(tmp_path, parseDocument):
+    document, contentHash = streamXmlDocument(writeFile(tmp_path, BLOCKS))
+    assert [block.isLoaded() for block in document.root] == [False, True, False]
+    assert contentHash == XmlParseCache.hashContent(BLOCKS.encode())
+    document.loadSubtree(document.root)
+    assert flattenXmlTree(document.root) == flattenXmlTree(parseDocument(BLOCKS.split("\n", 1)[1]).root)
+
+def testUnloadedSubtreesAreReadAgain(tmp_path):
+    document, _ = streamXmlDocument(writeFile(tmp_path, BLOCKS))
+    block = document.root.children[2]
+    subtree = document.readSubtree(block)
+    assert not block.isLoaded()
+    assert [property.xPath for property in subtree] == ["/blocks/block[3]/property[1]", "/blocks/block[3]/property[2]"]
+    document.loadChildren(block)
+    assert [property.attrib for property in block] == [property.attrib for property in subtree]
+    document.unloadChildren(block)
+    assert not block.isLoaded()
+    assert document.findNode("/blocks/block[3]/property[1]/property[1]").attrib == {"name": "resourceWood", "value": "5"}
+
+def testElementsThatAreNotInTheFileStayLoaded(tmp_path):
+    document, _ = streamXmlDocument(writeFile(tmp_path, BLOCKS))
+    document.unloadChildren(document.root)
+    assert document.root.isLoaded()
+
+def testDeclaredEncodingIsUsedForSubtrees(tmp_path):
+    content = BLOCKS.replace("UTF-8", "ISO-8859-1").replace('value="Mwood"', 'value="Mwoodé"')
+    document, _ = streamXmlDocument(writeFile(tmp_path, content, encoding="iso-8859-1"))
+    assert document.findNode("/blocks/block[1]/property[1]").attrib["value"] == "Mwoodé"
+
+def testLargeFilesAreStreamedAndCached(tmp_path, monkeypatch):
+    monkeypatch.setattr(xpath_core, "STREAMING_THRESHOLD_BYTES", 0)
+    filePath = writeFile(tmp_path, BLOCKS)
+    cacheFolder = str(tmp_path / "cache")
+    document = parseXmlDocument(filePath, cacheFolder)
+    assert not document.root.children[0].isLoaded()
+    cached = XmlParseCache(cacheFolder).load(filePath)
+    assert not cached.root.children[0].isLoaded()
+    assert [child.tag for child in cached.readSubtree(cached.root.children[0])] == ["property", "drop"]
@@ -0,0 +1,106 @@
+import xml.etree.ElementTree as ETree
+
+import pytest
+
+from xpath_core import XPathSyntaxError, compileXPath, evaluateXPaths
+
+ITEMS = """<items>
+    <item name="gunPistol">
+        <property name="Tags" value="gun,pistol"/>
+        <property name="Stacknumber" value="1"/>
+        <property class="Action0">
+            <property name="Class" value="Ranged"/>
+            <property name="Delay" value="0.2"/>
+        </property>
+    </item>
+    <item name="resourceWood">
+        <property name="Stacknumber" value="500"/>
+        <property name="Weight" value="1"/>
+    </item>
+    <item name="resourceStone">
+        <property name="Stacknumber" value="500"/>
+    </item>
+    <block name="notAnItem"/>
+</items>"""
+
+def describe(nodes) -> list:
+    return [(node.tag, dict(node.attrib)) for node in nodes]
+
+#(our absolute XPath, the same selection as an ElementTree path relative to the root)
+ELEMENTTREE_CASES = [
+    ("/items/item", "./item"),
+    ("/items/*", "./*"),
+    ("/items/item[2]", "./item[2]"),
+    ("/items/item[last()]", "./item[last()]"),
+    ("/items/item[@name='resourceWood']/property", "./item[@name='resourceWood']/property"),
+    ("/items/item[property]", "./item[property]"),
+    ("/items/item/property[@name]", "./item/property[@name]"),
+    ("//property", ".//property"),
+    ("//property[@name='Stacknumber']", ".//property[@name='Stacknumber']"),
+    ("//item/property[@class='Action0']/property", ".//item/property[@class='Action0']/property"),
+    ("/items/item[1]/property[3]/property[2]", "./item[1]/property[3]/property[2]"),
+    ("//property[@value='500']/..", ".//property[@value='500']/.."),
+    #Positions after // count per parent, not over the whole document
+    ("//property[1]", ".//property[1]"),
+    ("//property[last()]", ".//property[last()]"),
+    ("//item/property[2]", ".//item/property[2]"),
+    ("/items//property[@name][1]", ".//property[@name][1]"),
+]
+
+@pytest.mark.parametrize("xPath, elementTreePath", ELEMENTTREE_CASES)
+def testMatchesElementTree(xPath, elementTreePath, parseDocument):
+    document = parseDocument(ITEMS)
+    expected = ETree.fromstring(ITEMS).findall(elementTreePath)
+    assert describe(compileXPath(xPath).evaluate(document)) == describe(expected)
+
+def testAttributeMatchesAreTuples(parseDocument):
+    document = parseDocument(ITEMS)
+    matches = compileXPath("//item[@name='resourceWood']/property/@value").evaluate(document)
+    assert [(node.attrib["name"], name) for node, name in matches] == [("Stacknumber", "value"), ("Weight", "value")]
+
+@pytest.mark.parametrize("xPath, names", [
+    ("//item[contains(@name, 'resource')]", ["resourceWood", "resourceStone"]),
+    ("//item[starts-with(@name, 'gun')]", ["gunPistol"]),
+    ("//item[not(@name='gunPistol')]", ["resourceWood", "resourceStone"]),
+    ("//item[property/@value > 100]", ["resourceWood", "resourceStone"]),
+    ("//item[@name='resourceStone'] | //item[@name='gunPistol']", ["gunPistol", "resourceStone"]),
+    ("//item[@name='gunPistol' or @name='resourceStone']", ["gunPistol", "resourceStone"]),
+    ("//item[position() > 1 and property[@name='Weight']]", ["resourceWood"]),
+])
+def testPredicates(xPath, names, parseDocument):
+    document = parseDocument(ITEMS)
+    assert [node.attrib["name"] for node in compileXPath(xPath).evaluate(document)] == names
+
+def testIndexedLookupKeepsPositionsPerParent(parseDocument):
+    #[@name=...] predicates start from the attribute index, positional predicates still count per parent
+    document = parseDocument(ITEMS)
+    matches = compileXPath("/items/item/property[@name='Stacknumber'][1]").evaluate(document)
+    assert [node.parent.attrib["name"] for node in matches] == ["gunPistol", "resourceWood", "resourceStone"]
+
+@pytest.mark.parametrize("xPath, positions", [
+    ("/items/item[@name='resourceWood' and position()=2]", [2]),
+    ("//item[@name='resourceWood' and position()=2]", [2]),
+    ("//item[@name='resourceWood' and position()=1]", []),
+    ("//item[@name='resourceStone' and last()=3]", [3]),
+    ("//item[@name='resourceWood'][1]", [2]),
+])
+def testIndexedLookupWithPositions(xPath, positions, parseDocument):
+    #The attribute index must not be used when the same predicate also tests the position
+    document = parseDocument(ITEMS)
+    items = document.root.children
+    assert [items.index(node) + 1 for node in compileXPath(xPath).evaluate(document)] == positions
+
+def testOtherRootIsSkipped(parseDocument):
+    document = parseDocument(ITEMS)
+    assert compileXPath("/blocks/block").evaluate(document) == []
+
+def testEvaluateXPathsBatches(parseDocument):
+    documents = [parseDocument(ITEMS, filePath="items.xml"), parseDocument("<blocks><block name='a'/></blocks>", filePath="blocks.xml")]
+    results = evaluateXPaths(["//block", "/items/item[1]"], documents)
+    assert [(document.filePath, node.attrib["name"]) for document, node in results["//block"]] == [("items.xml", "notAnItem"), ("blocks.xml", "a")]
+    assert [node.attrib["name"] for _, node in results["/items/item[1]"]] == ["gunPistol"]
+
+@pytest.mark.parametrize("xPath", ["/items/item[", "/items/item]", "/items/@", "/items/text()", "/items/item[@name='a'", "/items/#"])
+def testSyntaxErrors(xPath, parseDocument):
+    with pytest.raises(XPathSyntaxError):
+        compileXPath(xPath)
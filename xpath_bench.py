@@ -0,0 +1,285 @@
+import abc
+import argparse
+import gc
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+import tracemalloc
+
+#Load pipeline benchmarks over a config folder (by default the bundled Data/Config). Every stage is timed per file,
+#best of --repeat runs, then run once more under tracemalloc: peakAllocatedBytes is the most the run had allocated at
+#once, retainedBytes/retainedBlocks what was still allocated after it (caches, interned strings, leaks). Peak RSS is
+#measured per run by resetting the kernel's high-water mark where /proc allows it, otherwise it is the process-wide maximum.
+
+import xpath_core
+
+RESULTS_VERSION = 2
+DEFAULT_CONFIG_FOLDER = os.path.join(os.path.dirname(os.path.abspath(__file__)), xpath_core.CONFIG_FOLDER_PATH)
+DEFAULT_OUTPUT = "bench_results.json"
+DEFAULT_REPEAT = 3
+DEFAULT_THRESHOLD_PERCENT = 10.0
+#Regressions smaller than this are timer noise, whatever the percentage
+MIN_REGRESSION_SECONDS = 0.002
+
+class StubTreeview:
+    #Just enough of ttk.Treeview for FileView's insertion steps, so the Python side of inserting rows can be measured
+    #without a display
+    def __init__(self) -> None:
+        self.rows = dict()
+
+    def insert(self, parent, index, *, tags = (), text = "") -> str:
+        row = f"I{len(self.rows) + 1:03X}"
+        self.rows[row] = (parent, tags, text)
+        return row
+
+def createStubFileView():
+    #Imports the GUI module only for this stage; it needs tkinter installed but no display
+    from xpath_mod import FileView
+    fileView = FileView.__new__(FileView)
+    fileView.tree = StubTreeview()
+    fileView.itemIdToXmlModification = dict()
+    fileView.itemIdToElement = dict()
+    return fileView
+
+def loadDocument(filePath) -> xpath_core.XmlDocument:
+    document = xpath_core.parseXmlDocument(filePath)
+    if document.root is not None:
+        document.loadSubtree(document.root)
+    return document
+
+def iterNodes(root):
+    stack = [root]
+    while stack:
+        node = stack.pop()
+        yield node
+        stack.extend(node.children)
+
+class Stage(abc.ABC):
+    #prepare() builds the input outside of the measurement, run() is what gets measured
+    name = ""
+    isPerFile = True
+
+    def prepare(self, filePath):
+        return filePath
+
+    @abc.abstractmethod
+    def run(self, state) -> None:
+        pass
+
+class DiscoveryStage(Stage):
+    name = "discovery"
+    isPerFile = False
+
+    def run(self, configFolder) -> None:
+        xpath_core.findXmlFiles(configFolder)
+
+class ParseStage(Stage):
+    name = "parse"
+
+    def run(self, filePath) -> None:
+        xpath_core.parseXmlDocument(filePath)
+
+class CacheLoadStage(Stage):
+    name = "cacheLoad"
+
+    def __init__(self, cacheFolder) -> None:
+        self.cache = xpath_core.XmlParseCache(cacheFolder)
+
+    def prepare(self, filePath):
+        if self.cache.load(filePath) is None:
+            xpath_core.parseXmlDocument(filePath, self.cache.cacheFolder)
+        return filePath
+
+    def run(self, filePath) -> None:
+        self.cache.load(filePath)
+
+class XPathStage(Stage):
+    name = "xpath"
+
+    def prepare(self, filePath):
+        document = loadDocument(filePath)
+        nodes = list(iterNodes(document.root)) if document.root is not None else []
+        for node in nodes:
+            node.cachedXPath = None
+        return nodes
+
+    def run(self, nodes) -> None:
+        for node in nodes:
+            node.xPath
+
+class ModificationStage(Stage):
+    name = "modifications"
+
+    def prepare(self, filePath):
+        document = loadDocument(filePath)
+        return list(iterNodes(document.root)) if document.root is not None else []
+
+    def run(self, nodes) -> None:
+        modifications = []
+        for node in nodes:
+            modifications.append(xpath_core.XmlModification(element=node, fileKey="bench.xml"))
+            for attributeName in node.attrib:
+                modifications.append(xpath_core.XmlModification(element=node, fileKey="bench.xml", attributeName=attributeName))
+
+class TreeviewStage(Stage):
+    name = "treeview"
+
+    def prepare(self, filePath):
+        return (createStubFileView(), loadDocument(filePath))
+
+    def run(self, state) -> None:
+        fileView, document = state
+        if document.root is None:
+            return
+        for _ in fileView._insertXmlTag(element=document.root, rowParent="", fileKey="bench.xml", document=document):
+            pass
+
+def readProcStatusKilobytes(field):
+    try:
+        with open("/proc/self/status") as file:
+            for line in file:
+                if line.startswith(field):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return None
+
+def resetPeakRss() -> bool:
+    try:
+        with open("/proc/self/clear_refs", "w") as file:
+            file.write("5")
+        return True
+    except OSError:
+        return False
+
+def getPeakRssBytes() -> int:
+    peak = readProcStatusKilobytes("VmHWM:")
+    if peak is None:
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak * 1024
+
+def measure(stage: Stage, target, *, repeat) -> dict:
+    seconds = []
+    peakRssIncrease = 0
+    for _ in range(repeat):
+        state = stage.prepare(target)
+        gc.collect()
+        isReset = resetPeakRss()
+        rssBefore = (readProcStatusKilobytes("VmRSS:") or 0) * 1024 if isReset else getPeakRssBytes()
+        start = time.perf_counter()
+        stage.run(state)
+        seconds.append(time.perf_counter() - start)
+        peakRssIncrease = max(peakRssIncrease, getPeakRssBytes() - rssBefore)
+        del state
+    state = stage.prepare(target)
+    gc.collect()
+    blocksBefore = sys.getallocatedblocks()
+    tracemalloc.start()
+    stage.run(state)
+    _, peakAllocatedBytes = tracemalloc.get_traced_memory()
+    #The trees are full of parent/child cycles, what the run threw away is only freed by the collector
+    gc.collect()
+    retainedBytes, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {
+        "seconds": min(seconds),
+        "peakRssIncreaseBytes": peakRssIncrease,
+        "peakAllocatedBytes": peakAllocatedBytes,
+        "retainedBytes": retainedBytes,
+        "retainedBlocks": sys.getallocatedblocks() - blocksBefore,
+    }
+
+def runBenchmarks(configFolder, *, stageNames, repeat, onResult = lambda stageName, key, result: None) -> dict:
+    filePaths = xpath_core.findXmlFiles(configFolder)
+    with tempfile.TemporaryDirectory() as cacheFolder:
+        stages = [DiscoveryStage(), ParseStage(), CacheLoadStage(cacheFolder), XPathStage(), ModificationStage(), TreeviewStage()]
+        results = dict()
+        for stage in stages:
+            if stage.name not in stageNames:
+                continue
+            targets = [(xpath_core.getFileKey(configFolder, filePath), filePath) for filePath in filePaths] if stage.isPerFile else [(".", configFolder)]
+            files = dict()
+            for key, target in targets:
+                files[key] = measure(stage, target, repeat=repeat)
+                onResult(stage.name, key, files[key])
+            results[stage.name] = {"files": files, "total": sumResults(files.values())}
+    return {
+        "version": RESULTS_VERSION,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "configFolder": os.path.abspath(configFolder),
+        "repeat": repeat,
+        "stages": results,
+    }
+
+def sumResults(results) -> dict:
+    results = list(results)
+    return {
+        "seconds": sum(result["seconds"] for result in results),
+        "peakRssIncreaseBytes": max((result["peakRssIncreaseBytes"] for result in results), default=0),
+        "peakAllocatedBytes": max((result["peakAllocatedBytes"] for result in results), default=0),
+        "retainedBytes": sum(result["retainedBytes"] for result in results),
+        "retainedBlocks": sum(result["retainedBlocks"] for result in results),
+    }
+
+def compareResults(results, baseline, *, thresholdPercent) -> list:
+    #(stage, file key, baseline seconds, seconds) for every time that got more than thresholdPercent slower
+    regressions = []
+    for stageName, stage in results["stages"].items():
+        baselineStage = baseline.get("stages", dict()).get(stageName)
+        if baselineStage is None:
+            continue
+        pairs = [(key, baselineStage["files"].get(key), result) for key, result in stage["files"].items()]
+        pairs.append(("TOTAL", baselineStage["total"], stage["total"]))
+        for key, baselineResult, result in pairs:
+            if baselineResult is None:
+                continue
+            before, after = baselineResult["seconds"], result["seconds"]
+            if after - before > MIN_REGRESSION_SECONDS and after > before * (1 + thresholdPercent / 100):
+                regressions.append((stageName, key, before, after))
+    return regressions
+
+def formatBytes(value) -> str:
+    return f"{value / (1024 * 1024):8.2f} MB"
+
+def printResult(stageName, key, result) -> None:
+    print(f"{stageName:<14}{key:<40}{result['seconds'] * 1000:10.2f} ms  rss +{formatBytes(result['peakRssIncreaseBytes'])}"
+          f"  alloc peak {formatBytes(result['peakAllocatedBytes'])}  retained {formatBytes(result['retainedBytes'])} ({result['retainedBlocks']} blocks)")
+
+def createArgumentParser() -> argparse.ArgumentParser:
+    stageNames = ["discovery", "parse", "cacheLoad", "xpath", "modifications", "treeview"]
+    parser = argparse.ArgumentParser(prog="xpath_bench", description="Benchmark the load pipeline stage by stage.")
+    parser.add_argument("--config", default=DEFAULT_CONFIG_FOLDER, help="config folder to load (default: the bundled Data/Config)")
+    parser.add_argument("--stages", default=",".join(stageNames), help=f"comma separated subset of {','.join(stageNames)}")
+    parser.add_argument("--repeat", type=int, default=DEFAULT_REPEAT, help="timed runs per file, the fastest one counts")
+    parser.add_argument("--output", default=DEFAULT_OUTPUT, help="JSON file the results are written to")
+    parser.add_argument("--baseline", help="earlier results to compare against; exits with 1 on regressions")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD_PERCENT, help="slowdown in percent that counts as a regression")
+    parser.add_argument("--quiet", action="store_true", help="only print the totals")
+    return parser
+
+def main(argv = None) -> int:
+    arguments = createArgumentParser().parse_args(argv)
+    stageNames = set(arguments.stages.split(","))
+    results = runBenchmarks(arguments.config, stageNames=stageNames, repeat=max(1, arguments.repeat),
+                            onResult=lambda *result: arguments.quiet or printResult(*result))
+    for stageName, stage in results["stages"].items():
+        printResult(stageName, "TOTAL", stage["total"])
+    with open(arguments.output, "w") as file:
+        json.dump(results, file, indent=1)
+    if not arguments.baseline:
+        return 0
+    with open(arguments.baseline) as file:
+        baseline = json.load(file)
+    regressions = compareResults(results, baseline, thresholdPercent=arguments.threshold)
+    for stageName, key, before, after in regressions:
+        change = f" ({(after / before - 1) * 100:+.0f}%)" if before else ""
+        print(f"REGRESSION {stageName} {key}: {before * 1000:.2f} ms -> {after * 1000:.2f} ms{change}")
+    return 1 if regressions else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,178 @@
+import argparse
+import os
+import sys
+import time
+
+#Command line front end for xpath_core, usable without a display. xpath_core (and through it the process pool and
+#asyncio) is only imported once a command actually runs, so --help and argument errors return right away.
+
+DEFAULT_CACHE_FOLDER = os.path.join(os.path.dirname(os.path.abspath(__file__)), "XPathCache") #Shared with the GUI
+
+EXIT_OK = 0
+EXIT_FAILED = 1
+
+def createArgumentParser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(prog="xpath_cli", description="Load, query and patch 7 Days to Die XML configs without the GUI.")
+    parser.add_argument("--game-root", default=".", help="game folder containing Data/Config and Mods (default: current folder)")
+    parser.add_argument("--cache", default=DEFAULT_CACHE_FOLDER, help="parse cache folder (default: the one the GUI uses)")
+    parser.add_argument("--no-cache", action="store_true", help="parse every file instead of using the parse cache")
+    parser.add_argument("--stats", action="store_true", help="print per-stage load timings and counters to stderr afterwards")
+    parser.add_argument("--profile", metavar="FILE", help="sample the command's stacks and write them to FILE in collapsed (flame graph) format")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    load = commands.add_parser("load", help="parse every config file and report errors")
+    load.add_argument("--mods", action="store_true", help="apply the installed mods on top")
+
+    query = commands.add_parser("query", help="evaluate an XPath over all config files")
+    query.add_argument("xpath")
+    query.add_argument("--mods", action="store_true", help="query the config with the installed mods applied")
+    query.add_argument("--limit", type=int, default=0, help="print at most this many matches (default: all)")
+
+    apply = commands.add_parser("apply", help="apply an xpath patch file and print what it changes")
+    apply.add_argument("patch")
+    apply.add_argument("--file", help="config file the patch targets, e.g. items.xml (default: the patch's path below Config/, else its name)")
+
+    commands.add_parser("diff", help="print what the installed mods change compared to the vanilla config")
+    return parser
+
+def getCacheFolder(arguments) -> str:
+    return "" if arguments.no_cache else arguments.cache
+
+def getConfigFolder(arguments) -> str:
+    from xpath_core import CONFIG_FOLDER_PATH
+    return os.path.join(arguments.game_root, CONFIG_FOLDER_PATH)
+
+async def loadDocuments(arguments, *, applyMods):
+    #(vanilla documents, displayed documents) keyed by file key. Both are the same dict without applyMods.
+    import concurrent.futures
+    from xpath_core import MODS_FOLDER_NAME, ModStack, loadConfigDocuments
+    instrumentation = arguments.instrumentation
+    with concurrent.futures.ProcessPoolExecutor() as executor:
+        start = time.perf_counter()
+        documents = await loadConfigDocuments(getConfigFolder(arguments), executor=executor, cacheFolder=getCacheFolder(arguments),
+                                              instrumentation=instrumentation)
+        instrumentation.addTime("load", time.perf_counter() - start, items=len(documents))
+        if not applyMods:
+            return documents, documents
+        start = time.perf_counter()
+        modStack = ModStack()
+        mergedDocuments = await modStack.update(os.path.join(arguments.game_root, MODS_FOLDER_NAME), documents, executor=executor)
+        instrumentation.addTime("mods", time.perf_counter() - start, items=len(mergedDocuments))
+    printModErrors(modStack)
+    return documents, {**documents, **mergedDocuments}
+
+def printModErrors(modStack) -> None:
+    for entry in modStack.entries.values():
+        for patchFile, result in zip(entry.patchFiles, entry.results):
+            for error in result.errors:
+                print(f"{patchFile.modName}/{patchFile.fileKey}: {error}", file=sys.stderr)
+    for patchFile in modStack.unmatchedPatchFiles:
+        print(f"{patchFile.modName}/{patchFile.fileKey}: no such config file", file=sys.stderr)
+
+def runLoad(arguments) -> int:
+    import asyncio
+    start = time.perf_counter()
+    _, documents = asyncio.run(loadDocuments(arguments, applyMods=arguments.mods))
+    failed = 0
+    for fileKey, document in sorted(documents.items()):
+        if document.error:
+            failed += 1
+            print(f"{fileKey}: {document.error}")
+    print(f"{len(documents)} files loaded, {failed} failed, {time.perf_counter() - start:.2f} s")
+    return EXIT_FAILED if failed else EXIT_OK
+
+def runQuery(arguments) -> int:
+    import asyncio
+    from xpath_core import XPathSyntaxError, compileXPath, evaluateXPaths, getFileKey
+    try:
+        compileXPath(arguments.xpath)
+    except XPathSyntaxError as e:
+        print(f"Invalid XPath: {e}", file=sys.stderr)
+        return EXIT_FAILED
+    _, documents = asyncio.run(loadDocuments(arguments, applyMods=arguments.mods))
+    configFolder = getConfigFolder(arguments)
+    matches = evaluateXPaths([arguments.xpath], documents.values())[arguments.xpath]
+    for document, match in matches[:arguments.limit or None]:
+        fileKey = getFileKey(configFolder, document.filePath)
+        if isinstance(match, tuple):
+            node, attributeName = match
+            print(f"{fileKey}: {node.xPath}/@{attributeName} = {node.attrib[attributeName]}")
+        else:
+            print(f"{fileKey}: {match.xPath}")
+    return EXIT_OK if matches else EXIT_FAILED
+
+def getPatchTarget(patchPath) -> str:
+    #Mods keep their patches in Config/ under the same relative path as the file they patch
+    from xpath_core import MOD_CONFIG_FOLDER_NAME
+    parts = os.path.abspath(patchPath).split(os.sep)
+    if MOD_CONFIG_FOLDER_NAME in parts[:-1]:
+        index = len(parts) - 1 - parts[::-1].index(MOD_CONFIG_FOLDER_NAME)
+        return "/".join(parts[index + 1:])
+    return parts[-1]
+
+def runApply(arguments) -> int:
+    from xpath_core import (ModPatchApplier, ModPatchFile, XmlDocument, flattenXmlTree, getFileSignature, parseXmlDocument,
+                            unflattenXmlTree)
+    fileKey = arguments.file or getPatchTarget(arguments.patch)
+    filePath = os.path.join(getConfigFolder(arguments), *fileKey.split("/"))
+    original = parseXmlDocument(filePath, getCacheFolder(arguments))
+    if original.root is None:
+        print(f"{fileKey}: {original.error or 'empty document'}", file=sys.stderr)
+        return EXIT_FAILED
+    original.loadSubtree(original.root)
+    patched = XmlDocument(filePath=filePath, fileSize=original.fileSize, root=unflattenXmlTree(flattenXmlTree(original.root)),
+                          encoding=original.encoding)
+    result = ModPatchApplier(patched).applyPatchFile(ModPatchFile("", fileKey, arguments.patch, getFileSignature(arguments.patch)))
+    for error in result.errors:
+        print(f"{arguments.patch}: {error}", file=sys.stderr)
+    printChanges(fileKey, original, patched)
+    print(f"{result.operationCount} operations applied, {len(result.errors)} failed", file=sys.stderr)
+    return EXIT_FAILED if result.errors else EXIT_OK
+
+def runDiff(arguments) -> int:
+    import asyncio
+    vanillaDocuments, documents = asyncio.run(loadDocuments(arguments, applyMods=True))
+    for fileKey, document in sorted(documents.items()):
+        if document is not vanillaDocuments[fileKey]:
+            printChanges(fileKey, vanillaDocuments[fileKey], document)
+    return EXIT_OK
+
+def printChanges(fileKey, oldDocument, newDocument) -> None:
+    from xpath_core import XML_CHANGE_ATTRIBUTE, XML_CHANGE_REMOVED, diffXmlDocuments
+    for change in diffXmlDocuments(oldDocument, newDocument):
+        if change.kind == XML_CHANGE_ATTRIBUTE:
+            print(f"{change.kind} {fileKey}: {change.newNode.xPath}/@{change.attributeName}: {change.oldValue!r} -> {change.newValue!r}")
+        elif change.kind == XML_CHANGE_REMOVED:
+            print(f"{change.kind} {fileKey}: {change.oldNode.xPath}")
+        else:
+            print(f"{change.kind} {fileKey}: {change.newNode.xPath}")
+
+COMMANDS = {
+    "load": runLoad,
+    "query": runQuery,
+    "apply": runApply,
+    "diff": runDiff,
+}
+
+def main(argv = None) -> int:
+    arguments = createArgumentParser().parse_args(argv)
+    from xpath_core import Instrumentation, SamplingProfiler, isReadableFolder
+    if not isReadableFolder(getConfigFolder(arguments)):
+        print(f"No readable config folder at {getConfigFolder(arguments)}, check --game-root", file=sys.stderr)
+        return EXIT_FAILED
+    arguments.instrumentation = Instrumentation()
+    profiler = SamplingProfiler()
+    if arguments.profile:
+        profiler.start()
+    try:
+        return COMMANDS[arguments.command](arguments)
+    finally:
+        profiler.stop()
+        if arguments.stats:
+            print(arguments.instrumentation.getReport(), file=sys.stderr)
+        if arguments.profile:
+            profiler.writeCollapsedStacks(arguments.profile)
+            print(profiler.getReport(), file=sys.stderr)
+
+if __name__ == "__main__":
+    sys.exit(main())
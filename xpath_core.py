@@ -0,0 +1,2421 @@
+import os
+import sys
+import glob
+import re
+import hashlib
+import marshal
+import mmap
+import struct
+import bisect
+import functools
+import time
+import xml.parsers.expat
+from array import array
+from collections import namedtuple, deque
+from typing import TYPE_CHECKING
+
+#The load, index, query and patch-writing core of XPath Modifier. Nothing here needs tkinter, and the heavier
+#standard modules (asyncio, concurrent.futures, ElementTree, tempfile) are only imported by the functions that use
+#them, so command line tools importing this start quickly.
+
+if TYPE_CHECKING:
+    import xml.etree.ElementTree as ETree
+
+def isReadableFile(filePath) -> bool:
+    return os.path.isfile(filePath) and os.access(filePath, os.R_OK)
+
+def getFileSize(filePath) -> int:
+    try:
+        return os.path.getsize(filePath)
+    except OSError:
+        return 0
+
+def isReadableFolder(folderPath) -> bool:
+    isDir = os.path.isdir(folderPath)
+    accessOk = os.access(folderPath, os.R_OK)
+    return isDir and accessOk 
+
+def isWriteableFolder(folderPath) -> bool:
+    return os.path.isdir(folderPath) and os.access(folderPath, os.W_OK)
+
+class Instrumentation:
+    #Timers and counters of the load pipeline, why files failed to parse and a short event log. Stages accumulate
+    #[calls, seconds, items]; items is whatever the stage processes (files, rows, elements).
+    MAX_LOG_LINES = 500
+
+    def __init__(self) -> None:
+        self.reset()
+
+    def reset(self) -> None:
+        self.stages = dict()
+        self.counters = dict()
+        self.failures = dict()
+        self.logLines = deque(maxlen=Instrumentation.MAX_LOG_LINES)
+
+    def addTime(self, stage: str, seconds: float, *, items: int = 0) -> None:
+        totals = self.stages.get(stage)
+        if totals is None:
+            self.stages[stage] = [1, seconds, items]
+        else:
+            totals[0] += 1
+            totals[1] += seconds
+            totals[2] += items
+
+    def count(self, name: str, amount: int = 1) -> None:
+        self.counters[name] = self.counters.get(name, 0) + amount
+
+    def recordFailure(self, filePath: str, reason: str) -> None:
+        self.failures[filePath] = reason
+        self.count("parse failures")
+        self.log(f"Could not parse {filePath}: {reason}")
+
+    def log(self, message: str) -> None:
+        self.logLines.append(f"{time.strftime('%H:%M:%S')} {message}")
+
+    def getReport(self) -> str:
+        lines = [f"{'Stage':<16}{'calls':>8}{'ms':>12}{'items':>10}"]
+        for stage, (calls, seconds, items) in self.stages.items():
+            lines.append(f"{stage:<16}{calls:>8}{seconds * 1000:>12.1f}{items:>10}")
+        lines.extend(f"{name}: {value}" for name, value in self.counters.items())
+        lines.extend(f"FAILED {filePath}: {reason}" for filePath, reason in self.failures.items())
+        return "\n".join(lines)
+
+class SamplingProfiler:
+    #Samples one thread's stack from a background thread. The stacks are kept collapsed ("outer;inner count" lines),
+    #the format flame graph tools read.
+    DEFAULT_INTERVAL = 0.005
+    MAX_REPORTED_FUNCTIONS = 15
+
+    def __init__(self, *, threadId = None, interval = DEFAULT_INTERVAL) -> None:
+        import threading
+        self.threadId = threadId or threading.main_thread().ident
+        self.interval = interval
+        self.samples = dict()
+        self.stopEvent = threading.Event()
+        self.thread = None
+
+    def isRunning(self) -> bool:
+        return self.thread is not None
+
+    def start(self) -> None:
+        import threading
+        if self.thread is not None:
+            return
+        self.stopEvent.clear()
+        self.thread = threading.Thread(target=self._sample, name="SamplingProfiler", daemon=True)
+        self.thread.start()
+
+    def stop(self) -> None:
+        if self.thread is None:
+            return
+        self.stopEvent.set()
+        self.thread.join()
+        self.thread = None
+
+    def _sample(self) -> None:
+        while not self.stopEvent.wait(self.interval):
+            frame = sys._current_frames().get(self.threadId)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                frame = frame.f_back
+            key = tuple(reversed(stack))
+            self.samples[key] = self.samples.get(key, 0) + 1
+
+    def getTopFunctions(self, limit = MAX_REPORTED_FUNCTIONS) -> list:
+        #(function, samples with it on top of the stack, samples with it anywhere on the stack), busiest first
+        selfCounts = dict()
+        totalCounts = dict()
+        for stack, count in self.samples.items():
+            if stack:
+                selfCounts[stack[-1]] = selfCounts.get(stack[-1], 0) + count
+            for function in set(stack):
+                totalCounts[function] = totalCounts.get(function, 0) + count
+        functions = sorted(totalCounts, key=lambda function: (selfCounts.get(function, 0), totalCounts[function]), reverse=True)
+        return [(function, selfCounts.get(function, 0), totalCounts[function]) for function in functions[:limit]]
+
+    def getReport(self) -> str:
+        total = sum(self.samples.values())
+        lines = [f"{total} samples every {self.interval * 1000:.0f} ms", f"{'self':>6}{'total':>7}  function"]
+        lines.extend(f"{selfCount:>6}{totalCount:>7}  {function}" for function, selfCount, totalCount in self.getTopFunctions())
+        return "\n".join(lines)
+
+    def writeCollapsedStacks(self, filePath) -> None:
+        writeFileAtomically(filePath, (f"{';'.join(stack)} {count}\n" for stack, count in self.samples.items()))
+
+class SearchIndex:
+    #Inverted index from lowercased terms (tag names, attribute names, attribute values, value tokens and
+    #"name=value" pairs of <property> style elements) to node ids. Substring lookup scans all distinct terms at
+    #once: they are joined into one string that is rebuilt lazily after documents are added.
+    MAX_RESULTS = 200
+    MIN_SUBSTRING_LENGTH = 3
+    TERM_SEPARATOR = "\n"
+    RANK_EXACT = 0
+    RANK_PREFIX = 1
+    RANK_SUBSTRING = 2
+    _tokenize = re.compile(r"[^\W_]+").findall
+
+    def __init__(self) -> None:
+        self.clear()
+
+    def clear(self) -> None:
+        self.nodes = []
+        self.postings = dict()
+        self.rootToDocument = dict()
+        self.documentNodeIds = dict()
+        self.removedNodeIds = set()
+        self._sortedTerms = None
+        self._joinedTerms = ""
+        self._termOffsets = []
+
+    def addDocumentSteps(self, document):
+        #Generator, yields after each node so indexing can be spread over frames
+        self.rootToDocument[document.root] = document
+        self.documentNodeIds.setdefault(document.root, [])
+        stack = [document.root]
+        while stack:
+            #Looked up every step: compaction replaces the list and removeDocument drops it while the job is paused
+            nodeIds = self.documentNodeIds.get(document.root)
+            if nodeIds is None:
+                return
+            node = stack.pop()
+            nodeIds.append(self._addNode(node))
+            stack.extend(reversed(node.children or ()))
+            yield
+
+    def removeDocument(self, document) -> None:
+        #The document's nodes are only skipped by search until more than half of the index is dead, then it is compacted
+        self.rootToDocument.pop(document.root, None)
+        self.removedNodeIds.update(self.documentNodeIds.pop(document.root, ()))
+        if len(self.removedNodeIds) * 2 > len(self.nodes):
+            self._compact()
+
+    def _compact(self) -> None:
+        newNodeIds = dict()
+        nodes = []
+        for nodeId, node in enumerate(self.nodes):
+            if nodeId not in self.removedNodeIds:
+                newNodeIds[nodeId] = len(nodes)
+                nodes.append(node)
+        self.nodes = nodes
+        postings = dict()
+        for term, nodeIds in self.postings.items():
+            nodeIds = [newNodeIds[nodeId] for nodeId in nodeIds if nodeId in newNodeIds]
+            if nodeIds:
+                postings[term] = nodeIds
+        self.postings = postings
+        self.documentNodeIds = {root: [newNodeIds[nodeId] for nodeId in nodeIds] for root, nodeIds in self.documentNodeIds.items()}
+        self.removedNodeIds = set()
+        self._sortedTerms = None
+
+    def _addNode(self, node) -> int:
+        nodeId = len(self.nodes)
+        self.nodes.append(node)
+        attributes = node.attrib
+        terms = {node.tag.lower()}
+        for name, value in attributes.items():
+            value = value.lower()
+            terms.add(name.lower())
+            terms.add(value)
+            terms.update(SearchIndex._tokenize(value))
+        if "name" in attributes and "value" in attributes:
+            terms.add(f"{attributes['name']}={attributes['value']}".lower())
+        for term in terms:
+            postings = self.postings.get(term)
+            if postings is None:
+                self.postings[term] = [nodeId]
+            else:
+                postings.append(nodeId)
+        self._sortedTerms = None
+        return nodeId
+
+    def getDocument(self, node) -> "XmlDocument":
+        while node.parent is not None:
+            node = node.parent
+        return self.rootToDocument.get(node)
+
+    def _ensureTermList(self) -> None:
+        if self._sortedTerms is not None:
+            return
+        self._sortedTerms = sorted(self.postings)
+        self._termOffsets = []
+        offset = 0
+        for term in self._sortedTerms:
+            self._termOffsets.append(offset)
+            offset += len(term) + len(SearchIndex.TERM_SEPARATOR)
+        self._joinedTerms = SearchIndex.TERM_SEPARATOR.join(self._sortedTerms)
+
+    def _matchTerms(self, word):
+        #Yields (term, rank) for every term that equals, starts with or (for long enough words) contains the word
+        terms = self._sortedTerms
+        start = bisect.bisect_left(terms, word)
+        index = start
+        while index < len(terms) and terms[index].startswith(word):
+            yield terms[index], SearchIndex.RANK_EXACT if terms[index] == word else SearchIndex.RANK_PREFIX
+            index += 1
+        if len(word) < SearchIndex.MIN_SUBSTRING_LENGTH:
+            return
+        position = self._joinedTerms.find(word)
+        while position != -1:
+            termIndex = bisect.bisect_right(self._termOffsets, position) - 1
+            if not start <= termIndex < index:
+                yield terms[termIndex], SearchIndex.RANK_SUBSTRING
+            position = self._joinedTerms.find(word, self._termOffsets[termIndex] + len(terms[termIndex]))
+
+    def search(self, query, *, limit = MAX_RESULTS) -> list:
+        words = query.lower().split()
+        if not words:
+            return []
+        self._ensureTermList()
+        nodeRanks = None
+        for word in words:
+            wordRanks = dict()
+            for term, rank in self._matchTerms(word):
+                for nodeId in self.postings[term]:
+                    if nodeId in self.removedNodeIds:
+                        continue
+                    if wordRanks.get(nodeId, rank + 1) > rank:
+                        wordRanks[nodeId] = rank
+            if nodeRanks is None:
+                nodeRanks = wordRanks
+            else:
+                nodeRanks = {nodeId: nodeRanks[nodeId] + rank for nodeId, rank in wordRanks.items() if nodeId in nodeRanks}
+        best = sorted(nodeRanks.items(), key=lambda item: (item[1], item[0]))[:limit]
+        return [self.nodes[nodeId] for nodeId, _ in best]
+
+class XmlNode:
+    #Picklable stand-in for ETree.Element so parse results can be sent back from the worker processes.
+    #Nodes of streamed files may have children == None: their subtree is read back from sourceOffset when needed.
+    #The nodes double as a path trie: the XPath is only built from the parent chain and the tag's index among
+    #its siblings when something asks for it, and then kept.
+    __slots__ = ("tag", "attrib", "children", "parent", "index", "sourceOffset", "cachedXPath")
+
+    def __init__(self, tag: str, attrib: dict, children: list, parent: "XmlNode" = None, index: int = 1, sourceOffset: int = -1) -> None:
+        self.tag = tag
+        self.attrib = attrib
+        self.children = children
+        self.parent = parent
+        self.index = index
+        self.sourceOffset = sourceOffset
+        self.cachedXPath = None
+
+    @staticmethod
+    def fromElement(element: "ETree.Element", *, parent: "XmlNode" = None, index: int = 1) -> "XmlNode":
+        node = XmlNode(sys.intern(element.tag), internKeys(element.attrib), [], parent, index)
+        siblingCounts = SiblingCounts()
+        for child in element:
+            node.children.append(XmlNode.fromElement(child, parent=node, index=siblingCounts.next(child.tag)))
+        return node
+
+    @property
+    def xPath(self) -> str:
+        if self.cachedXPath is None:
+            if self.parent is None:
+                self.cachedXPath = f"/{self.tag}"
+            else:
+                self.cachedXPath = f"{self.parent.xPath}/{self.tag}[{self.index}]"
+        return self.cachedXPath
+
+    def setChildren(self, children: list) -> None:
+        for child in children:
+            child.parent = self
+        self.children = children
+
+    def isLoaded(self) -> bool:
+        return self.children is not None
+
+    def items(self):
+        return self.attrib.items()
+
+    def __iter__(self):
+        return iter(self.children or ())
+
+    def __len__(self) -> int:
+        return len(self.children or ())
+
+class XmlDocument:
+    __slots__ = ("filePath", "fileSize", "root", "error", "encoding", "queryIndex")
+
+    def __init__(self, *, filePath: str, fileSize: int = 0, root: XmlNode = None, error: str = "", encoding: str = "utf-8") -> None:
+        self.filePath = filePath
+        self.fileSize = fileSize
+        self.root = root
+        self.error = error
+        self.encoding = encoding
+        self.queryIndex = None
+
+    #Pickled as flat preorder lists: a few big lists of str/dict/int pickle several times faster than one object per element
+    def __getstate__(self):
+        return (self.filePath, self.fileSize, self.error, self.encoding, flattenXmlTree(self.root))
+
+    def __setstate__(self, state) -> None:
+        self.filePath, self.fileSize, self.error, self.encoding, flatTree = state
+        self.root = unflattenXmlTree(flatTree)
+        self.queryIndex = None
+
+    def getQueryIndex(self) -> "XPathQueryIndex":
+        if self.queryIndex is None:
+            self.queryIndex = XPathQueryIndex(self.root)
+        return self.queryIndex
+
+    def invalidateQueryIndex(self) -> None:
+        self.queryIndex = None
+
+    def loadChildren(self, node: XmlNode) -> None:
+        if node.isLoaded():
+            return
+        records = iterXmlRecords(readChunks(self.filePath, offset=node.sourceOffset), encoding=self.encoding,
+                                 baseOffset=node.sourceOffset, isFragment=True)
+        node.setChildren(buildXmlTree(records).children)
+        self.invalidateQueryIndex()
+
+    def readSubtree(self, node: XmlNode) -> XmlNode:
+        #The node itself if it is loaded, otherwise a detached copy read from the file that the document does not keep.
+        #The copy keeps the node's parent and index, so its elements have the same XPaths as the document's.
+        if node.isLoaded():
+            return node
+        records = iterXmlRecords(readChunks(self.filePath, offset=node.sourceOffset), encoding=self.encoding,
+                                 baseOffset=node.sourceOffset, isFragment=True)
+        subtree = buildXmlTree(records)
+        subtree.parent, subtree.index = node.parent, node.index
+        return subtree
+
+    def loadSubtree(self, node: XmlNode) -> None:
+        stack = [node]
+        while stack:
+            node = stack.pop()
+            self.loadChildren(node)
+            stack.extend(node.children)
+
+    def findNode(self, xPath: str) -> XmlNode:
+        #Resolves the XPaths XmlNode.xPath builds (/root/tag[index]/...), None if there is no such element
+        steps = xPath.split("/")[1:]
+        node = self.root
+        if node is None or not steps or steps[0] != node.tag:
+            return None
+        for step in steps[1:]:
+            tag, _, index = step.partition("[")
+            index = int(index[:-1]) if index else 1
+            self.loadChildren(node)
+            node = next((child for child in node if child.index == index and child.tag == tag), None)
+            if node is None:
+                return None
+        return node
+
+    def unloadChildren(self, node: XmlNode) -> None:
+        #Only subtrees that can be read back from the file are dropped
+        if node.sourceOffset >= 0:
+            node.children = None
+
+def flattenXmlTree(root: XmlNode):
+    if root is None:
+        return None
+    tags, attributes, childCounts, indices, sourceOffsets = [], [], [], [], dict()
+    def visit(node):
+        if node.sourceOffset >= 0 and not node.isLoaded():
+            sourceOffsets[len(tags)] = node.sourceOffset
+        tags.append(node.tag)
+        attributes.append(node.attrib)
+        childCounts.append(len(node))
+        indices.append(node.index)
+        for child in node:
+            visit(child)
+    visit(root)
+    return (tags, attributes, childCounts, indices, sourceOffsets)
+
+def unflattenXmlTree(flatTree) -> XmlNode:
+    if flatTree is None:
+        return None
+    tags, attributes, childCounts, indices, sourceOffsets = flatTree
+    nextIndex = iter(range(len(tags))).__next__
+    def build(parent):
+        index = nextIndex()
+        if index in sourceOffsets:
+            return XmlNode(tags[index], attributes[index], None, parent, indices[index], sourceOffsets[index])
+        node = XmlNode(tags[index], attributes[index], [], parent, indices[index])
+        node.children = [build(node) for _ in range(childCounts[index])]
+        return node
+    return build(None)
+
+def iterPreorder(root: XmlNode):
+    #Loaded nodes only, children of unloaded nodes are skipped
+    stack = [root]
+    while stack:
+        node = stack.pop()
+        yield node
+        stack.extend(reversed(node.children or ()))
+
+def renumberXmlTree(root: XmlNode) -> None:
+    #Recomputes the sibling indices after children were added or removed and drops the cached XPaths
+    stack = [root]
+    while stack:
+        node = stack.pop()
+        node.cachedXPath = None
+        siblingCounts = SiblingCounts()
+        for child in node:
+            child.index = siblingCounts.next(child.tag)
+            stack.append(child)
+
+class SiblingCounts:
+    #Per parent: the next 1-based XPath index for each child tag
+    __slots__ = ("_counts",)
+
+    def __init__(self) -> None:
+        self._counts = dict()
+
+    def next(self, tag: str) -> int:
+        index = self._counts.get(tag, 0) + 1
+        self._counts[tag] = index
+        return index
+
+def internKeys(attributes: dict) -> dict:
+    #Attribute names repeat on every element, sharing them also keeps pickled/marshalled trees small
+    return {sys.intern(name): value for name, value in attributes.items()}
+
+STREAMING_THRESHOLD_BYTES = 4 * 1024 * 1024
+STREAMING_KEEP_DEPTH = 1 #Streamed files keep the root and its children in memory, deeper subtrees are read on demand
+READ_CHUNK_SIZE = 64 * 1024
+
+XmlRecord = namedtuple("XmlRecord", ("depth", "tag", "index", "attrib", "line", "offset"))
+
+class _EndOfFragment(Exception):
+    pass
+
+def readChunks(filePath, *, offset = 0, chunkSize = READ_CHUNK_SIZE):
+    with open(filePath, "rb") as file:
+        file.seek(offset)
+        while chunk := file.read(chunkSize):
+            yield chunk
+
+def hashChunks(chunks, hasher):
+    for chunk in chunks:
+        hasher.update(chunk)
+        yield chunk
+
+def iterXmlRecords(chunks, *, encoding = None, baseOffset = 0, isFragment = False):
+    #Streams one XmlRecord per element without building a DOM. With isFragment the chunks start at an element
+    #(a stored sourceOffset) and reading stops at its end tag.
+    parser = xml.parsers.expat.ParserCreate(encoding)
+    pending = []
+    #One counter per open element, the record's index is its position among same-tag siblings
+    siblingCountsStack = [SiblingCounts()]
+
+    def onStart(tag, attrib):
+        index = siblingCountsStack[-1].next(tag)
+        pending.append(XmlRecord(len(siblingCountsStack) - 1, tag, index, attrib, parser.CurrentLineNumber, baseOffset + parser.CurrentByteIndex))
+        siblingCountsStack.append(SiblingCounts())
+
+    def onEnd(tag):
+        siblingCountsStack.pop()
+        if isFragment and len(siblingCountsStack) == 1:
+            raise _EndOfFragment()
+
+    parser.StartElementHandler = onStart
+    parser.EndElementHandler = onEnd
+    try:
+        for chunk in chunks:
+            parser.Parse(chunk, False)
+            yield from pending
+            pending.clear()
+        parser.Parse(b"", True)
+    except _EndOfFragment:
+        pass
+    yield from pending
+
+def buildXmlTree(records, *, maxDepth = None) -> XmlNode:
+    #Nodes deeper than maxDepth are not kept, their ancestor at maxDepth remembers where its subtree starts instead
+    root = None
+    stack = []
+    for record in records:
+        if maxDepth is not None and record.depth > maxDepth:
+            stack[maxDepth].children = None
+            continue
+        del stack[record.depth:]
+        parent = stack[-1] if stack else None
+        node = XmlNode(sys.intern(record.tag), internKeys(record.attrib), [], parent, record.index, record.offset if record.depth == maxDepth else -1)
+        if parent is not None:
+            parent.children.append(node)
+        else:
+            root = node
+        stack.append(node)
+    return root
+
+def detectXmlEncoding(filePath) -> str:
+    with open(filePath, "rb") as file:
+        declaration = re.match(rb"^(?:\xef\xbb\xbf)?<\?xml[^>]*encoding=[\"']([A-Za-z0-9._-]+)[\"']", file.read(256))
+    return declaration.group(1).decode("ascii") if declaration else "utf-8"
+
+def parseXmlDocument(filePath, cacheFolder = "") -> XmlDocument:
+    #Runs in a worker process
+    import xml.etree.ElementTree as ETree
+    try:
+        stat = os.stat(filePath)
+        if stat.st_size > STREAMING_THRESHOLD_BYTES:
+            document, contentHash = streamXmlDocument(filePath)
+        else:
+            with open(filePath, "rb") as file:
+                content = file.read()
+            root = XmlNode.fromElement(ETree.fromstring(content))
+            document = XmlDocument(filePath=filePath, fileSize=len(content), root=root)
+            contentHash = XmlParseCache.hashContent(content)
+    except Exception as e:
+        return XmlDocument(filePath=filePath, error=str(e))
+    if cacheFolder:
+        XmlParseCache(cacheFolder).store(document, mtime=stat.st_mtime_ns, contentHash=contentHash)
+    return document
+
+def streamXmlDocument(filePath):
+    hasher = XmlParseCache.createHasher()
+    encoding = detectXmlEncoding(filePath)
+    records = iterXmlRecords(hashChunks(readChunks(filePath), hasher))
+    root = buildXmlTree(records, maxDepth=STREAMING_KEEP_DEPTH)
+    return XmlDocument(filePath=filePath, fileSize=getFileSize(filePath), root=root, encoding=encoding), hasher.digest()
+
+class XmlParseCache:
+    #One file per source XML: a fixed header (mtime, size, content hash) followed by the marshalled flat tree
+    FILE_EXTENSION = ".xpc"
+    MAGIC = b"XPC3"
+    HEADER_FORMAT = "<4sqq16s"
+    HEADER_SIZE = struct.calcsize(HEADER_FORMAT)
+
+    def __init__(self, cacheFolder) -> None:
+        self.cacheFolder = cacheFolder
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        self.bytesRead = 0
+
+    @staticmethod
+    def createHasher():
+        return hashlib.blake2b(digest_size=16)
+
+    @staticmethod
+    def hashContent(content) -> bytes:
+        hasher = XmlParseCache.createHasher()
+        hasher.update(content)
+        return hasher.digest()
+
+    def getCacheFilePath(self, filePath) -> str:
+        key = hashlib.blake2b(os.path.abspath(filePath).encode(), digest_size=16).hexdigest()
+        return os.path.join(self.cacheFolder, key + XmlParseCache.FILE_EXTENSION)
+
+    def load(self, filePath) -> XmlDocument:
+        document = self._load(filePath)
+        if document is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return document
+
+    def _load(self, filePath) -> XmlDocument:
+        cacheFilePath = self.getCacheFilePath(filePath)
+        try:
+            stat = os.stat(filePath)
+            with open(cacheFilePath, "rb") as file, mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                magic, mtime, size, contentHash = struct.unpack_from(XmlParseCache.HEADER_FORMAT, mapped)
+                isValid = magic == XmlParseCache.MAGIC and size == stat.st_size
+                isTouched = isValid and mtime != stat.st_mtime_ns
+                if isTouched:
+                    #Touched but maybe not changed (copied, checked out again...), only then is the content hashed
+                    hasher = XmlParseCache.createHasher()
+                    for _ in hashChunks(readChunks(filePath), hasher):
+                        pass
+                    isValid = hasher.digest() == contentHash
+                if isValid:
+                    with memoryview(mapped) as view:
+                        encoding, flatTree = marshal.loads(view[XmlParseCache.HEADER_SIZE:])
+                    self.bytesRead += len(mapped)
+        except (OSError, ValueError, EOFError, TypeError, struct.error):
+            return None
+        if not isValid:
+            self._invalidate(cacheFilePath)
+            return None
+        if isTouched:
+            self._updateMTime(cacheFilePath, stat.st_mtime_ns)
+        return XmlDocument(filePath=filePath, fileSize=stat.st_size, root=unflattenXmlTree(flatTree), encoding=encoding)
+
+    def _invalidate(self, cacheFilePath) -> None:
+        self.invalidations += 1
+        try:
+            os.remove(cacheFilePath)
+        except OSError:
+            pass
+
+    def _updateMTime(self, cacheFilePath, mtime) -> None:
+        try:
+            with open(cacheFilePath, "r+b") as file:
+                file.seek(struct.calcsize("<4s"))
+                file.write(struct.pack("<q", mtime))
+        except OSError:
+            pass
+
+    def store(self, document: XmlDocument, *, mtime, contentHash) -> None:
+        cacheFilePath = self.getCacheFilePath(document.filePath)
+        temporaryPath = f"{cacheFilePath}.{os.getpid()}.tmp"
+        try:
+            os.makedirs(self.cacheFolder, exist_ok=True)
+            with open(temporaryPath, "wb") as file:
+                file.write(struct.pack(XmlParseCache.HEADER_FORMAT, XmlParseCache.MAGIC, mtime, document.fileSize, contentHash))
+                file.write(marshal.dumps((document.encoding, flattenXmlTree(document.root))))
+            os.replace(temporaryPath, cacheFilePath)
+        except OSError:
+            try:
+                os.remove(temporaryPath)
+            except OSError:
+                pass
+
+    def getStatistics(self) -> str:
+        return (f"Hits: {self.hits}\n"
+                f"Misses: {self.misses}\n"
+                f"Invalidated entries: {self.invalidations}\n"
+                f"Bytes read: {self.bytesRead}")
+
+CONFIG_FOLDER_PATH = os.path.join("Data", "Config") #Relative to the game root
+MAX_DEPTH_FOLDER_RECURSE = 10
+
+def getFileKey(configFolder, filePath) -> str:
+    #The file's path relative to the config folder, e.g. "XUi/windows.xml"
+    return sys.intern(os.path.relpath(filePath, start=configFolder).replace(os.sep, "/"))
+
+def findXmlFiles(folderPath, *, depth = 0) -> list:
+    if depth > MAX_DEPTH_FOLDER_RECURSE:
+        return []
+    filePaths = sorted(glob.glob(os.path.join(folderPath, "*.xml")))
+    for entry in sorted(os.scandir(folderPath), key=lambda entry: entry.name):
+        if entry.is_dir():
+            filePaths.extend(findXmlFiles(entry.path, depth=depth+1))
+    return filePaths
+
+def parseXmlDocumentTimed(filePath, cacheFolder = ""):
+    #Runs in a worker process: (document, seconds spent parsing it there)
+    start = time.perf_counter()
+    document = parseXmlDocument(filePath, cacheFolder)
+    return (document, time.perf_counter() - start)
+
+async def loadXmlDocuments(filePaths, *, executor, parseCache: XmlParseCache, instrumentation: Instrumentation = None):
+    #Async generator: cached documents first, then the others as the executor finishes parsing them. The largest files
+    #are submitted first so that the slowest parse starts right away and the rest fill the other workers around it.
+    import asyncio
+    instrumentation = instrumentation or Instrumentation()
+    loop = asyncio.get_running_loop()
+    futures = []
+    try:
+        for filePath in sorted(filePaths, key=getFileSize, reverse=True):
+            document = None
+            if parseCache.cacheFolder:
+                start = time.perf_counter()
+                document = parseCache.load(filePath)
+                instrumentation.addTime("cache lookup", time.perf_counter() - start, items=document is not None)
+            if document is None:
+                futures.append(loop.run_in_executor(executor, parseXmlDocumentTimed, filePath, parseCache.cacheFolder))
+            else:
+                if document.error:
+                    instrumentation.recordFailure(document.filePath, document.error)
+                yield document
+                await asyncio.sleep(0)
+        for future in asyncio.as_completed(futures):
+            document, seconds = await future
+            instrumentation.addTime("parse (workers)", seconds, items=1)
+            if document.error:
+                instrumentation.recordFailure(document.filePath, document.error)
+            yield document
+    finally:
+        for future in futures:
+            future.cancel()
+
+async def loadConfigDocuments(configFolder, *, executor, cacheFolder = "", instrumentation: Instrumentation = None) -> dict:
+    return {getFileKey(configFolder, document.filePath): document
+            async for document in loadXmlDocuments(findXmlFiles(configFolder), executor=executor, parseCache=XmlParseCache(cacheFolder),
+                                                   instrumentation=instrumentation)}
+
+def loadConfigFolder(configFolder, *, cacheFolder = "", maxWorkers = None) -> dict:
+    #Blocking version for scripts: fileKey -> XmlDocument, parsed in worker processes and cached just like in the GUI
+    import asyncio
+    import concurrent.futures
+    async def load():
+        with concurrent.futures.ProcessPoolExecutor(max_workers=maxWorkers) as executor:
+            return await loadConfigDocuments(configFolder, executor=executor, cacheFolder=cacheFolder)
+    return asyncio.run(load())
+
+class PollingFileWatcher:
+    #Compares the signatures of the XML files below the watched folders with the previous poll's
+    def __init__(self, folders) -> None:
+        self.folders = [folder for folder in folders if os.path.isdir(folder)]
+        self.signatures = self._scan()
+
+    def _scan(self) -> dict:
+        signatures = dict()
+        for folder in self.folders:
+            if os.path.isdir(folder):
+                signatures.update((filePath, getFileSignature(filePath)) for filePath in findXmlFiles(folder))
+        return signatures
+
+    def poll(self) -> set:
+        #The paths of the XML files that were added, changed or removed since the last poll
+        signatures = self._scan()
+        changedPaths = {filePath for filePath, signature in signatures.items() if self.signatures.get(filePath) != signature}
+        changedPaths.update(set(self.signatures) - set(signatures))
+        self.signatures = signatures
+        return changedPaths
+
+    def close(self) -> None:
+        self.signatures = dict()
+
+class InotifyFileWatcher:
+    #Linux only: one inotify watch per folder, read without blocking. Reports changed files and folders that were
+    #created, moved or deleted as a whole; the watched folders themselves when the kernel's event queue overflowed.
+    IN_CLOSE_WRITE = 0x8
+    IN_MOVED_FROM = 0x40
+    IN_MOVED_TO = 0x80
+    IN_CREATE = 0x100
+    IN_DELETE = 0x200
+    IN_DELETE_SELF = 0x400
+    IN_Q_OVERFLOW = 0x4000
+    IN_IGNORED = 0x8000
+    IN_ISDIR = 0x40000000
+    IN_NONBLOCK = 0o4000
+    IN_CLOEXEC = 0o2000000
+    WATCH_MASK = IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE | IN_DELETE_SELF
+    EVENT_HEADER = struct.Struct("iIII")
+    READ_SIZE = 64 * 1024
+
+    def __init__(self, folders) -> None:
+        import ctypes
+        import ctypes.util
+        self.libc = ctypes.CDLL(ctypes.util.find_library("c") or None, use_errno=True)
+        self.fd = self.libc.inotify_init1(InotifyFileWatcher.IN_NONBLOCK | InotifyFileWatcher.IN_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        self.folders = [folder for folder in folders if os.path.isdir(folder)]
+        self.watchToFolder = dict()
+        for folder in self.folders:
+            self._addWatches(folder)
+
+    def _addWatches(self, folder, *, depth = 0) -> None:
+        import ctypes
+        if depth > MAX_DEPTH_FOLDER_RECURSE:
+            return
+        watch = self.libc.inotify_add_watch(self.fd, os.fsencode(folder), InotifyFileWatcher.WATCH_MASK)
+        if watch < 0:
+            if depth == 0:
+                raise OSError(ctypes.get_errno(), f"inotify_add_watch failed for {folder}")
+            return
+        self.watchToFolder[watch] = folder
+        for entry in os.scandir(folder):
+            if entry.is_dir():
+                self._addWatches(entry.path, depth=depth+1)
+
+    def poll(self) -> set:
+        changedPaths = set()
+        while True:
+            try:
+                data = os.read(self.fd, InotifyFileWatcher.READ_SIZE)
+            except BlockingIOError:
+                return changedPaths
+            offset = 0
+            while offset < len(data):
+                watch, mask, _, nameLength = InotifyFileWatcher.EVENT_HEADER.unpack_from(data, offset)
+                offset += InotifyFileWatcher.EVENT_HEADER.size
+                name = os.fsdecode(data[offset:offset + nameLength].rstrip(b"\0"))
+                offset += nameLength
+                if mask & InotifyFileWatcher.IN_Q_OVERFLOW:
+                    changedPaths.update(self.folders)
+                    continue
+                if mask & InotifyFileWatcher.IN_IGNORED:
+                    self.watchToFolder.pop(watch, None)
+                    continue
+                folder = self.watchToFolder.get(watch)
+                if folder is None:
+                    continue
+                path = os.path.join(folder, name) if name else folder
+                if mask & InotifyFileWatcher.IN_ISDIR:
+                    if mask & (InotifyFileWatcher.IN_CREATE | InotifyFileWatcher.IN_MOVED_TO) and os.path.isdir(path):
+                        self._addWatches(path)
+                    changedPaths.add(path)
+                elif name.lower().endswith(".xml") or not name:
+                    changedPaths.add(path)
+
+    def close(self) -> None:
+        if self.fd >= 0:
+            os.close(self.fd)
+            self.fd = -1
+
+def createFileWatcher(folders):
+    #Anything with poll() -> changed paths and close(): inotify where available, otherwise polling
+    if sys.platform.startswith("linux"):
+        try:
+            return InotifyFileWatcher(folders)
+        except (OSError, AttributeError):
+            pass
+    return PollingFileWatcher(folders)
+
+XmlChange = namedtuple("XmlChange", ("kind", "oldNode", "newNode", "attributeName", "oldValue", "newValue"))
+XML_CHANGE_ADDED = "+"
+XML_CHANGE_REMOVED = "-"
+XML_CHANGE_ATTRIBUTE = "~"
+
+def matchXmlChildren(oldNode: XmlNode, newNode: XmlNode):
+    #Pairs children up by tag and name attribute, in order among the ones sharing both, so that an inserted element
+    #does not turn every later sibling into a change. A renamed element counts as removed and added.
+    #Returns (pairs, removed old children, added new children).
+    candidates = dict()
+    for child in reversed(oldNode.children):
+        candidates.setdefault((child.tag, child.attrib.get("name")), []).append(child)
+    pairs = []
+    added = []
+    for child in newNode:
+        sameKey = candidates.get((child.tag, child.attrib.get("name")))
+        if sameKey:
+            pairs.append((sameKey.pop(), child))
+        else:
+            added.append(child)
+    unmatched = {child for sameKey in candidates.values() for child in sameKey}
+    return (pairs, [child for child in oldNode if child in unmatched], added)
+
+def diffXmlDocuments(oldDocument: XmlDocument, newDocument: XmlDocument):
+    #Yields an XmlChange per added or removed element and per changed, added or removed attribute
+    if oldDocument.root is None or newDocument.root is None or oldDocument.root.tag != newDocument.root.tag:
+        if oldDocument.root is not None:
+            yield XmlChange(XML_CHANGE_REMOVED, oldDocument.root, None, None, None, None)
+        if newDocument.root is not None:
+            yield XmlChange(XML_CHANGE_ADDED, None, newDocument.root, None, None, None)
+        return
+    stack = [(oldDocument.root, newDocument.root)]
+    while stack:
+        oldNode, newNode = stack.pop()
+        if oldNode.attrib != newNode.attrib:
+            for name in dict.fromkeys((*oldNode.attrib, *newNode.attrib)):
+                oldValue, newValue = oldNode.attrib.get(name), newNode.attrib.get(name)
+                if oldValue != newValue:
+                    yield XmlChange(XML_CHANGE_ATTRIBUTE, oldNode, newNode, name, oldValue, newValue)
+        oldDocument.loadChildren(oldNode)
+        newDocument.loadChildren(newNode)
+        pairs, removed, added = matchXmlChildren(oldNode, newNode)
+        for child in removed:
+            yield XmlChange(XML_CHANGE_REMOVED, child, None, None, None, None)
+        for child in added:
+            yield XmlChange(XML_CHANGE_ADDED, None, child, None, None, None)
+        stack.extend(reversed(pairs))
+
+class XPathSyntaxError(ValueError):
+    pass
+
+class XPathQueryIndex:
+    #Built once per document on its first query: preorder keys plus tag and (attribute, value) lookups. The keys are
+    #spread ORDER_SPACING apart so that mod patches can insert nodes in between without renumbering the document.
+    ORDER_SPACING = 1 << 32
+
+    def __init__(self, root: XmlNode) -> None:
+        self.root = root
+        self.byTag = dict()
+        self.byAttribute = dict()
+        for node in iterPreorder(root):
+            self.byTag.setdefault(node.tag, []).append(node)
+            for name, value in node.attrib.items():
+                self.byAttribute.setdefault((name, value), []).append(node)
+        self._renumber()
+
+    def _renumber(self) -> None:
+        self.order = {node: position * XPathQueryIndex.ORDER_SPACING for position, node in enumerate(iterPreorder(self.root))}
+
+    def insertNodes(self, parent: XmlNode, position: int, count: int) -> None:
+        #The nodes parent.children[position:position + count] and their subtrees were just inserted
+        nodes = [node for child in parent.children[position:position + count] for node in iterPreorder(child)]
+        if not nodes:
+            return
+        previous = parent
+        if position > 0:
+            previous = parent.children[position - 1]
+            while previous.children:
+                previous = previous.children[-1]
+        start = self.order[previous]
+        following = self._getFollowingKey(parent.children[position + count - 1])
+        step = XPathQueryIndex.ORDER_SPACING
+        if following is not None:
+            step = min(step, (following - start) // (len(nodes) + 1))
+        if step == 0:
+            #No room left between the neighbours
+            self._renumber()
+        else:
+            for offset, node in enumerate(nodes, 1):
+                self.order[node] = start + offset * step
+        for node in nodes:
+            bisect.insort(self.byTag.setdefault(node.tag, []), node, key=self.order.__getitem__)
+            for name, value in node.attrib.items():
+                bisect.insort(self.byAttribute.setdefault((name, value), []), node, key=self.order.__getitem__)
+
+    def removeNodes(self, root: XmlNode) -> None:
+        #Drops the subtree, call before unlinking it
+        nodes = list(iterPreorder(root))
+        for node in nodes:
+            XPathQueryIndex._removeSorted(self.byTag[node.tag], self.order[node], self.order.__getitem__)
+            for name, value in node.attrib.items():
+                XPathQueryIndex._removeSorted(self.byAttribute[(name, value)], self.order[node], self.order.__getitem__)
+        for node in nodes:
+            del self.order[node]
+
+    @staticmethod
+    def _removeSorted(nodes: list, key: int, getKey) -> None:
+        del nodes[bisect.bisect_left(nodes, key, key=getKey)]
+
+    def _getFollowingKey(self, node: XmlNode) -> int:
+        #Key of the first node after the node's subtree in document order, None at the end of the document
+        while node.parent is not None:
+            siblings = node.parent.children
+            position = siblings.index(node) + 1
+            if position < len(siblings):
+                return self.order[siblings[position]]
+            node = node.parent
+        return None
+
+    def replaceAttributes(self, node: XmlNode, oldAttributes: dict, newAttributes: dict) -> None:
+        #Keeps byAttribute in document order without rebuilding the index, the node's position does not change
+        for name, value in oldAttributes.items():
+            if newAttributes.get(name) != value:
+                self.byAttribute[(name, value)].remove(node)
+        for name, value in newAttributes.items():
+            if oldAttributes.get(name) != value:
+                bisect.insort(self.byAttribute.setdefault((name, value), []), node, key=self.order.__getitem__)
+
+class XPathContext:
+    __slots__ = ("document", "documentNode", "queryIndex")
+
+    def __init__(self, document: XmlDocument) -> None:
+        self.document = document
+        #Parent of the root element, the starting point of absolute paths. The root's parent pointer is left alone.
+        self.documentNode = XmlNode("", dict(), [document.root])
+        self.queryIndex = document.getQueryIndex()
+
+    def getChildren(self, node: XmlNode) -> list:
+        if not node.isLoaded():
+            self.document.loadChildren(node)
+        return node.children
+
+    def isDescendant(self, node: XmlNode, ancestor: XmlNode) -> bool:
+        if ancestor is self.documentNode:
+            return True
+        node = node.parent
+        while node is not None:
+            if node is ancestor:
+                return True
+            node = node.parent
+        return False
+
+    def sortKey(self, item) -> int:
+        node = item[0] if isinstance(item, tuple) else item
+        return self.queryIndex.order.get(node, -1)
+
+class XPathStep:
+    #axis is one of "child", "descendant", "descendant-or-self", "attribute", "self" or "parent". Attribute steps yield
+    #(node, name) tuples.
+    __slots__ = ("axis", "name", "predicates", "indexedAttribute")
+
+    def __init__(self, *, axis, name, predicates) -> None:
+        self.axis = axis
+        self.name = name
+        self.predicates = predicates
+        #A leading [@name='value'] predicate lets child/descendant steps start from the attribute index, unless it also
+        #depends on the position, which the index does not know
+        self.indexedAttribute = None
+        if predicates and axis in ("child", "descendant") and not predicates[0].isPositional:
+            self.indexedAttribute = predicates[0].equalityAttribute
+
+    def matchesTag(self, node: XmlNode) -> bool:
+        return self.name == "*" or node.tag == self.name
+
+    def apply(self, contextNodes: list, context: XPathContext) -> list:
+        if self.axis == "attribute":
+            return [(node, name) for node in contextNodes if isinstance(node, XmlNode)
+                    for name in (node.attrib if self.name == "*" else (self.name,) if self.name in node.attrib else ())]
+        contextNodes = [node for node in contextNodes if isinstance(node, XmlNode)]
+        if self.indexedAttribute is not None and (len(contextNodes) > 1 or self.axis == "descendant"):
+            groups = self._candidatesFromIndex(contextNodes, context)
+        else:
+            groups = [self._candidates(node, context) for node in contextNodes]
+        results = []
+        for candidates in groups:
+            for predicate in self.predicates:
+                size = len(candidates)
+                candidates = [node for position, node in enumerate(candidates, 1) if predicate.test(node, position, size, context)]
+            results.extend(candidates)
+        if self.axis in ("descendant", "descendant-or-self", "parent") and len(contextNodes) > 1:
+            results = sorted(dict.fromkeys(results), key=context.sortKey)
+        return results
+
+    def _candidates(self, node: XmlNode, context: XPathContext) -> list:
+        if self.axis == "child":
+            return [child for child in context.getChildren(node) if self.matchesTag(child)]
+        if self.axis == "self":
+            return [node] if self.matchesTag(node) else []
+        if self.axis == "parent":
+            parent = node.parent if node.parent is not None else context.documentNode if node is context.document.root else None
+            return [parent] if parent is not None and self.matchesTag(parent) else []
+        if self.axis == "descendant" and self.name != "*" and node is context.documentNode:
+            return list(context.queryIndex.byTag.get(self.name, ()))
+        descendants = [node] if self.axis == "descendant-or-self" and self.matchesTag(node) else []
+        stack = list(reversed(context.getChildren(node)))
+        while stack:
+            descendant = stack.pop()
+            if self.matchesTag(descendant):
+                descendants.append(descendant)
+            stack.extend(reversed(context.getChildren(descendant)))
+        return descendants
+
+    def _candidatesFromIndex(self, contextNodes: list, context: XPathContext) -> list:
+        #Candidates are grouped per context node, in document order, so that positional predicates still count per parent
+        contextPositions = {node: position for position, node in enumerate(contextNodes)}
+        groups = [[] for _ in contextNodes]
+        for node in context.queryIndex.byAttribute.get(self.indexedAttribute, ()):
+            if not self.matchesTag(node):
+                continue
+            if self.axis == "child":
+                parent = node.parent if node.parent is not None else context.documentNode
+                if parent in contextPositions:
+                    groups[contextPositions[parent]].append(node)
+            else:
+                for position, contextNode in enumerate(contextNodes):
+                    if context.isDescendant(node, contextNode):
+                        groups[position].append(node)
+        return groups
+
+class XPathPredicate:
+    __slots__ = ("expression", "equalityAttribute", "isPositional")
+
+    def __init__(self, expression) -> None:
+        self.expression = expression
+        self.equalityAttribute = expression.getEqualityAttribute()
+        #Numbers select by position, so [2] and [count(x)] are positional as well as [position() > 1]
+        self.isPositional = expression.usesPosition() or isinstance(expression, XPathLiteral) and isinstance(expression.value, float) \
+            or isinstance(expression, XPathFunction) and expression.name in XPathFunction.NUMERIC_FUNCTIONS
+
+    def test(self, node, position, size, context) -> bool:
+        value = self.expression.evaluate(node, position, size, context)
+        if isinstance(value, float):
+            return value == position
+        return toXPathBoolean(value)
+
+class XPathLiteral:
+    __slots__ = ("value",)
+
+    def __init__(self, value) -> None:
+        self.value = value
+
+    def evaluate(self, node, position, size, context):
+        return self.value
+
+    def getEqualityAttribute(self):
+        return None
+
+    def usesPosition(self) -> bool:
+        return False
+
+class XPathPath:
+    __slots__ = ("steps", "isAbsolute")
+
+    def __init__(self, steps, *, isAbsolute) -> None:
+        self.steps = steps
+        self.isAbsolute = isAbsolute
+
+    def evaluate(self, node, position, size, context) -> list:
+        nodes = [context.documentNode if self.isAbsolute else node]
+        nestedContext = False
+        for step in self.steps:
+            nodes = step.apply(nodes, context)
+            if not nodes:
+                break
+            if nestedContext and len(nodes) > 1:
+                #The context nodes of a step after descendant-or-self contain each other, so their results interleave
+                nodes = sorted(dict.fromkeys(nodes), key=context.sortKey)
+            nestedContext = step.axis == "descendant-or-self"
+        return nodes
+
+    def getEqualityAttribute(self):
+        return None
+
+    def usesPosition(self) -> bool:
+        #Predicates inside the path count positions in their own context
+        return False
+
+    def getAttributeName(self):
+        if len(self.steps) == 1 and self.steps[0].axis == "attribute" and self.steps[0].name != "*" and not self.isAbsolute:
+            return self.steps[0].name
+        return None
+
+class XPathComparison:
+    __slots__ = ("operator", "left", "right")
+    OPERATORS = {
+        "=": lambda a, b: a == b,
+        "!=": lambda a, b: a != b,
+        "<": lambda a, b: a < b,
+        "<=": lambda a, b: a <= b,
+        ">": lambda a, b: a > b,
+        ">=": lambda a, b: a >= b,
+    }
+
+    def __init__(self, operator, left, right) -> None:
+        self.operator = operator
+        self.left = left
+        self.right = right
+
+    def evaluate(self, node, position, size, context) -> bool:
+        compare = XPathComparison.OPERATORS[self.operator]
+        left = self.left.evaluate(node, position, size, context)
+        right = self.right.evaluate(node, position, size, context)
+        leftValues = [toXPathString(item) for item in left] if isinstance(left, list) else [left]
+        rightValues = [toXPathString(item) for item in right] if isinstance(right, list) else [right]
+        for leftValue in leftValues:
+            for rightValue in rightValues:
+                if isinstance(leftValue, float) or isinstance(rightValue, float) or self.operator in ("<", "<=", ">", ">="):
+                    leftValue, rightValue = toXPathNumber(leftValue), toXPathNumber(rightValue)
+                elif isinstance(leftValue, bool) or isinstance(rightValue, bool):
+                    leftValue, rightValue = toXPathBoolean(leftValue), toXPathBoolean(rightValue)
+                if compare(leftValue, rightValue):
+                    return True
+        return False
+
+    def getEqualityAttribute(self):
+        if self.operator != "=" or not isinstance(self.left, XPathPath) or not isinstance(self.right, XPathLiteral):
+            return None
+        attributeName = self.left.getAttributeName()
+        if attributeName is None or not isinstance(self.right.value, str):
+            return None
+        return (attributeName, self.right.value)
+
+    def usesPosition(self) -> bool:
+        return self.left.usesPosition() or self.right.usesPosition()
+
+class XPathBoolean:
+    __slots__ = ("operator", "operands")
+
+    def __init__(self, operator, operands) -> None:
+        self.operator = operator
+        self.operands = operands
+
+    def evaluate(self, node, position, size, context) -> bool:
+        if self.operator == "and":
+            return all(toXPathBoolean(operand.evaluate(node, position, size, context)) for operand in self.operands)
+        return any(toXPathBoolean(operand.evaluate(node, position, size, context)) for operand in self.operands)
+
+    def getEqualityAttribute(self):
+        if self.operator == "and":
+            return self.operands[0].getEqualityAttribute()
+        return None
+
+    def usesPosition(self) -> bool:
+        return any(operand.usesPosition() for operand in self.operands)
+
+class XPathFunction:
+    __slots__ = ("name", "arguments")
+    FUNCTIONS = {
+        "contains": lambda a, b: toXPathString(a).find(toXPathString(b)) != -1,
+        "starts-with": lambda a, b: toXPathString(a).startswith(toXPathString(b)),
+        "ends-with": lambda a, b: toXPathString(a).endswith(toXPathString(b)),
+        "not": lambda a: not toXPathBoolean(a),
+        "string": lambda a: toXPathString(a),
+        "number": lambda a: toXPathNumber(a),
+        "string-length": lambda a: float(len(toXPathString(a))),
+        "count": lambda a: float(len(a)),
+        "true": lambda: True,
+        "false": lambda: False,
+    }
+    NUMERIC_FUNCTIONS = ("number", "string-length", "count", "position", "last")
+
+    def __init__(self, name, arguments) -> None:
+        if name not in XPathFunction.FUNCTIONS and name not in ("last", "position"):
+            raise XPathSyntaxError(f"Unsupported function {name}()")
+        self.name = name
+        self.arguments = arguments
+
+    def evaluate(self, node, position, size, context):
+        if self.name == "position":
+            return float(position)
+        if self.name == "last":
+            return float(size)
+        arguments = [argument.evaluate(node, position, size, context) for argument in self.arguments]
+        try:
+            return XPathFunction.FUNCTIONS[self.name](*arguments)
+        except TypeError:
+            raise XPathSyntaxError(f"Wrong number of arguments for {self.name}()")
+
+    def getEqualityAttribute(self):
+        return None
+
+    def usesPosition(self) -> bool:
+        return self.name in ("last", "position") or any(argument.usesPosition() for argument in self.arguments)
+
+def toXPathString(value) -> str:
+    if isinstance(value, list):
+        return toXPathString(value[0]) if value else ""
+    if isinstance(value, tuple):
+        node, name = value
+        return node.attrib.get(name, "")
+    if isinstance(value, XmlNode):
+        return "" #Text content is not kept
+    if isinstance(value, bool):
+        return "true" if value else "false"
+    if isinstance(value, float):
+        return str(int(value)) if value.is_integer() else str(value)
+    return value
+
+def toXPathNumber(value) -> float:
+    if isinstance(value, float):
+        return value
+    try:
+        return float(toXPathString(value))
+    except ValueError:
+        return float("nan")
+
+def toXPathBoolean(value) -> bool:
+    if isinstance(value, float):
+        return value != 0 and value == value
+    return bool(value)
+
+class XPathParser:
+    TOKEN_PATTERN = re.compile(r"""\s*(?:
+        (?P<string>'[^']*'|"[^"]*")
+        |(?P<number>\d+(?:\.\d+)?)
+        |(?P<operator>//|/|\[|\]|\(|\)|@|,|!=|<=|>=|=|<|>|\*|\.\.|\.|\|)
+        |(?P<name>[A-Za-z_][\w.\-]*(?::[A-Za-z_][\w.\-]*)?)
+        )""", re.VERBOSE)
+
+    def __init__(self, expression: str) -> None:
+        self.expression = expression
+        self.tokens = self.tokenize(expression)
+        self.position = 0
+
+    def tokenize(self, expression: str) -> list:
+        tokens = []
+        position = 0
+        expression = expression.rstrip()
+        while position < len(expression):
+            match = XPathParser.TOKEN_PATTERN.match(expression, position)
+            if not match or match.end() == position:
+                raise XPathSyntaxError(f"Unexpected character at {position}: {expression[position:position+10]!r}")
+            kind = match.lastgroup
+            tokens.append((kind, match.group(kind)))
+            position = match.end()
+        return tokens
+
+    def peek(self, offset = 0):
+        index = self.position + offset
+        return self.tokens[index] if index < len(self.tokens) else (None, None)
+
+    def accept(self, value) -> bool:
+        if self.peek()[1] == value and self.peek()[0] != "string":
+            self.position += 1
+            return True
+        return False
+
+    def expect(self, value) -> None:
+        if not self.accept(value):
+            raise XPathSyntaxError(f"Expected {value!r} in {self.expression!r}")
+
+    def parse(self) -> list:
+        #Returns the alternatives of a top level union
+        paths = [self.parsePath()]
+        while self.accept("|"):
+            paths.append(self.parsePath())
+        if self.peek()[0] is not None:
+            raise XPathSyntaxError(f"Unexpected {self.peek()[1]!r} in {self.expression!r}")
+        return paths
+
+    def parsePath(self) -> XPathPath:
+        isAbsolute = self.peek()[1] in ("/", "//")
+        steps = []
+        if not isAbsolute:
+            steps.append(self.parseStep(axis="child"))
+        while self.peek()[1] in ("/", "//"):
+            if self.peek()[1] == "//":
+                steps.append(XPathStep(axis="descendant-or-self", name="*", predicates=[]))
+            self.position += 1
+            steps.append(self.parseStep(axis="child"))
+        return XPathPath(self.mergeDescendantSteps(steps), isAbsolute=isAbsolute)
+
+    def mergeDescendantSteps(self, steps: list) -> list:
+        #"//x" is descendant-or-self::node()/child::x. Without positional predicates that equals descendant::x, which
+        #walks the tree once and can use the tag index.
+        merged = []
+        for step in steps:
+            previous = merged[-1] if merged else None
+            if previous is not None and previous.axis == "descendant-or-self" and not previous.predicates and step.axis == "child" \
+                    and not any(predicate.isPositional for predicate in step.predicates):
+                merged[-1] = XPathStep(axis="descendant", name=step.name, predicates=step.predicates)
+            else:
+                merged.append(step)
+        return merged
+
+    def parseStep(self, *, axis) -> XPathStep:
+        if self.accept("."):
+            return XPathStep(axis="self", name="*", predicates=self.parsePredicates())
+        if self.accept(".."):
+            return XPathStep(axis="parent", name="*", predicates=self.parsePredicates())
+        if self.accept("@"):
+            axis = "attribute"
+        kind, value = self.peek()
+        if kind == "name" or value == "*":
+            self.position += 1
+        else:
+            raise XPathSyntaxError(f"Expected a name in {self.expression!r}")
+        if value == "text" and self.accept("("):
+            raise XPathSyntaxError("text() is not supported, element text is not loaded")
+        return XPathStep(axis=axis, name=value, predicates=self.parsePredicates())
+
+    def parsePredicates(self) -> list:
+        predicates = []
+        while self.accept("["):
+            predicates.append(XPathPredicate(self.parseOr()))
+            self.expect("]")
+        return predicates
+
+    def parseOr(self):
+        operands = [self.parseAnd()]
+        while self.accept("or"):
+            operands.append(self.parseAnd())
+        return operands[0] if len(operands) == 1 else XPathBoolean("or", operands)
+
+    def parseAnd(self):
+        operands = [self.parseComparison()]
+        while self.accept("and"):
+            operands.append(self.parseComparison())
+        return operands[0] if len(operands) == 1 else XPathBoolean("and", operands)
+
+    def parseComparison(self):
+        left = self.parsePrimary()
+        operator = self.peek()[1]
+        if self.peek()[0] == "operator" and operator in XPathComparison.OPERATORS:
+            self.position += 1
+            return XPathComparison(operator, left, self.parsePrimary())
+        return left
+
+    def parsePrimary(self):
+        kind, value = self.peek()
+        if kind == "string":
+            self.position += 1
+            return XPathLiteral(value[1:-1])
+        if kind == "number":
+            self.position += 1
+            return XPathLiteral(float(value))
+        if self.accept("("):
+            expression = self.parseOr()
+            self.expect(")")
+            return expression
+        if kind == "name" and self.peek(1)[1] == "(" and value not in ("text",):
+            self.position += 2
+            arguments = []
+            if not self.accept(")"):
+                arguments.append(self.parseOr())
+                while self.accept(","):
+                    arguments.append(self.parseOr())
+                self.expect(")")
+            return XPathFunction(value, arguments)
+        if kind is None:
+            raise XPathSyntaxError(f"Unexpected end of {self.expression!r}")
+        return self.parsePath()
+
+class CompiledXPath:
+    def __init__(self, expression: str) -> None:
+        self.expression = expression
+        self.paths = XPathParser(expression).parse()
+
+    def canMatch(self, document: XmlDocument) -> bool:
+        #Absolute paths whose first step names a different root element are skipped without indexing the document
+        for path in self.paths:
+            firstStep = path.steps[0] if path.steps else None
+            if not path.isAbsolute or firstStep is None or firstStep.axis != "child" or firstStep.name in ("*", document.root.tag):
+                return True
+        return False
+
+    def evaluate(self, document: XmlDocument, *, context: XPathContext = None) -> list:
+        #Elements come back as XmlNodes, attributes as (XmlNode, attribute name) tuples, in document order
+        if document.root is None or not self.canMatch(document):
+            return []
+        context = context or XPathContext(document)
+        results = []
+        for path in self.paths:
+            results.extend(path.evaluate(context.documentNode, 1, 1, context))
+        if len(self.paths) > 1:
+            results = sorted(dict.fromkeys(results), key=context.sortKey)
+        return results
+
+@functools.lru_cache(maxsize=1024)
+def compileXPath(expression: str) -> CompiledXPath:
+    return CompiledXPath(expression)
+
+def evaluateXPaths(expressions, documents) -> dict:
+    #Batch evaluation: each document is indexed once and all queries that can match it are run against it
+    compiledXPaths = [compileXPath(expression) for expression in expressions]
+    results = {expression: [] for expression in expressions}
+    for document in documents:
+        if document.root is None:
+            continue
+        candidates = [compiled for compiled in compiledXPaths if compiled.canMatch(document)]
+        if not candidates:
+            continue
+        context = XPathContext(document)
+        for compiled in candidates:
+            results[compiled.expression].extend((document, match) for match in compiled.evaluate(document, context=context))
+    return results
+
+class InheritanceResolver:
+    #Effective <property> values of the blocks, items and entity classes of one document, following their Extends
+    #chains. The graph is built once per document; effective properties are computed parent first and memoized until
+    #an edit invalidates the element and the elements inheriting from it. Values are (value, name of the defining element).
+    TAG_PROPERTY = "property"
+    EXTENDS_PROPERTY = "Extends"
+    EXTENDS_EXCLUDES_PARAMETER = "param1"
+    EXTENDS_ATTRIBUTE = "extends"
+    EXTENDS_EXCLUDES_ATTRIBUTE = "ignore"
+    NOT_INHERITED = {
+        "blocks.xml": frozenset(("Extends", "CreativeMode")),
+        "items.xml": frozenset(("Extends",)),
+        "entityclasses.xml": frozenset(),
+    }
+    NO_PARENT = (None, frozenset())
+
+    def __init__(self, document: XmlDocument, *, fileKey: str, getAttributes = lambda fileKey, node: node.attrib) -> None:
+        self.document = document
+        self.fileKey = fileKey
+        self.notInherited = InheritanceResolver.NOT_INHERITED[fileKey]
+        self.getAttributes = getAttributes
+        self.elements = None #name -> element, None until the graph is built
+        self.parents = dict() #name -> (parent name, excluded property names)
+        self.children = dict() #name -> names of the elements extending it
+        self.effective = dict()
+
+    @staticmethod
+    def isSupported(fileKey: str) -> bool:
+        return fileKey in InheritanceResolver.NOT_INHERITED
+
+    def _ensureGraph(self) -> None:
+        if self.elements is not None:
+            return
+        self.elements = dict()
+        self.document.loadChildren(self.document.root)
+        for node in self.document.root:
+            self._addElement(node)
+
+    def _addElement(self, node: XmlNode) -> None:
+        name = self.getAttributes(self.fileKey, node).get("name")
+        if name is None:
+            return
+        self.elements[name] = node
+        parentName, excludes = self._getExtends(node)
+        if parentName is not None:
+            self.parents[name] = (parentName, excludes)
+            self.children.setdefault(parentName, []).append(name)
+
+    def _removeElement(self, name: str) -> None:
+        self.elements.pop(name, None)
+        parentName, _ = self.parents.pop(name, InheritanceResolver.NO_PARENT)
+        if parentName is not None:
+            self.children[parentName].remove(name)
+
+    def _getExtends(self, node: XmlNode):
+        attributes = self.getAttributes(self.fileKey, node)
+        if InheritanceResolver.EXTENDS_ATTRIBUTE in attributes:
+            return (attributes[InheritanceResolver.EXTENDS_ATTRIBUTE], splitNames(attributes.get(InheritanceResolver.EXTENDS_EXCLUDES_ATTRIBUTE, "")))
+        for child in self.document.readSubtree(node):
+            attributes = self.getAttributes(self.fileKey, child)
+            if child.tag == InheritanceResolver.TAG_PROPERTY and attributes.get("name") == InheritanceResolver.EXTENDS_PROPERTY:
+                return (attributes.get("value"), splitNames(attributes.get(InheritanceResolver.EXTENDS_EXCLUDES_PARAMETER, "")))
+        return InheritanceResolver.NO_PARENT
+
+    def getLocalProperties(self, node: XmlNode, *, prefix = "", properties = None) -> dict:
+        #Properties inside <property class="..."> groups are keyed "Class.Name"
+        properties = dict() if properties is None else properties
+        for child in self.document.readSubtree(node):
+            if child.tag != InheritanceResolver.TAG_PROPERTY:
+                continue
+            attributes = self.getAttributes(self.fileKey, child)
+            if "class" in attributes:
+                self.getLocalProperties(child, prefix=f"{prefix}{attributes['class']}.", properties=properties)
+            elif "name" in attributes:
+                properties[f"{prefix}{attributes['name']}"] = attributes.get("value", "")
+        return properties
+
+    def getOwnerName(self, node: XmlNode) -> str:
+        #Name of the inheriting element the node is or belongs to
+        while node.parent is not None and node.parent.parent is not None:
+            node = node.parent
+        return self.getAttributes(self.fileKey, node).get("name") if node.parent is not None else None
+
+    def getEffectiveProperties(self, name: str) -> dict:
+        self._ensureGraph()
+        chain = []
+        current = name
+        #Walks up to the first memoized ancestor, a cycle stops the walk as well
+        while current is not None and current in self.elements and current not in self.effective and current not in chain:
+            chain.append(current)
+            current = self.parents.get(current, InheritanceResolver.NO_PARENT)[0]
+        for current in reversed(chain):
+            self._resolve(current)
+        return self.effective.get(name, dict())
+
+    def _resolve(self, name: str) -> None:
+        parentName, excludes = self.parents.get(name, InheritanceResolver.NO_PARENT)
+        properties = {key: value for key, value in self.effective.get(parentName, dict()).items()
+                      if key not in self.notInherited and key not in excludes and key.split(".", 1)[0] not in excludes}
+        properties.update((key, (value, name)) for key, value in self.getLocalProperties(self.elements[name]).items())
+        self.effective[name] = properties
+
+    def getTopologicalOrder(self) -> list:
+        self._ensureGraph()
+        order = [name for name in self.elements if self.parents.get(name, InheritanceResolver.NO_PARENT)[0] not in self.elements]
+        for name in order:
+            order.extend(self.children.get(name, ()))
+        return order
+
+    def resolveSteps(self):
+        #Generator for the InsertionScheduler: resolves every element, parents before children, one per step
+        for name in self.getTopologicalOrder():
+            if name not in self.effective:
+                self._resolve(name)
+            yield
+
+    def invalidate(self, name: str) -> None:
+        stack = [name]
+        invalidated = set()
+        while stack:
+            name = stack.pop()
+            if name not in invalidated:
+                invalidated.add(name)
+                self.effective.pop(name, None)
+                stack.extend(self.children.get(name, ()))
+
+    def onElementChanged(self, node: XmlNode) -> None:
+        #Re-reads the owning element's name and Extends, then drops what depended on it
+        if self.elements is None:
+            return
+        while node.parent is not None and node.parent.parent is not None:
+            node = node.parent
+        if node.parent is None:
+            return
+        oldName = next((name for name, element in self.elements.items() if element is node), None)
+        if oldName is not None:
+            self.invalidate(oldName)
+            self._removeElement(oldName)
+        self._addElement(node)
+        newName = self.getAttributes(self.fileKey, node).get("name")
+        if newName is not None:
+            self.invalidate(newName)
+
+def splitNames(names: str) -> frozenset:
+    return frozenset(name.strip() for name in names.split(",") if name.strip())
+
+Reference = namedtuple("Reference", ("fileKey", "node", "attributeName"))
+
+class ReferenceIndex:
+    #Where item, block, item modifier and entity class names are defined and which attributes of the other configs
+    #use them. Kept per file, so a reloaded file only replaces its own entries. References are recorded by value
+    #whether or not the name is defined anywhere; lookups go by name. References inside subtrees of streamed files are
+    #kept as child positions below the subtree's root and only loaded when a lookup returns them.
+    DEFINITIONS = {
+        "items.xml": "item",
+        "blocks.xml": "block",
+        "item_modifiers.xml": "item_modifier",
+        "entityclasses.xml": "entity_class",
+    }
+    DEFINITION_ATTRIBUTE = "name"
+    #fileKey -> tag -> (attribute holding comma separated names, (attribute, value) the element must have or None)
+    REFERENCES = {
+        "recipes.xml": {"recipe": (("name", None),), "ingredient": (("name", None),)},
+        "loot.xml": {"item": (("name", None),)},
+        "traders.xml": {"item": (("name", None),), "traders": (("currency_item", None),)},
+        "entitygroups.xml": {"entity": (("name", None),)},
+        "progression.xml": {"passive_effect": (("tags", ("name", "RecipeTagUnlocked")),)},
+        "quests.xml": {"objective": (("id", None),), "reward": (("id", None),)},
+        "items.xml": {"property": (("value", None),)},
+        "blocks.xml": {"property": (("value", None),)},
+        "item_modifiers.xml": {"property": (("value", None),)},
+        "entityclasses.xml": {"property": (("value", None),)},
+    }
+
+    def __init__(self) -> None:
+        self.fileDocuments = dict()
+        self.fileDefinitions = dict() #fileKey -> name -> [node]
+        self.fileReferences = dict() #fileKey -> name -> [(node, path, attributeName)]
+
+    @staticmethod
+    def isSupported(fileKey: str) -> bool:
+        return fileKey in ReferenceIndex.DEFINITIONS or fileKey in ReferenceIndex.REFERENCES
+
+    def clear(self) -> None:
+        self.fileDocuments.clear()
+        self.fileDefinitions.clear()
+        self.fileReferences.clear()
+
+    def removeDocument(self, fileKey: str) -> None:
+        self.fileDocuments.pop(fileKey, None)
+        self.fileDefinitions.pop(fileKey, None)
+        self.fileReferences.pop(fileKey, None)
+
+    def addDocumentSteps(self, fileKey: str, document: XmlDocument):
+        #Generator for the InsertionScheduler, one step per element. Replaces what the file had indexed before.
+        self.fileDocuments[fileKey] = document
+        definitions = self.fileDefinitions[fileKey] = dict()
+        references = self.fileReferences[fileKey] = dict()
+        definitionTag = ReferenceIndex.DEFINITIONS.get(fileKey)
+        rules = ReferenceIndex.REFERENCES.get(fileKey, dict())
+        if document.root is None:
+            return
+        stack = [document.root]
+        while stack:
+            node = stack.pop()
+            if node.tag == definitionTag and node.parent is document.root:
+                name = node.attrib.get(ReferenceIndex.DEFINITION_ATTRIBUTE)
+                if name:
+                    definitions.setdefault(name, []).append(node)
+            for name, attributeName in self.getNodeReferences(fileKey, node, rules=rules):
+                references.setdefault(name, []).append((node, (), attributeName))
+            if node.sourceOffset < 0:
+                stack.extend(reversed(node.children))
+                yield
+                continue
+            #Subtrees of streamed files are read without loading them into the document. Loaded ones are indexed the
+            #same way, collapsing their rows unloads them again.
+            descendants = [(child, (position,)) for position, child in enumerate(document.readSubtree(node))]
+            descendants.reverse()
+            while descendants:
+                descendant, path = descendants.pop()
+                for name, attributeName in self.getNodeReferences(fileKey, descendant, rules=rules):
+                    references.setdefault(name, []).append((node, path, attributeName))
+                descendants.extend((child, path + (position,)) for position, child in reversed(list(enumerate(descendant))))
+            yield
+
+    @staticmethod
+    def getNodeReferences(fileKey: str, node: XmlNode, *, rules = None):
+        #(name, attribute name) for every name the element's reference attributes contain
+        rules = ReferenceIndex.REFERENCES.get(fileKey, dict()) if rules is None else rules
+        for attributeName, condition in rules.get(node.tag, ()):
+            value = node.attrib.get(attributeName)
+            if value and (condition is None or node.attrib.get(condition[0]) == condition[1]):
+                for name in splitNames(value):
+                    yield (name, attributeName)
+
+    def getDefinitions(self, name: str) -> list:
+        return [Reference(fileKey, node, ReferenceIndex.DEFINITION_ATTRIBUTE)
+                for fileKey, definitions in self.fileDefinitions.items() for node in definitions.get(name, ())]
+
+    def getUsages(self, name: str, *, limit = None) -> list:
+        #Only the returned usages are loaded
+        usages = [(fileKey, node, path, attributeName)
+                  for fileKey, references in self.fileReferences.items() for node, path, attributeName in references.get(name, ())]
+        return [Reference(fileKey, self._getNode(fileKey, node, path), attributeName) for fileKey, node, path, attributeName in usages[:limit]]
+
+    def _getNode(self, fileKey: str, node: XmlNode, path: tuple) -> XmlNode:
+        document = self.fileDocuments[fileKey]
+        for position in path:
+            document.loadChildren(node)
+            node = node.children[position]
+        return node
+
+    def isDefined(self, name: str) -> bool:
+        return any(name in definitions for definitions in self.fileDefinitions.values())
+
+    def getDefinedName(self, fileKey: str, node: XmlNode) -> str:
+        #The name the element defines, if it is a definition
+        if node.tag != ReferenceIndex.DEFINITIONS.get(fileKey) or node.parent is None or node.parent.parent is not None:
+            return None
+        return node.attrib.get(ReferenceIndex.DEFINITION_ATTRIBUTE)
+
+    def getReferencedNames(self, fileKey: str, node: XmlNode) -> list:
+        #The defined names the element refers to, sorted
+        return sorted({name for name, _ in ReferenceIndex.getNodeReferences(fileKey, node) if self.isDefined(name)})
+
+MODS_FOLDER_NAME = "Mods"
+MOD_CONFIG_FOLDER_NAME = "Config"
+
+ModPatchFile = namedtuple("ModPatchFile", ("modName", "fileKey", "filePath", "signature"))
+ModPatchResult = namedtuple("ModPatchResult", ("flatTree", "operationCount", "errors"))
+
+def getFileSignature(filePath):
+    try:
+        stat = os.stat(filePath)
+    except OSError:
+        return None
+    return (stat.st_mtime_ns, stat.st_size)
+
+def discoverModPatchFiles(modsFolder) -> dict:
+    #fileKey -> the ModPatchFiles patching that config file, in load order (case-insensitive order of the mod folders)
+    patchFiles = dict()
+    if not isReadableFolder(modsFolder):
+        return patchFiles
+    for modName in sorted(os.listdir(modsFolder), key=str.lower):
+        configFolder = os.path.join(modsFolder, modName, MOD_CONFIG_FOLDER_NAME)
+        if not os.path.isdir(configFolder):
+            continue
+        for filePath in sorted(glob.glob(os.path.join(configFolder, "**", "*.xml"), recursive=True)):
+            fileKey = sys.intern(os.path.relpath(filePath, start=configFolder).replace(os.sep, "/"))
+            patchFiles.setdefault(fileKey, []).append(ModPatchFile(modName, fileKey, filePath, getFileSignature(filePath)))
+    return patchFiles
+
+class ModPatchError(Exception):
+    pass
+
+class ModPatchApplier:
+    #Applies xpath patch files (set, append, remove, insertAfter...) to one fully loaded document. Attribute dicts are
+    #replaced instead of changed in place, so the snapshot flattened after each patch file stays as it was.
+    def __init__(self, document: XmlDocument) -> None:
+        self.document = document
+        self.structureChanged = False
+
+    def applyPatchFile(self, patchFile: ModPatchFile) -> ModPatchResult:
+        import xml.etree.ElementTree as ETree
+        operationCount = 0
+        errors = []
+        try:
+            operations = list(ETree.parse(patchFile.filePath).getroot())
+        except (ETree.ParseError, OSError) as e:
+            operations = []
+            errors.append(str(e))
+        for operation in operations:
+            try:
+                self.applyOperation(operation)
+                operationCount += 1
+            except (ModPatchError, XPathSyntaxError) as e:
+                errors.append(f"<{operation.tag} xpath=\"{operation.get('xpath', '')}\">: {e}")
+        if self.structureChanged:
+            renumberXmlTree(self.document.root)
+            self.structureChanged = False
+        return ModPatchResult(flattenXmlTree(self.document.root), operationCount, errors)
+
+    def applyOperation(self, operation: "ETree.Element") -> None:
+        apply = ModPatchApplier.OPERATIONS.get(operation.tag)
+        if apply is None:
+            raise ModPatchError("unsupported operation")
+        xPath = operation.get("xpath")
+        if not xPath:
+            raise ModPatchError("missing xpath")
+        matches = compileXPath(xPath).evaluate(self.document)
+        if not matches:
+            raise ModPatchError("matched nothing")
+        apply(self, operation, matches)
+
+    def setAttribute(self, node: XmlNode, name: str, value: str) -> None:
+        self.replaceAttributes(node, {**node.attrib, sys.intern(name): value})
+
+    def removeAttribute(self, node: XmlNode, name: str) -> None:
+        self.replaceAttributes(node, {key: value for key, value in node.attrib.items() if key != name})
+
+    def replaceAttributes(self, node: XmlNode, attributes: dict) -> None:
+        if self.document.queryIndex is not None:
+            self.document.queryIndex.replaceAttributes(node, node.attrib, attributes)
+        node.attrib = attributes
+
+    def insertChildren(self, parent: XmlNode, position: int, operation: "ETree.Element") -> None:
+        children = [XmlNode.fromElement(element, parent=parent) for element in operation]
+        parent.children[position:position] = children
+        self.structureChanged = True
+        if self.document.queryIndex is not None:
+            self.document.queryIndex.insertNodes(parent, position, len(children))
+
+    def removeNode(self, node: XmlNode) -> None:
+        if node.parent is None:
+            raise ModPatchError("the root element cannot be removed")
+        if self.document.queryIndex is not None:
+            self.document.queryIndex.removeNodes(node)
+        node.parent.children.remove(node)
+        self.structureChanged = True
+
+    @staticmethod
+    def getElements(matches) -> list:
+        if any(isinstance(match, tuple) for match in matches):
+            raise ModPatchError("expected elements, not attributes")
+        return matches
+
+    @staticmethod
+    def getAttributes(matches) -> list:
+        if not all(isinstance(match, tuple) for match in matches):
+            raise ModPatchError("expected attributes, not elements")
+        return matches
+
+    def applySet(self, operation, matches) -> None:
+        for node, name in ModPatchApplier.getAttributes(matches):
+            self.setAttribute(node, name, operation.text or "")
+
+    def applySetAttribute(self, operation, matches) -> None:
+        name = operation.get("name")
+        if not name:
+            raise ModPatchError("missing name")
+        for node in ModPatchApplier.getElements(matches):
+            self.setAttribute(node, name, operation.text or "")
+
+    def applyRemoveAttribute(self, operation, matches) -> None:
+        for node, name in ModPatchApplier.getAttributes(matches):
+            self.removeAttribute(node, name)
+
+    def applyRemove(self, operation, matches) -> None:
+        for match in matches:
+            if isinstance(match, tuple):
+                self.removeAttribute(*match)
+            else:
+                self.removeNode(match)
+
+    def applyAppend(self, operation, matches) -> None:
+        for match in matches:
+            if isinstance(match, tuple):
+                node, name = match
+                self.setAttribute(node, name, node.attrib[name] + (operation.text or ""))
+            else:
+                self.insertChildren(match, len(match.children), operation)
+
+    def applyPrepend(self, operation, matches) -> None:
+        for match in matches:
+            if isinstance(match, tuple):
+                node, name = match
+                self.setAttribute(node, name, (operation.text or "") + node.attrib[name])
+            else:
+                self.insertChildren(match, 0, operation)
+
+    def applyInsertAfter(self, operation, matches) -> None:
+        for node in ModPatchApplier.getElements(matches):
+            if node.parent is None:
+                raise ModPatchError("the root element has no siblings")
+            self.insertChildren(node.parent, node.parent.children.index(node) + 1, operation)
+
+    def applyInsertBefore(self, operation, matches) -> None:
+        for node in ModPatchApplier.getElements(matches):
+            if node.parent is None:
+                raise ModPatchError("the root element has no siblings")
+            self.insertChildren(node.parent, node.parent.children.index(node), operation)
+
+    def applyCsv(self, operation, matches) -> None:
+        delimiter = operation.get("delim", ",")
+        values = [value.strip() for value in (operation.text or "").split(delimiter) if value.strip()]
+        mode = operation.get("op")
+        if mode not in ("add", "remove"):
+            raise ModPatchError("op must be \"add\" or \"remove\"")
+        for node, name in ModPatchApplier.getAttributes(matches):
+            items = [item for item in node.attrib[name].split(delimiter) if item.strip()]
+            if mode == "add":
+                items.extend(value for value in values if value not in (item.strip() for item in items))
+            else:
+                items = [item for item in items if item.strip() not in values]
+            self.setAttribute(node, name, delimiter.join(items))
+
+    OPERATIONS = {
+        "set": applySet,
+        "setattribute": applySetAttribute,
+        "removeattribute": applyRemoveAttribute,
+        "remove": applyRemove,
+        "append": applyAppend,
+        "prepend": applyPrepend,
+        "insertAfter": applyInsertAfter,
+        "insertBefore": applyInsertBefore,
+        "csv": applyCsv,
+    }
+
+def applyModPatchFiles(filePath, encoding, flatTree, patchFiles) -> list:
+    #Runs in a worker process: applies the patch files in order to the given tree, one ModPatchResult per patch file
+    document = XmlDocument(filePath=filePath, root=unflattenXmlTree(flatTree), encoding=encoding)
+    document.loadSubtree(document.root)
+    applier = ModPatchApplier(document)
+    return [applier.applyPatchFile(patchFile) for patchFile in patchFiles]
+
+class ModStackEntry:
+    __slots__ = ("vanillaDocument", "patchFiles", "results", "document")
+
+    def __init__(self, *, vanillaDocument, patchFiles, results) -> None:
+        self.vanillaDocument = vanillaDocument
+        self.patchFiles = patchFiles
+        self.results = results
+        self.document = XmlDocument(filePath=vanillaDocument.filePath, fileSize=vanillaDocument.fileSize,
+                                    root=unflattenXmlTree(results[-1].flatTree), encoding=vanillaDocument.encoding)
+
+class ModStack:
+    #The installed mods applied on top of the vanilla documents. Per config file it keeps the tree after each mod's
+    #patch file, so when a mod changes only that mod and the ones loaded after it are applied again.
+    MAX_REPORTED_ERRORS = 20
+
+    def __init__(self) -> None:
+        self.entries = dict()
+        self.unmatchedPatchFiles = []
+
+    def clear(self) -> None:
+        self.entries.clear()
+        self.unmatchedPatchFiles = []
+
+    @staticmethod
+    def getFirstChangedIndex(entry: ModStackEntry, vanillaDocument: XmlDocument, patchFiles: list) -> int:
+        if entry is None or entry.vanillaDocument is not vanillaDocument:
+            return 0
+        for index, (oldPatchFile, patchFile) in enumerate(zip(entry.patchFiles, patchFiles)):
+            if oldPatchFile != patchFile:
+                return index
+        return min(len(entry.patchFiles), len(patchFiles))
+
+    async def update(self, modsFolder, vanillaDocuments: dict, *, executor) -> dict:
+        #vanillaDocuments maps file keys to the parsed vanilla documents. Returns the merged document of every file
+        #that has patches; the same object as last time if nothing about the file changed.
+        import asyncio
+        loop = asyncio.get_running_loop()
+        patchFilesByKey = await loop.run_in_executor(None, discoverModPatchFiles, modsFolder)
+        self.unmatchedPatchFiles = []
+        pending = []
+        for fileKey, patchFiles in patchFilesByKey.items():
+            vanillaDocument = vanillaDocuments.get(fileKey)
+            if vanillaDocument is None or vanillaDocument.root is None:
+                self.unmatchedPatchFiles.extend(patchFiles)
+                self.entries.pop(fileKey, None)
+                continue
+            entry = self.entries.get(fileKey)
+            start = ModStack.getFirstChangedIndex(entry, vanillaDocument, patchFiles)
+            if start == len(patchFiles):
+                if entry is not None and start < len(entry.patchFiles):
+                    self.entries[fileKey] = ModStackEntry(vanillaDocument=vanillaDocument, patchFiles=patchFiles, results=entry.results[:start])
+                continue
+            #Every file is applied in its own worker, so independent files are patched in parallel
+            baseTree = entry.results[start - 1].flatTree if start else flattenXmlTree(vanillaDocument.root)
+            future = loop.run_in_executor(executor, applyModPatchFiles, vanillaDocument.filePath, vanillaDocument.encoding,
+                                          baseTree, patchFiles[start:])
+            pending.append((fileKey, vanillaDocument, patchFiles, entry.results[:start] if start else [], future))
+        for fileKey in set(self.entries) - set(patchFilesByKey):
+            del self.entries[fileKey]
+        try:
+            for fileKey, vanillaDocument, patchFiles, results, future in pending:
+                self.entries[fileKey] = ModStackEntry(vanillaDocument=vanillaDocument, patchFiles=patchFiles, results=results + await future)
+        except asyncio.CancelledError:
+            for *_, future in pending:
+                future.cancel()
+            raise
+        return {fileKey: entry.document for fileKey, entry in self.entries.items()}
+
+    def getReport(self) -> str:
+        operationCounts = dict()
+        errors = []
+        for entry in self.entries.values():
+            for patchFile, result in zip(entry.patchFiles, entry.results):
+                operationCounts[patchFile.modName] = operationCounts.get(patchFile.modName, 0) + result.operationCount
+                errors.extend(f"{patchFile.modName}/{patchFile.fileKey}: {error}" for error in result.errors)
+        errors.extend(f"{patchFile.modName}/{patchFile.fileKey}: no such config file" for patchFile in self.unmatchedPatchFiles)
+        if not operationCounts and not errors:
+            return "No mods installed"
+        lines = [f"{modName}: {count} operations applied" for modName, count in sorted(operationCounts.items(), key=lambda item: item[0].lower())]
+        if errors:
+            lines.append(f"{len(errors)} failed:")
+            lines.extend(errors[:ModStack.MAX_REPORTED_ERRORS])
+        return "\n".join(lines)
+
+class XmlModification:
+    #One per tree row. Attribute rows point at their element's attribute dict instead of copying it, edits live in EditOverlay.
+    __slots__ = ("element", "fileKey", "attributeName")
+
+    def __init__(self, *, element: XmlNode, fileKey: str, attributeName: str = None):
+        self.element = element
+        self.fileKey = fileKey
+        self.attributeName = attributeName
+
+    @property
+    def originalAttributes(self) -> dict:
+        return self.element.attrib
+
+    @property
+    def xPath(self) -> str:
+        if self.attributeName is None:
+            return self.element.xPath
+        return f"{self.element.xPath}[@{self.attributeName}]"
+
+    @property
+    def subFolder(self) -> str:
+        return os.path.dirname(self.fileKey)
+
+class EditOverlay:
+    #Sparse: only edited elements get an entry, keyed by (fileKey, element XPath) so that edits outlive the tree rows
+    def __init__(self) -> None:
+        self.attributeChanges = dict()
+        self.elements = dict() #The edited elements, for their original attributes
+        self.editedSteps = dict() #fileKey -> {(tag, index)} of the edited elements, spares building the XPath of every element asked about
+        self.fileGenerations = dict() #fileKey -> counter bumped on every edit, lets the patch writer skip untouched files
+        self.editSets = dict() #fileKey -> {attribute XPath: EditSet}, bulk edits that one xpath operation can express
+
+    @staticmethod
+    def getKey(modification: XmlModification):
+        return (modification.fileKey, modification.element.xPath)
+
+    def _touch(self, modification: XmlModification) -> None:
+        self.elements[EditOverlay.getKey(modification)] = modification.element
+        self.editedSteps.setdefault(modification.fileKey, set()).add((modification.element.tag, modification.element.index))
+        self.fileGenerations[modification.fileKey] = self.fileGenerations.get(modification.fileKey, 0) + 1
+
+    def setAttribute(self, modification: XmlModification, name: str, value: str) -> None:
+        self._touch(modification)
+        key = EditOverlay.getKey(modification)
+        changes = self.attributeChanges.setdefault(key, dict())
+        if modification.originalAttributes.get(name) == value:
+            changes.pop(name, None)
+            if not changes:
+                del self.attributeChanges[key]
+        else:
+            changes[name] = value
+
+    def getAttributeChanges(self, modification: XmlModification) -> dict:
+        return self.attributeChanges.get(EditOverlay.getKey(modification), dict())
+
+    def getNodeAttributes(self, fileKey: str, node: XmlNode) -> dict:
+        #By XPath rather than by node: streamed files read collapsed elements again as new nodes, and a reload replaces them all
+        if (node.tag, node.index) not in self.editedSteps.get(fileKey, ()):
+            return node.attrib
+        changes = self.attributeChanges.get((fileKey, node.xPath))
+        if not changes:
+            return node.attrib
+        return {**node.attrib, **changes}
+
+    def getAttributes(self, modification: XmlModification) -> dict:
+        changes = self.getAttributeChanges(modification)
+        if not changes:
+            return modification.originalAttributes
+        return {**modification.originalAttributes, **changes}
+
+    def isEmpty(self) -> bool:
+        return not self.attributeChanges
+
+    def rebindDocument(self, fileKey: str, document: XmlDocument) -> list:
+        #After the file was reloaded: points its edits at the elements now found at their XPaths. Returns the XPaths
+        #that no longer exist, their edits are kept as they were.
+        missingXPaths = []
+        for key in list(self.elements):
+            if key[0] != fileKey:
+                continue
+            node = document.findNode(key[1])
+            if node is None:
+                missingXPaths.append(key[1])
+                continue
+            self.elements[key] = node
+        return missingXPaths
+
+    def addEditSet(self, editSet: "EditSet") -> None:
+        self.editSets.setdefault(editSet.fileKey, dict())[editSet.xPath] = editSet
+
+    def getEditSetOperations(self, fileKey: str, document: XmlDocument):
+        #(operations, covered (element key, attribute name) pairs) for the edit sets that still hold: every attribute
+        #their XPath matches in the document currently has their value. The others are left to per-element operations.
+        operations = []
+        covered = set()
+        editSets = list(self.editSets.get(fileKey, dict()).values())
+        if not editSets or document is None or document.root is None:
+            return operations, covered
+        results = evaluateXPaths([editSet.xPath for editSet in editSets], [document])
+        editSetMatches = dict()
+        for editSet in editSets:
+            matches = [match for _, match in results[editSet.xPath]]
+            if matches and all(isinstance(match, tuple) and self.getNodeAttributes(fileKey, match[0]).get(match[1]) == editSet.value
+                               for match in matches):
+                editSetMatches[editSet] = matches
+        for editSet in EditOverlay.orderEditSets(editSetMatches):
+            operations.append(PatchOperation("set", editSet.xPath, None, editSet.value))
+            covered.update(((fileKey, node.xPath), name) for node, name in editSetMatches[editSet])
+        return operations, covered
+
+    @staticmethod
+    def orderEditSets(editSets) -> list:
+        #An operation that writes v has to run after the ones filtering on v, or they would match what it wrote.
+        #Edit sets in a cycle (e.g. values swapped) are left out.
+        filteringOn = dict()
+        writing = dict()
+        for editSet in editSets:
+            writing.setdefault(editSet.value, []).append(editSet)
+            if editSet.originalValue is not None:
+                filteringOn.setdefault(editSet.originalValue, []).append(editSet)
+        blockerCounts = {editSet: len(filteringOn.get(editSet.value, ())) for editSet in editSets}
+        ready = [editSet for editSet, count in blockerCounts.items() if not count]
+        ordered = []
+        while ready:
+            editSet = ready.pop()
+            ordered.append(editSet)
+            for blocked in writing.get(editSet.originalValue, ()) if editSet.originalValue is not None else ():
+                blockerCounts[blocked] -= 1
+                if not blockerCounts[blocked]:
+                    ready.append(blocked)
+        return ordered
+
+    def getPatchOperations(self, fileKey: str, document: XmlDocument = None) -> list:
+        #With the file's document, bulk edits are written as one operation per edit set where possible
+        operations, covered = self.getEditSetOperations(fileKey, document)
+        xPaths = StableXPaths(document)
+        for (changedFileKey, xPath), changes in self.attributeChanges.items():
+            if changedFileKey != fileKey:
+                continue
+            element = self.elements[(changedFileKey, xPath)]
+            elementXPath = xPaths.getXPath(element)
+            for name, value in changes.items():
+                if ((changedFileKey, xPath), name) in covered:
+                    continue
+                if name in element.attrib:
+                    operations.append(PatchOperation("set", f"{elementXPath}/@{name}", None, value))
+                else:
+                    operations.append(PatchOperation("setattribute", elementXPath, name, value))
+        return operations
+
+class StableXPaths:
+    #XPaths for patch files: each step selects the element by an attribute that is unique among its same-tag
+    #siblings, so the patch still hits it after a game update or another mod shifted the siblings. Steps without
+    #such an attribute fall back to the position.
+    KEY_ATTRIBUTES = ("name", "class")
+
+    def __init__(self, document: XmlDocument = None) -> None:
+        self.document = document
+        self.siblingKeys = dict() #parent -> {(tag, attribute, value): count}
+        self.xPaths = dict()
+
+    def getXPath(self, node: XmlNode) -> str:
+        xPath = self.xPaths.get(node)
+        if xPath is None:
+            xPath = f"/{node.tag}" if node.parent is None else f"{self.getXPath(node.parent)}/{self._getStep(node)}"
+            self.xPaths[node] = xPath
+        return xPath
+
+    def _getStep(self, node: XmlNode) -> str:
+        siblingKeys = self.siblingKeys.get(node.parent)
+        if siblingKeys is None:
+            siblingKeys = self.siblingKeys[node.parent] = dict()
+            #The parent of an edited element may have been unloaded since, its children are then read from the file
+            siblings = node.parent if node.parent.isLoaded() or self.document is None else self.document.readSubtree(node.parent)
+            for sibling in siblings:
+                for attribute in StableXPaths.KEY_ATTRIBUTES:
+                    if attribute in sibling.attrib:
+                        key = (sibling.tag, attribute, sibling.attrib[attribute])
+                        siblingKeys[key] = siblingKeys.get(key, 0) + 1
+        for attribute in StableXPaths.KEY_ATTRIBUTES:
+            value = node.attrib.get(attribute)
+            literal = quoteXPathLiteral(value) if value is not None else None
+            if literal is not None and siblingKeys.get((node.tag, attribute, value)) == 1:
+                return f"{node.tag}[@{attribute}={literal}]"
+        return f"{node.tag}[{node.index}]"
+
+PatchOperation = namedtuple("PatchOperation", ("operation", "xPath", "name", "value"))
+EditSet = namedtuple("EditSet", ("fileKey", "xPath", "attributeName", "originalValue", "value")) #originalValue: the value the XPath filters on, if any
+
+class BulkEditError(ValueError):
+    pass
+
+class BulkTransform:
+    #Parsed once from text, then applied to a whole column of attribute values:
+    #  set VALUE | scale FACTOR | clamp MIN MAX (* for no bound) | replace /PATTERN/REPLACEMENT/ (any delimiter)
+    #scale and clamp only change the values that are plain numbers.
+    KIND_SET = "set"
+    KIND_SCALE = "scale"
+    KIND_CLAMP = "clamp"
+    KIND_REPLACE = "replace"
+    NUMBER_PATTERN = re.compile(r"[+-]?(?:\d+\.?\d*|\.\d+)(?:[eE][+-]?\d+)?")
+    NO_BOUND = "*"
+    MAX_DECIMALS = 6
+
+    def __init__(self, text: str) -> None:
+        self.text = text.strip()
+        self.kind, _, argumentText = self.text.partition(" ")
+        argumentText = argumentText.strip()
+        if self.kind == BulkTransform.KIND_SET:
+            self.value = argumentText
+        elif self.kind == BulkTransform.KIND_SCALE:
+            self.factor = BulkTransform.parseNumber(argumentText)
+        elif self.kind == BulkTransform.KIND_CLAMP:
+            bounds = argumentText.split()
+            if len(bounds) != 2:
+                raise BulkEditError("clamp needs a minimum and a maximum, e.g. clamp 0 100")
+            self.minimum, self.maximum = (float(sign) * float("inf") if bound == BulkTransform.NO_BOUND else BulkTransform.parseNumber(bound)
+                                          for bound, sign in zip(bounds, ("-1", "1")))
+        elif self.kind == BulkTransform.KIND_REPLACE:
+            parts = argumentText[1:].split(argumentText[:1]) if argumentText else []
+            if len(parts) != 3 or parts[2]:
+                raise BulkEditError("replace needs /PATTERN/REPLACEMENT/")
+            try:
+                self.pattern = re.compile(parts[0])
+            except re.error as e:
+                raise BulkEditError(f"Invalid pattern: {e}") from e
+            self.replacement = parts[1]
+        else:
+            raise BulkEditError(f"Unknown transform \"{self.kind}\", expected set, scale, clamp or replace")
+
+    @staticmethod
+    def parseNumber(text: str) -> float:
+        if not BulkTransform.NUMBER_PATTERN.fullmatch(text):
+            raise BulkEditError(f"\"{text}\" is not a number")
+        return float(text)
+
+    @staticmethod
+    def formatNumber(number: float) -> str:
+        if number.is_integer():
+            return str(int(number))
+        return f"{number:.{BulkTransform.MAX_DECIMALS}f}".rstrip("0").rstrip(".")
+
+    @staticmethod
+    def parseNumberColumn(values):
+        #(positions, numbers): the values that are plain numbers, parsed once into arrays
+        positions = array("l")
+        numbers = array("d")
+        isNumber = BulkTransform.NUMBER_PATTERN.fullmatch
+        for position, value in enumerate(values):
+            if isNumber(value):
+                positions.append(position)
+                numbers.append(float(value))
+        return positions, numbers
+
+    def apply(self, values: list) -> list:
+        if self.kind == BulkTransform.KIND_SET:
+            return [self.value] * len(values)
+        if self.kind == BulkTransform.KIND_REPLACE:
+            substitute = self.pattern.sub
+            return [substitute(self.replacement, value) for value in values]
+        positions, numbers = BulkTransform.parseNumberColumn(values)
+        if self.kind == BulkTransform.KIND_SCALE:
+            results = array("d", map(self.factor.__mul__, numbers))
+        else:
+            minimum, maximum = self.minimum, self.maximum
+            results = array("d", (minimum if number < minimum else maximum if number > maximum else number for number in numbers))
+        newValues = list(values)
+        for position, number, result in zip(positions, numbers, results):
+            if result != number:
+                newValues[position] = BulkTransform.formatNumber(result)
+        return newValues
+
+def quoteXPathLiteral(value: str) -> str:
+    #None if the value contains both kinds of quotes, XPath 1.0 literals cannot escape them
+    if "'" not in value:
+        return f"'{value}'"
+    if '"' not in value:
+        return f'"{value}"'
+    return None
+
+class BulkEdit:
+    #One transform over every attribute a selector matched in the loaded documents. The current values (including
+    #earlier edits) are transformed as one column; nothing is changed until the caller records the result.
+    ATTRIBUTE_SELECTOR_PATTERN = re.compile(r"(?P<elements>[^|]+)/@(?P<name>[\w.:-]+)")
+
+    def __init__(self, *, selector: str, transform: BulkTransform, documents: dict, getAttributes) -> None:
+        #documents: fileKey -> document, getAttributes(fileKey, node): the current attributes of the node.
+        #Raises XPathSyntaxError for invalid selectors.
+        self.selector = selector
+        self.transform = transform
+        self.matches = []
+        fileKeys = {document: fileKey for fileKey, document in documents.items()}
+        for document, match in evaluateXPaths([selector], documents.values())[selector]:
+            if not isinstance(match, tuple):
+                raise BulkEditError("The selector has to select attributes, e.g. //item/property[@name='Stacknumber']/@value")
+            self.matches.append((fileKeys[document], *match))
+        self.oldValues = [getAttributes(fileKey, node)[name] for fileKey, node, name in self.matches]
+        self.newValues = transform.apply(self.oldValues)
+
+    def getChanges(self):
+        #(fileKey, node, attributeName, old value, new value) for every value the transform changes
+        return [(fileKey, node, name, oldValue, newValue)
+                for (fileKey, node, name), oldValue, newValue in zip(self.matches, self.oldValues, self.newValues) if oldValue != newValue]
+
+    def getEditSets(self) -> list:
+        #set writes one operation per file with the selector itself. The other transforms write one per distinct
+        #original value, the selector narrowed to the elements that still have it in the file.
+        selectorMatch = BulkEdit.ATTRIBUTE_SELECTOR_PATTERN.fullmatch(self.selector)
+        if selectorMatch is None:
+            return []
+        name = selectorMatch.group("name")
+        changes = self.getChanges()
+        if self.transform.kind == BulkTransform.KIND_SET:
+            return [EditSet(fileKey, self.selector, name, None, self.transform.value) for fileKey in dict.fromkeys(change[0] for change in changes)]
+        groups = dict()
+        for fileKey, node, _, _, newValue in changes:
+            groups.setdefault((fileKey, node.attrib[name]), set()).add(newValue)
+        editSets = []
+        for (fileKey, originalValue), newValues in groups.items():
+            literal = quoteXPathLiteral(originalValue)
+            if len(newValues) == 1 and literal is not None:
+                xPath = f"{selectorMatch.group('elements')}[@{name}={literal}]/@{name}"
+                editSets.append(EditSet(fileKey, xPath, name, originalValue, newValues.pop()))
+        return editSets
+
+class ModPatchWriter:
+    #Writes one xpath patch file per edited source file to <output folder>/Config/<file key>
+    CONFIG_FOLDER_NAME = "Config"
+    MOD_INFO_FILE_NAME = "ModInfo.xml"
+    MOD_NAME = "XPathModifierChanges"
+    INDENT = "\t"
+
+    def __init__(self) -> None:
+        self.writtenGenerations = dict()
+
+    def getPendingFiles(self, edits: EditOverlay, documents: dict = None) -> list:
+        #(fileKey, generation, operations) for every file edited since the last write, runs on the GUI thread.
+        #documents (fileKey -> the document the edits were made on) lets bulk edits be written compactly.
+        documents = documents or dict()
+        return [(fileKey, generation, edits.getPatchOperations(fileKey, documents.get(fileKey)))
+                for fileKey, generation in edits.fileGenerations.items()
+                if self.writtenGenerations.get(fileKey) != generation]
+
+    def hasPendingFiles(self, edits: EditOverlay) -> bool:
+        return any(self.writtenGenerations.get(fileKey) != generation for fileKey, generation in edits.fileGenerations.items())
+
+    def markWritten(self, pendingFiles) -> None:
+        for fileKey, generation, _ in pendingFiles:
+            self.writtenGenerations[fileKey] = generation
+
+    def writeFiles(self, outputFolder, pendingFiles) -> list:
+        #Runs on the write executor. Returns the keys of the files that actually changed on disk.
+        self._writeModInfo(outputFolder)
+        writtenFileKeys = []
+        for fileKey, _, operations in pendingFiles:
+            patchPath = os.path.join(outputFolder, ModPatchWriter.CONFIG_FOLDER_NAME, *fileKey.split("/"))
+            if not operations:
+                if os.path.exists(patchPath):
+                    os.remove(patchPath)
+                    writtenFileKeys.append(fileKey)
+                continue
+            if writeFileAtomically(patchPath, self.iterPatchLines(operations)):
+                writtenFileKeys.append(fileKey)
+        return writtenFileKeys
+
+    def iterPatchLines(self, operations):
+        yield '<?xml version="1.0" encoding="utf-8"?>\n'
+        yield "<configs>\n"
+        for operation in operations:
+            nameAttribute = f" name={quoteXmlAttribute(operation.name)}" if operation.name is not None else ""
+            yield f"{ModPatchWriter.INDENT}<{operation.operation} xpath={quoteXmlAttribute(operation.xPath)}{nameAttribute}>{escapeXml(operation.value)}</{operation.operation}>\n"
+        yield "</configs>\n"
+
+    def _writeModInfo(self, outputFolder) -> None:
+        modInfoPath = os.path.join(outputFolder, ModPatchWriter.MOD_INFO_FILE_NAME)
+        if os.path.exists(modInfoPath):
+            return
+        name = quoteXmlAttribute(ModPatchWriter.MOD_NAME)
+        writeFileAtomically(modInfoPath, (
+            '<?xml version="1.0" encoding="utf-8"?>\n',
+            "<xml>\n",
+            f"{ModPatchWriter.INDENT}<Name value={name}/>\n",
+            f"{ModPatchWriter.INDENT}<DisplayName value={name}/>\n",
+            f'{ModPatchWriter.INDENT}<Version value="1.0.0"/>\n',
+            "</xml>\n",
+        ))
+
+def escapeXml(text: str) -> str:
+    return text.replace("&", "&amp;").replace("<", "&lt;").replace(">", "&gt;")
+
+def quoteXmlAttribute(value: str) -> str:
+    escaped = escapeXml(value).replace("\"", "&quot;").replace("\n", "&#10;").replace("\r", "&#13;").replace("\t", "&#9;")
+    return f"\"{escaped}\""
+
+def writeFileAtomically(filePath, lines) -> bool:
+    #Streams the lines to a temporary file next to filePath and renames it over filePath, unless the content is
+    #unchanged. Returns whether filePath was replaced.
+    import tempfile
+    folder = os.path.dirname(os.path.abspath(filePath))
+    os.makedirs(folder, exist_ok=True)
+    hasher = XmlParseCache.createHasher()
+    file = tempfile.NamedTemporaryFile("w", encoding="utf-8", newline="\n", dir=folder, delete=False, suffix=".tmp")
+    try:
+        with file:
+            for line in lines:
+                file.write(line)
+                hasher.update(line.encode("utf-8"))
+            file.flush()
+            os.fsync(file.fileno())
+        if os.path.isfile(filePath):
+            existingHasher = XmlParseCache.createHasher()
+            for _ in hashChunks(readChunks(filePath), existingHasher):
+                pass
+            if existingHasher.digest() == hasher.digest():
+                os.remove(file.name)
+                return False
+        os.replace(file.name, filePath)
+        return True
+    except BaseException:
+        if os.path.exists(file.name):
+            os.remove(file.name)
+        raise
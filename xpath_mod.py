@@ -1,14 +1,20 @@
 import tkinter
+import _tkinter
 from tkinter import ttk
 import tkinter.filedialog
 import tkinter.messagebox
+import tkinter.simpledialog
 import os
-import glob
 import configparser
 import xml.etree.ElementTree as ETree
-from collections import defaultdict
 import asyncio
 import concurrent.futures
+import time
+from xpath_core import (CONFIG_FOLDER_PATH, MODS_FOLDER_NAME, BulkEdit, BulkEditError, BulkTransform,
+                        EditOverlay, InheritanceResolver, Instrumentation, ModPatchWriter, ModStack, ReferenceIndex,
+                        SamplingProfiler, SearchIndex, XmlDocument, XmlModification, XmlNode, XmlParseCache,
+                        XPathSyntaxError, createFileWatcher, evaluateXPaths, findXmlFiles, getFileKey,
+                        isReadableFolder, isWriteableFolder, loadXmlDocuments, matchXmlChildren)
 
 def getScriptDirectory() -> str:
     return os.path.dirname(os.path.abspath(__file__))
@@ -18,15 +24,23 @@ def getScriptDirectory() -> str:
 class XPathModifierGUI:
     WINDOW_NAME = "XPath Modifier (7 Days to Die)"
     CONFIG_FILE_NAME = "XPath.ini"
+    CACHE_FOLDER_NAME = "XPathCache"
+    PROFILE_FILE_NAME = "XPathProfile.folded"
     CONFIG_SECTION_NAME = "Settings"
     CONFIG_OPTION_NAME_GAME_ROOT = "xmlFolderPath"
     CONFIG_OPTION_NAME_WINDOWSIZE = "windowSize"
     CONFIG_OPTION_NAME_LEFTPANEWIDTH = "leftPaneWidth"
     CONFIG_OPTION_NAME_RIGHTPANEWIDTH = "rightPaneWidth"
+    CONFIG_OPTION_NAME_LAZY_TREE = "lazyTree"
+    CONFIG_OPTION_NAME_FRAME_BUDGET = "frameBudgetMs"
+    CONFIG_OPTION_NAME_APPLY_MODS = "applyMods"
 
     DEFAULT_WINDOW_SIZE = "900x600"
     DEFAULT_LEFT_PANE_WIDTH = "650"
     DEFAULT_RIGHT_PANE_WIDTH = "250"
+    DEFAULT_LAZY_TREE = "true"
+    DEFAULT_FRAME_BUDGET = "8"
+    DEFAULT_APPLY_MODS = "true"
 
     def __init__(self):
         self.running = False
@@ -37,15 +51,38 @@ class XPathModifierGUI:
                                onSelectConfigFolder=self.onSelectGameFolder, 
                                onQuit=self.quit,
                                onSelectOutputFolder=self.onSelectOutputFolder,
-                               onWriteChanges=self.onWriteChanges)
+                               onWriteChanges=self.onWriteChanges,
+                               onShowCacheStatistics=self.onShowCacheStatistics,
+                               onEvaluateXPath=self.onEvaluateXPath,
+                               onBulkEdit=self.onBulkEdit,
+                               onToggleApplyMods=self.onToggleApplyMods,
+                               onReloadMods=lambda: self.fileView.reloadMods(),
+                               onShowModReport=self.onShowModReport,
+                               onShowLoadStatistics=self.onShowLoadStatistics,
+                               onToggleProfiler=self.onToggleProfiler,
+                               applyMods=self.getSavedApplyMods())
         self.root.config(menu=self.topMenu.menuBar)
         
         
         self.panedWindow = tkinter.PanedWindow(self.root, orient=tkinter.HORIZONTAL)
         self.leftFrame = tkinter.Frame(self.panedWindow, )
         self.rightFrame = tkinter.Frame(self.panedWindow, )
-        self.fileView = FileView(master=self.leftFrame, headerText="XML Files:")
-        self.changesView = ChangesView(master=self.rightFrame)
+        self.searchView = SearchView(master=self.leftFrame,
+                                     onSearch=lambda query: self.fileView.search(query),
+                                     onSelectResult=lambda node: self.fileView.revealNode(node))
+        self.fileView = FileView(master=self.leftFrame, headerText="XML Files:", lazy=self.getSavedLazyTree(), cacheFolder=self.getCacheFolderPath(),
+                                 frameBudgetMs=self.getSavedFrameBudget(), applyMods=self.getSavedApplyMods())
+        self.changesView = ChangesView(master=self.rightFrame, onChangeAttribute=self.onChangeAttribute)
+        self.fileView.onSelectModification = self.onSelectModification
+        self.fileView.onShowResults = self.searchView.showResults
+        self.outputFolder = ""
+        self.patchWriter = ModPatchWriter()
+        self.writeExecutor = concurrent.futures.ThreadPoolExecutor(max_workers=1)
+        self.writeTask = None
+        self.statusPanel = None
+        self.bulkSelector = ""
+        self.bulkTransform = ""
+        self.profiler = SamplingProfiler()
 
         self.panedWindow.add(self.leftFrame,stretch="always")
         self.panedWindow.add(self.rightFrame, )
@@ -79,11 +116,27 @@ class XPathModifierGUI:
     def getSavedWindowSize(self) -> str:
         return self.getConfig(name=XPathModifierGUI.CONFIG_OPTION_NAME_WINDOWSIZE, defaultValue=XPathModifierGUI.DEFAULT_WINDOW_SIZE)
 
+    def getSavedLazyTree(self) -> bool:
+        return self.getBooleanConfig(name=XPathModifierGUI.CONFIG_OPTION_NAME_LAZY_TREE, defaultValue=XPathModifierGUI.DEFAULT_LAZY_TREE)
+
+    def getSavedApplyMods(self) -> bool:
+        return self.getBooleanConfig(name=XPathModifierGUI.CONFIG_OPTION_NAME_APPLY_MODS, defaultValue=XPathModifierGUI.DEFAULT_APPLY_MODS)
+
     def getConfig(self,*,name, defaultValue) -> str:
         try:
             return self.configs.get(section=XPathModifierGUI.CONFIG_SECTION_NAME, option=name)
         except:
             return defaultValue
+
+    def getSavedFrameBudget(self) -> float:
+        try:
+            return float(self.getConfig(name=XPathModifierGUI.CONFIG_OPTION_NAME_FRAME_BUDGET, defaultValue=XPathModifierGUI.DEFAULT_FRAME_BUDGET))
+        except ValueError:
+            return float(XPathModifierGUI.DEFAULT_FRAME_BUDGET)
+
+    def getBooleanConfig(self, *, name, defaultValue) -> bool:
+        value = self.getConfig(name=name, defaultValue=defaultValue)
+        return value.strip().lower() in ("1", "true", "yes", "on")
         
     def setConfig(self, *, name, value) -> None:
         try:
@@ -115,33 +168,148 @@ class XPathModifierGUI:
         savedGameFolder = self.getConfig(name=XPathModifierGUI.CONFIG_OPTION_NAME_GAME_ROOT, defaultValue="")
         if (savedGameFolder):
             self.onSelectGameFolder(savedGameFolder)
-        while self.running:
-            self.root.update()
-            await asyncio.sleep(0)
+        tkLoop = TkLoop(root=self.root, frameBudgetMs=self.getSavedFrameBudget())
+        self.fileView.onUpdate = tkLoop.wake
+        await tkLoop.run(isRunning=lambda: self.running)
 
 
     def onSelectGameFolder(self, folder) -> None:
         folder = os.path.abspath(folder)
         if not isReadableFolder(folder):
             tkinter.messagebox.showerror("No read permission",f"You don't have read permissions for \"{folder}\"")
+        if folder != self.fileView.gameRootFolder and self.patchWriter.hasPendingFiles(self.fileView.edits):
+            if not tkinter.messagebox.askyesno("Unwritten changes", "The changes to the current game folder were not written. Discard them?"):
+                return
     
         self.setGameFolder(folder)
         self.updateTitle(folder)
 
     def onSelectOutputFolder(self, folderStr) -> None:
+        if not folderStr:
+            return
         if not isWriteableFolder(folderStr):
             self.showErrorNotWriteable(folderStr)
+            return
         self.outputFolder = folderStr
         self.topMenu.enableWriteChangesItem()
 
     def showErrorNotWriteable(self, path) -> None:
         tkinter.messagebox.showerror("No write permission",f"You don't have write permissions for \"{path}\"")
 
+    def showErrorWriteFailed(self, error) -> None:
+        #Otherwise the error would only end up unretrieved on the write task while the user assumes the changes were saved
+        self.fileView.instrumentation.log(f"Writing changes failed: {error!r}")
+        tkinter.messagebox.showerror("Writing changes failed", f"The changes were not (completely) written: {error}")
+
     def onWriteChanges(self):
-        pass
+        if not self.outputFolder or (self.writeTask and not self.writeTask.done()):
+            return
+        self.writeTask = asyncio.get_event_loop().create_task(self._writeChanges(self.outputFolder))
+
+    async def _writeChanges(self, outputFolder) -> None:
+        #The patch operations are collected on this thread, the files are written on the write executor
+        try:
+            pendingFiles = self.patchWriter.getPendingFiles(self.fileView.edits, self.fileView.getDocumentsByFileKey())
+        except Exception as e:
+            self.showErrorWriteFailed(e)
+            return
+        loop = asyncio.get_running_loop()
+        try:
+            writtenFileKeys = await loop.run_in_executor(self.writeExecutor, self.patchWriter.writeFiles, outputFolder, pendingFiles)
+        except OSError as e:
+            self.showErrorNotWriteable(e.filename or outputFolder)
+            return
+        except Exception as e:
+            self.showErrorWriteFailed(e)
+            return
+        self.patchWriter.markWritten(pendingFiles)
+        tkinter.messagebox.showinfo("Changes written", f"{len(writtenFileKeys)} patch file(s) updated in \"{outputFolder}\"")
+
+    def onSelectModification(self, modification) -> None:
+        self.changesView.showModification(modification, attributes=self.fileView.edits.getAttributes(modification),
+                                          properties=self.fileView.getInheritedProperties(modification))
+
+    def onChangeAttribute(self, modification, name, value) -> None:
+        self.fileView.edits.setAttribute(modification, name, value)
+        self.fileView.onElementEdited(modification)
+
+    def onEvaluateXPath(self) -> None:
+        expression = tkinter.simpledialog.askstring("Evaluate XPath", "XPath:", parent=self.root)
+        if not expression:
+            return
+        try:
+            results = self.fileView.evaluateXPath(expression)
+        except XPathSyntaxError as e:
+            tkinter.messagebox.showerror("Invalid XPath", str(e))
+            return
+        self.searchView.showResults(results)
+
+    def onBulkEdit(self) -> None:
+        selector = tkinter.simpledialog.askstring("Bulk edit", "Attributes to change (XPath), e.g. //item/property[@name='Stacknumber']/@value:",
+                                                  parent=self.root, initialvalue=self.bulkSelector)
+        if not selector:
+            return
+        self.bulkSelector = selector
+        transformText = tkinter.simpledialog.askstring("Bulk edit", "Transform: set VALUE, scale FACTOR, clamp MIN MAX (* = no bound) or replace /PATTERN/REPLACEMENT/",
+                                                       parent=self.root, initialvalue=self.bulkTransform)
+        if not transformText:
+            return
+        self.bulkTransform = transformText
+        try:
+            bulkEdit = BulkEdit(selector=selector, transform=BulkTransform(transformText), documents=self.fileView.getDocumentsByFileKey(),
+                                getAttributes=self.fileView.edits.getNodeAttributes)
+        except (XPathSyntaxError, BulkEditError) as e:
+            tkinter.messagebox.showerror("Invalid bulk edit", str(e))
+            return
+        changes = bulkEdit.getChanges()
+        if not changes:
+            tkinter.messagebox.showinfo("Bulk edit", f"{len(bulkEdit.matches)} value(s) matched, none of them would change")
+            return
+        self.changesView.showBulkPreview(bulkEdit)
+        fileCount = len({change[0] for change in changes})
+        if tkinter.messagebox.askyesno("Bulk edit", f"Change {len(changes)} value(s) in {fileCount} file(s)?"):
+            self.fileView.applyBulkEdit(bulkEdit)
+            self.changesView.setTitle(f"Bulk edit applied: {len(changes)} value(s) changed")
+        else:
+            self.changesView.clear()
+
+    def onToggleApplyMods(self, applyMods) -> None:
+        self.setConfig(name=XPathModifierGUI.CONFIG_OPTION_NAME_APPLY_MODS, value=str(applyMods).lower())
+        self.fileView.setApplyMods(applyMods)
+
+    def onShowModReport(self) -> None:
+        tkinter.messagebox.showinfo("Installed mods", self.fileView.modStack.getReport())
+
+    def onShowLoadStatistics(self) -> None:
+        if self.statusPanel is None or not self.statusPanel.isOpen():
+            self.statusPanel = StatusPanel(master=self.root, instrumentation=self.fileView.instrumentation)
+        self.statusPanel.lift()
+
+    def onToggleProfiler(self, isEnabled) -> None:
+        if isEnabled:
+            self.profiler = SamplingProfiler()
+            self.profiler.start()
+            self.fileView.instrumentation.log("Sampling profiler started")
+            return
+        self.profiler.stop()
+        profilePath = os.path.join(getScriptDirectory(), XPathModifierGUI.PROFILE_FILE_NAME)
+        try:
+            self.profiler.writeCollapsedStacks(profilePath)
+        except OSError:
+            self.showErrorNotWriteable(profilePath)
+        self.fileView.instrumentation.log(f"Sampling profiler stopped, stacks written to {profilePath}\n{self.profiler.getReport()}")
+        self.onShowLoadStatistics()
+
+    def onShowCacheStatistics(self) -> None:
+        tkinter.messagebox.showinfo("Cache statistics", self.fileView.parseCache.getStatistics())
 
     def setGameFolder(self, folderStr) -> None:
+        edits = self.fileView.edits
         self.fileView.setGameRootFolder(folderStr)
+        if self.fileView.edits is not edits:
+            #The written generations and the shown element belong to the dropped edits
+            self.patchWriter = ModPatchWriter()
+            self.changesView.clear()
         self.setConfig(name=XPathModifierGUI.CONFIG_OPTION_NAME_GAME_ROOT,value=folderStr)
     
 
@@ -156,7 +324,10 @@ class XPathModifierGUI:
             (XPathModifierGUI.CONFIG_OPTION_NAME_GAME_ROOT, ""),
             (XPathModifierGUI.CONFIG_OPTION_NAME_WINDOWSIZE, XPathModifierGUI.DEFAULT_WINDOW_SIZE), 
             (XPathModifierGUI.CONFIG_OPTION_NAME_LEFTPANEWIDTH, XPathModifierGUI.DEFAULT_LEFT_PANE_WIDTH),
-            (XPathModifierGUI.CONFIG_OPTION_NAME_RIGHTPANEWIDTH, XPathModifierGUI.DEFAULT_RIGHT_PANE_WIDTH)
+            (XPathModifierGUI.CONFIG_OPTION_NAME_RIGHTPANEWIDTH, XPathModifierGUI.DEFAULT_RIGHT_PANE_WIDTH),
+            (XPathModifierGUI.CONFIG_OPTION_NAME_LAZY_TREE, XPathModifierGUI.DEFAULT_LAZY_TREE),
+            (XPathModifierGUI.CONFIG_OPTION_NAME_FRAME_BUDGET, XPathModifierGUI.DEFAULT_FRAME_BUDGET),
+            (XPathModifierGUI.CONFIG_OPTION_NAME_APPLY_MODS, XPathModifierGUI.DEFAULT_APPLY_MODS)
         ):
             self._configSetDefaultsIfNotPresent(section=XPathModifierGUI.CONFIG_SECTION_NAME,
                 option=option, 
@@ -174,6 +345,9 @@ class XPathModifierGUI:
     def getConfigFilePath(self) -> None:
         return os.path.join(getScriptDirectory(), XPathModifierGUI.CONFIG_FILE_NAME)
 
+    def getCacheFolderPath(self) -> str:
+        return os.path.join(getScriptDirectory(), XPathModifierGUI.CACHE_FOLDER_NAME)
+
     def writeConfigs(self) -> None:
         configPath = self.getConfigFilePath()
         with open(configPath, "w") as file:
@@ -190,6 +364,9 @@ class XPathModifierGUI:
         )
 
         self.writeConfigs()
+        self.profiler.stop()
+        self.fileView.close()
+        self.writeExecutor.shutdown(wait=True)
         self.running= False
 
 class FileView:
@@ -198,22 +375,57 @@ class FileView:
     COLOR_FOLDER_ROW = "#f4f4f4"
     TAG_FILE = "file"
     COLOR_FILE_ROW = "#f4f4f4"
+    TAG_FAILED_FILE = "failed_file"
+    COLOR_FAILED_FILE_ROW = "#f4c4c4"
     TAG_TAG_ROW = "tag"
     COLOR_TAG_ROW = "#f4f4f4"
     TAG_ATTRIBUTE_ROW = "attribute"
     COLOR_ATTRIBUTE_ROW = "#f4f4f4"
+    TAG_PLACEHOLDER_ROW = "placeholder"
+    TEXT_PLACEHOLDER_ROW = "..."
+    LABEL_COPY_XPATH = "Copy XPath"
+    LABEL_FIND_USAGES = "Find usages"
+    LABEL_FIND_DEFINITION = "Find definition"
+    MAX_MENU_NAMES = 5 #Elements referring to more names get menu entries for the first ones only
 
     MAX_DEPTH_XML_RECURSE = 10
-    MAX_DEPTH_FOLDER_RECURSE = 10 #To prevent overflow in case for some reason we have a link pointing to the same folder tree
+    WATCH_INTERVAL = 1.0 #Seconds between polls of the file watcher
     
-    PATH_RELATIVE_CONFIG_FOLDER = os.path.join("Data", "Config")
+    PATH_RELATIVE_CONFIG_FOLDER = CONFIG_FOLDER_PATH
 
     #Instance functions
-    def __init__(self, *, master, headerText, configFolder=""):
-        self.executor = concurrent.futures.ThreadPoolExecutor(max_workers=1)
+    def __init__(self, *, master, headerText, configFolder="", lazy=True, cacheFolder="", frameBudgetMs=8, applyMods=True):
+        self.parseExecutor = concurrent.futures.ProcessPoolExecutor(max_workers=os.cpu_count())
+        self.parseTask = None
+        self.modTask = None
+        self.watcher = None
+        self.watchTask = None
+        self.modStack = ModStack()
+        self.applyMods = applyMods
+        self.gameRootFolder = ""
+        self.parseCache = XmlParseCache(cacheFolder)
+        self.instrumentation = Instrumentation()
+        self.insertionScheduler = InsertionScheduler(frameBudgetMs=frameBudgetMs, onProgress=self.updateStatus, instrumentation=self.instrumentation)
+        self.filesDone = 0
+        self.filesTotal = 0
         self.itemIdToXmlModification = dict()
+        self.itemIdToElement = dict() #Only used in lazy mode: rows whose children are created when the row is expanded
+        self.filePathToRow = dict()
+        self.folderPathToRow = dict()
+        self.fileRowToDocument = dict()
+        self.fileRowToVanillaDocument = dict() #Differs from fileRowToDocument for files patched by installed mods
+        self.fileKeyToResolver = dict()
+        self.edits = EditOverlay()
+        self.onSelectModification = lambda modification: None
+        self.searchIndex = SearchIndex()
+        self.referenceIndex = ReferenceIndex()
+        self.onShowResults = lambda results: None
+        self.onUpdate = lambda: None #Called after rows or the status changed outside of a Tk event
+        self.lazy = lazy
         self.configFolder = configFolder
         self.headerText = headerText
+        self.statusLabel = tkinter.Label(master=master, anchor=tkinter.W)
+        self.statusLabel.pack(side=tkinter.BOTTOM, fill=tkinter.X)
         self.tree = ttk.Treeview(master=master,selectmode=tkinter.BROWSE) #selectmode="brose" means single select items
         self.configureTags()
         self.tree.pack(fill=tkinter.BOTH,expand=True)
@@ -225,86 +437,582 @@ class FileView:
 
     def configureTags(self) -> None:
         self.tree.tag_configure(FileView.TAG_FILE, background=FileView.COLOR_FILE_ROW)
+        self.tree.tag_configure(FileView.TAG_FAILED_FILE, background=FileView.COLOR_FAILED_FILE_ROW)
         self.tree.tag_configure(FileView.TAG_FOLDER_ROW, background=FileView.COLOR_FOLDER_ROW)
         self.tree.tag_configure(FileView.TAG_TAG_ROW, background=FileView.COLOR_TAG_ROW)
         self.tree.tag_configure(FileView.TAG_ATTRIBUTE_ROW, background=FileView.COLOR_ATTRIBUTE_ROW)
         #Button 3: right mouse
         self.tree.tag_bind(FileView.TAG_TAG_ROW, sequence="<ButtonRelease-3>", callback=lambda event: self.onOpenMenu(event))
         self.tree.tag_bind(FileView.TAG_TAG_ROW, sequence="<Button-3>", callback=lambda event: self.onSelectItem(event))
+        self.tree.bind("<<TreeviewOpen>>", self.onOpenItem)
+        self.tree.bind("<<TreeviewClose>>", self.onCloseItem)
+        self.tree.bind("<<TreeviewSelect>>", self.onSelectionChanged)
 
     def setGameRootFolder(self, folderPath) -> None:
         configFolder = os.path.join(folderPath,FileView.PATH_RELATIVE_CONFIG_FOLDER)
         if not isReadableFolder(configFolder):
             return
+        if folderPath != self.gameRootFolder:
+            #Edits are XPaths into the files of one game folder. Loading the same folder again keeps them, they are
+            #looked up by XPath on the new elements.
+            self.edits = EditOverlay()
         self.clear()
+        self.instrumentation.reset()
+        self.instrumentation.log(f"Loading {configFolder}")
+        self.gameRootFolder = folderPath
         self.configFolder = configFolder
-        self._addFolder(self.configFolder)
+        start = time.perf_counter()
+        self._addFolder(self.configFolder, filePathToRow=self.filePathToRow)
+        self.instrumentation.addTime("discovery", time.perf_counter() - start, items=len(self.filePathToRow))
+        self.filesTotal = len(self.filePathToRow)
+        self.updateStatus()
+        loop = asyncio.get_event_loop()
+        self.parseTask = loop.create_task(self._parseFiles(dict(self.filePathToRow)))
+        self.watcher = createFileWatcher([self.configFolder, os.path.join(folderPath, MODS_FOLDER_NAME)])
+        self.watchTask = loop.create_task(self._watchFiles())
 
 
 
     
-    def _addFolder(self, folderPath, *, depth = 0) -> None:
-        print(f"adding {folderPath}")
-        if depth > FileView.MAX_DEPTH_FOLDER_RECURSE:
+    def _addFolder(self, folderPath, *, filePathToRow) -> None:
+        #The same discovery the reload, the CLI and the benchmark use: sorted, a row for each folder holding XML files
+        self._getFolderRow(folderPath)
+        for xmlFilePath in findXmlFiles(folderPath):
+            filePathToRow[xmlFilePath] = self._addFile(xmlFilePath, parent=self._getFolderRow(os.path.dirname(xmlFilePath)))
+
+    def _addFile(self, filePath, *, parent="") -> str:
+        self.instrumentation.count("files")
+        return self.tree.insert(parent, tkinter.END, tags=(FileView.TAG_FILE,), text=os.path.basename(filePath))
+
+    async def _parseFiles(self, filePathToRow) -> None:
+        start = time.perf_counter()
+        async for document in loadXmlDocuments(filePathToRow, executor=self.parseExecutor, parseCache=self.parseCache,
+                                               instrumentation=self.instrumentation):
+            self._addDocument(document, fileRow=filePathToRow[document.filePath])
+        self.instrumentation.addTime("load", time.perf_counter() - start, items=len(filePathToRow))
+        self.instrumentation.log(f"{len(filePathToRow)} files parsed in {time.perf_counter() - start:.2f} s")
+        if self.applyMods:
+            await self._updateModStack()
+
+    async def _watchFiles(self) -> None:
+        #Changes are handled once a poll finds nothing new, so a file that is still being written is reparsed once
+        changedPaths = set()
+        while True:
+            await asyncio.sleep(FileView.WATCH_INTERVAL)
+            paths = self.watcher.poll()
+            if paths:
+                changedPaths |= paths
+            elif changedPaths and self.parseTask.done() and (self.modTask is None or self.modTask.done()):
+                paths, changedPaths = changedPaths, set()
+                await self._reloadChangedFiles(paths)
+
+    async def _reloadChangedFiles(self, paths) -> None:
+        #Reparses the changed config files, adds and removes rows for new and deleted ones, and applies the mods
+        #again if a config file or any mod changed
+        start = time.perf_counter()
+        modsFolder = os.path.join(self.gameRootFolder, MODS_FOLDER_NAME)
+        isModChanged = any(FileView.isInFolder(path, modsFolder) for path in paths)
+        filePaths = self._getChangedXmlFiles([path for path in paths if FileView.isInFolder(path, self.configFolder)])
+        removedPaths = [filePath for filePath in filePaths if filePath in self.filePathToRow and not os.path.isfile(filePath)]
+        for filePath in removedPaths:
+            self._removeFile(filePath)
+        changedPaths = [filePath for filePath in filePaths if os.path.isfile(filePath)]
+        for filePath in changedPaths:
+            if filePath not in self.filePathToRow:
+                self.filePathToRow[filePath] = self._addFile(filePath, parent=self._getFolderRow(os.path.dirname(filePath)))
+                self.filesTotal += 1
+        async for document in loadXmlDocuments(changedPaths, executor=self.parseExecutor, parseCache=self.parseCache,
+                                               instrumentation=self.instrumentation):
+            fileRow = self.filePathToRow[document.filePath]
+            if fileRow not in self.fileRowToVanillaDocument:
+                self._addDocument(document, fileRow=fileRow)
+                continue
+            self.fileRowToVanillaDocument[fileRow] = document
+            self._updateFileRow(document, fileRow=fileRow)
+            if not self.applyMods:
+                self.replaceDocument(document, fileRow=fileRow)
+        if self.applyMods and (isModChanged or changedPaths or removedPaths):
+            await self._updateModStack()
+        self.instrumentation.addTime("reload", time.perf_counter() - start, items=len(changedPaths) + len(removedPaths))
+        self.instrumentation.log(f"Reloaded {len(changedPaths)} changed and {len(removedPaths)} removed file(s)"
+                                 + (", mods changed" if isModChanged else ""))
+        self.updateStatus()
+
+    @staticmethod
+    def isInFolder(path, folderPath) -> bool:
+        return path == folderPath or path.startswith(os.path.join(folderPath, ""))
+
+    def _getChangedXmlFiles(self, paths) -> list:
+        #Folders reported as a whole stand for every XML file below them, whether on disk or in the tree
+        filePaths = set()
+        for path in paths:
+            if os.path.isdir(path):
+                filePaths.update(findXmlFiles(path))
+            elif path.endswith(".xml"):
+                filePaths.add(path)
+            filePaths.update(filePath for filePath in self.filePathToRow if FileView.isInFolder(filePath, path))
+        return sorted(filePaths)
+
+    def _getFolderRow(self, folderPath) -> str:
+        row = self.folderPathToRow.get(folderPath)
+        if row is None:
+            row = self.tree.insert("", tkinter.END, text=folderPath, tags=(FileView.TAG_FOLDER_ROW,))
+            self.folderPathToRow[folderPath] = row
+            self.instrumentation.count("folders")
+        return row
+
+    def _removeFile(self, filePath) -> None:
+        fileRow = self.filePathToRow.pop(filePath)
+        forgottenRows = {fileRow}
+        self._forgetRow(fileRow, forgottenRows=forgottenRows)
+        self.insertionScheduler.cancel(parentRows=forgottenRows)
+        document = self.fileRowToDocument.pop(fileRow, None)
+        if document is not None:
+            self.searchIndex.removeDocument(document)
+        if self.fileRowToVanillaDocument.pop(fileRow, None) is not None:
+            self.filesDone -= 1
+        self.fileKeyToResolver.pop(self.getFileKey(filePath), None)
+        self.referenceIndex.removeDocument(self.getFileKey(filePath))
+        self.filesTotal -= 1
+        folderRow = self.tree.parent(fileRow)
+        self.tree.delete(fileRow)
+        folderPath = os.path.dirname(filePath)
+        if not os.path.isdir(folderPath) and not self.tree.get_children(folderRow):
+            self.tree.delete(folderRow)
+            self.folderPathToRow.pop(folderPath, None)
+
+    def setApplyMods(self, applyMods) -> None:
+        self.applyMods = applyMods
+        if applyMods:
+            self.reloadMods()
             return
-        parent = self.tree.insert("",tkinter.END,text=folderPath,tags=(FileView.TAG_FOLDER_ROW,))
-        xmlFiles = glob.glob(os.path.join(folderPath, "*.xml"))
-        for xmlFilePath in xmlFiles:
-            self._addFile(xmlFilePath, parent=parent)
-        
-        for subFolder in map(lambda subFolder: os.path.join(folderPath,subFolder),os.listdir(folderPath)):
-            if os.path.isdir(subFolder):
-                self._addFolder(os.path.join(folderPath,subFolder),depth=depth+1)
-    
+        if self.modTask:
+            self.modTask.cancel()
+            self.modTask = None
+        for fileRow, document in self.fileRowToVanillaDocument.items():
+            if self.fileRowToDocument.get(fileRow) is not document:
+                self.replaceDocument(document, fileRow=fileRow)
+
+    def reloadMods(self) -> None:
+        #While the files are still being parsed the mods are applied once that is done
+        if not self.applyMods or not self.parseTask or not self.parseTask.done():
+            return
+        if self.modTask:
+            self.modTask.cancel()
+        self.modTask = asyncio.get_event_loop().create_task(self._updateModStack())
+
+    async def _updateModStack(self) -> None:
+        start = time.perf_counter()
+        fileKeyToRow = {self.getFileKey(document.filePath): fileRow for fileRow, document in self.fileRowToVanillaDocument.items()}
+        mergedDocuments = await self.modStack.update(os.path.join(self.gameRootFolder, MODS_FOLDER_NAME),
+                                                     {fileKey: self.fileRowToVanillaDocument[fileRow] for fileKey, fileRow in fileKeyToRow.items()},
+                                                     executor=self.parseExecutor)
+        for fileKey, fileRow in fileKeyToRow.items():
+            document = mergedDocuments.get(fileKey, self.fileRowToVanillaDocument[fileRow])
+            if self.fileRowToDocument.get(fileRow) is not document:
+                self.replaceDocument(document, fileRow=fileRow)
+        self.instrumentation.addTime("mods", time.perf_counter() - start, items=len(mergedDocuments))
+
+    def replaceDocument(self, document, *, fileRow) -> None:
+        #Shows the given document instead of the file's current one. If both have the same root the rows are updated
+        #in place from the diff of the two trees, which keeps expanded rows open; otherwise they are built again.
+        oldDocument = self.fileRowToDocument.get(fileRow)
+        if oldDocument is None or oldDocument.root is None or document.root is None or oldDocument.root.tag != document.root.tag:
+            self._rebuildDocument(document, fileRow=fileRow)
+        else:
+            self._updateDocument(oldDocument, document, fileRow=fileRow)
+        self.updateStatus()
+
+    def _rebuildDocument(self, document, *, fileRow) -> None:
+        #Drops the rows, pending jobs and index entries of the file's current document and shows the given one instead
+        children = self.tree.get_children(fileRow)
+        forgottenRows = {fileRow}
+        for child in children:
+            self._forgetRow(child, forgottenRows=forgottenRows)
+        self.insertionScheduler.cancel(parentRows=forgottenRows)
+        self.tree.delete(*children)
+        self.itemIdToXmlModification.pop(fileRow, None)
+        self.itemIdToElement.pop(fileRow, None)
+        oldDocument = self.fileRowToDocument.pop(fileRow, None)
+        if oldDocument is not None:
+            self.searchIndex.removeDocument(oldDocument)
+        self.referenceIndex.removeDocument(self.getFileKey(document.filePath))
+        self._showDocument(document, fileRow=fileRow)
+        if self.lazy and fileRow in self.itemIdToElement and self.tree.item(fileRow, "open"):
+            self._expandLazyRow(fileRow)
+
+    def _updateDocument(self, oldDocument, document, *, fileRow) -> None:
+        #Pending row insertions are finished first so that the rows match the old tree
+        self.insertionScheduler.flush(parentRows={job.parentRow for job in self.insertionScheduler.jobs if job.fileRow == fileRow})
+        self.insertionScheduler.cancel(parentRows={fileRow})
+        self.searchIndex.removeDocument(oldDocument)
+        fileKey = self.getFileKey(document.filePath)
+        self.fileRowToDocument[fileRow] = document
+        self._updateRows(fileRow, oldDocument.root, document.root, fileKey=fileKey, documents=(oldDocument, document))
+        self._addBackgroundJobs(document, fileRow=fileRow, fileKey=fileKey)
+        self._rebindEdits(fileKey, document)
+        selections = self.tree.selection()
+        if selections and self.getFileRow(selections[0]) == fileRow:
+            self.onSelectionChanged(None)
 
-    def _addFile(self, filePath, *, parent="") -> None:
-        print(f"adding {filePath}")
-        fileRow = self.tree.insert(parent, tkinter.END, tags=(FileView.TAG_FILE,), text=os.path.basename(filePath))
-        try:
-            xmlParsed = ETree.parse(filePath)
-            xmlRoot = xmlParsed.getroot()
-            loop = asyncio.get_event_loop()
-            task = loop.create_task(
-            self._addXmlTag(element=xmlRoot, xPath=f"/{xmlRoot.tag}", rowParent=fileRow, filePath = filePath))
-         
-        except Exception as e:
+    def _updateRows(self, row, oldNode: "XmlNode", newNode: "XmlNode", *, fileKey, documents, depth = 0) -> None:
+        #row shows oldNode; afterwards it shows newNode, with only the rows that differ inserted, deleted or moved
+        if not self.lazy and depth > FileView.MAX_DEPTH_XML_RECURSE:
+            return
+        self._addModification(treeItemID=row, xmlModification=XmlModification(element=newNode, fileKey=fileKey))
+        if self.lazy:
+            if row not in self.itemIdToElement:
+                self._addLazyXmlTag(element=newNode, row=row, fileKey=fileKey)
+                return
+            if not self._isExpanded(row):
+                if len(newNode) or newNode.attrib or not newNode.isLoaded():
+                    self.itemIdToElement[row] = newNode
+                else:
+                    self.tree.delete(*self.tree.get_children(row))
+                    del self.itemIdToElement[row]
+                return
+            self.itemIdToElement[row] = newNode
+        oldDocument, newDocument = documents
+        oldDocument.loadChildren(oldNode)
+        newDocument.loadChildren(newNode)
+        attributeRows = dict()
+        elementRows = []
+        for childRow in self.tree.get_children(row):
+            modification = self.itemIdToXmlModification.get(childRow)
+            if self.tree.tag_has(FileView.TAG_ATTRIBUTE_ROW, childRow):
+                attributeRows[modification.attributeName] = childRow
+            else:
+                elementRows.append(childRow)
+        if len(elementRows) != len(oldNode) or attributeRows.keys() != oldNode.attrib.keys():
+            self._rebuildChildRows(row, newNode, fileKey=fileKey, document=newDocument, depth=depth)
             return
+        isReordered = list(oldNode.attrib) != list(newNode.attrib)
+        for name, attributeRow in attributeRows.items():
+            if name not in newNode.attrib:
+                self.itemIdToXmlModification.pop(attributeRow, None)
+                self.tree.delete(attributeRow)
+        for position, (name, value) in enumerate(newNode.attrib.items()):
+            attributeRow = attributeRows.get(name)
+            if attributeRow is None:
+                attributeRow = self.tree.insert(row, position, tags=(FileView.TAG_ATTRIBUTE_ROW,), text=f"{name}: {value}")
+            else:
+                if oldNode.attrib[name] != value:
+                    self.tree.item(attributeRow, text=f"{name}: {value}")
+                if isReordered and self.tree.index(attributeRow) != position:
+                    self.tree.move(attributeRow, row, position)
+            self._addModification(treeItemID=attributeRow, xmlModification=XmlModification(element=newNode, fileKey=fileKey, attributeName=name))
+        oldChildToRow = dict(zip(oldNode, elementRows))
+        pairs, removed, added = matchXmlChildren(oldNode, newNode)
+        for child in removed:
+            childRow = oldChildToRow[child]
+            self._forgetRow(childRow, forgottenRows=set())
+            self.tree.delete(childRow)
+        isReordered = isReordered or removed or added or [oldChild for oldChild, _ in pairs] != oldNode.children
+        newChildToOld = {newChild: oldChild for oldChild, newChild in pairs}
+        for position, child in enumerate(newNode, start=len(newNode.attrib)):
+            oldChild = newChildToOld.get(child)
+            if oldChild is None:
+                childRow = self.tree.insert(row, position, tags=(FileView.TAG_TAG_ROW,), text=f"<{child.tag}>")
+                self._insertChildRows(childRow, child, fileKey=fileKey, document=newDocument, depth=depth+1)
+                continue
+            childRow = oldChildToRow[oldChild]
+            if isReordered and self.tree.index(childRow) != position:
+                self.tree.move(childRow, row, position)
+            self._updateRows(childRow, oldChild, child, fileKey=fileKey, documents=documents, depth=depth+1)
+
+    def _insertChildRows(self, row, element: "XmlNode", *, fileKey, document, depth) -> None:
+        #Fills the freshly inserted row of an element the way the initial load would have
+        if self.lazy:
+            self._addLazyXmlTag(element=element, row=row, fileKey=fileKey)
+            return
+        fileRow = self.getFileRow(row)
+        self.insertionScheduler.add(InsertionJob(fileRow=fileRow, parentRow=fileRow,
+                                                 rowCount=countRows(element, maxDepth=FileView.MAX_DEPTH_XML_RECURSE, depth=depth),
+                                                 steps=self._insertXmlTag(element=element, rowParent=row, fileKey=fileKey, document=document, depth=depth)))
+
+    def _rebuildChildRows(self, row, element: "XmlNode", *, fileKey, document, depth) -> None:
+        children = self.tree.get_children(row)
+        for child in children:
+            self._forgetRow(child, forgottenRows=set())
+        self.tree.delete(*children)
+        if self.lazy:
+            self._expandLazyRow(row)
+            return
+        self._insertChildRows(row, element, fileKey=fileKey, document=document, depth=depth)
+
+    def _addDocument(self, document, *, fileRow) -> None:
+        self.filesDone += 1
+        self.updateStatus()
+        self.fileRowToVanillaDocument[fileRow] = document
+        self._updateFileRow(document, fileRow=fileRow)
+        self._showDocument(document, fileRow=fileRow)
+
+    def _updateFileRow(self, document, *, fileRow) -> None:
+        #Files that failed to parse are marked and show the reason
+        if document.error:
+            self.tree.item(fileRow, tags=(FileView.TAG_FILE, FileView.TAG_FAILED_FILE),
+                           text=f"{os.path.basename(document.filePath)} ({document.error})")
+        elif self.tree.tag_has(FileView.TAG_FAILED_FILE, fileRow):
+            self.tree.item(fileRow, tags=(FileView.TAG_FILE,), text=os.path.basename(document.filePath))
+
+    def _addBackgroundJobs(self, document, *, fileRow, fileKey) -> None:
+        self.insertionScheduler.add(InsertionJob(fileRow=fileRow, parentRow=fileRow, rowCount=0, isBackground=True,
+                                                 stage=InsertionJob.STAGE_INDEXING, steps=self.searchIndex.addDocumentSteps(document)))
+        if InheritanceResolver.isSupported(fileKey):
+            resolver = InheritanceResolver(document, fileKey=fileKey, getAttributes=self.edits.getNodeAttributes)
+            self.fileKeyToResolver[fileKey] = resolver
+            self.insertionScheduler.add(InsertionJob(fileRow=fileRow, parentRow=fileRow, rowCount=0, isBackground=True,
+                                                     stage=InsertionJob.STAGE_INHERITANCE, steps=resolver.resolveSteps()))
+        if ReferenceIndex.isSupported(fileKey):
+            self.insertionScheduler.add(InsertionJob(fileRow=fileRow, parentRow=fileRow, rowCount=0, isBackground=True,
+                                                     stage=InsertionJob.STAGE_REFERENCES, steps=self.referenceIndex.addDocumentSteps(fileKey, document)))
+
+    def _rebindEdits(self, fileKey, document) -> None:
+        missingXPaths = self.edits.rebindDocument(fileKey, document)
+        if missingXPaths:
+            self.instrumentation.log(f"{fileKey}: {len(missingXPaths)} edited element(s) no longer exist, e.g. {missingXPaths[0]}")
+
+    def _showDocument(self, document, *, fileRow) -> None:
+        if document.root is None:
+            return
+        xmlRoot = document.root
+        fileKey = self.getFileKey(document.filePath)
+        self.fileRowToDocument[fileRow] = document
+        if fileKey in self.edits.fileGenerations:
+            self._rebindEdits(fileKey, document)
+        self._addBackgroundJobs(document, fileRow=fileRow, fileKey=fileKey)
+        if self.lazy:
+            self._addLazyXmlTag(element=xmlRoot, row=fileRow, fileKey=fileKey)
+            return
+        self.insertionScheduler.add(InsertionJob(fileRow=fileRow, parentRow=fileRow, rowCount=countRows(xmlRoot, maxDepth=FileView.MAX_DEPTH_XML_RECURSE),
+                                                 steps=self._insertXmlTag(element=xmlRoot, rowParent=fileRow, fileKey=fileKey, document=document)))
 
-        
-    async def _addXmlTag(self, *, element: ETree.Element, rowParent: str, filePath: str, xPath: str, depth=0, childCounts = None) -> None:
- 
+    #Insertion steps are generators that yield after each inserted row, the InsertionScheduler decides how many run per frame
+    def _insertXmlTag(self, *, element: "XmlNode", rowParent: str, fileKey: str, document: "XmlDocument", depth=0):
         if depth > FileView.MAX_DEPTH_XML_RECURSE:
             return
-        childCounts = childCounts or ChildCounts()
-        subFolder = os.path.relpath(os.path.dirname(filePath), start=self.configFolder)
-        self._addModification(treeItemID=rowParent,xmlModification= XmlModification(element= element, xPath=xPath, subFolder=subFolder))
+        document.loadChildren(element)
+        self._addModification(treeItemID=rowParent,xmlModification= XmlModification(element= element, fileKey=fileKey))
 
         for attributeName, attributeValue in element.attrib.items():
             attributeListItem = self.tree.insert(rowParent, tkinter.END, tags= (FileView.TAG_ATTRIBUTE_ROW,), text=f"{attributeName}: {attributeValue}")
-            self._addModification(treeItemID=attributeListItem, xmlModification= XmlModification(element=element, xPath= f"{xPath}[@{attributeName}]", subFolder=subFolder))
+            self._addModification(treeItemID=attributeListItem, xmlModification= XmlModification(element=element, fileKey=fileKey, attributeName=attributeName))
+            yield
 
         for child in iter(element):
             nextParent = self.tree.insert(rowParent, tkinter.END, tags=(FileView.TAG_TAG_ROW), text=f"<{child.tag}>")
-            childXPath = self.buildXPath(parentsXPath=xPath, child=child, childCounts= childCounts)
-            try:
-                await self._addXmlTag(element=child, xPath=childXPath, rowParent=nextParent, filePath=filePath, depth=depth+1, childCounts=childCounts)
-                await asyncio.sleep(0)
-            except asyncio.CancelledError:
-                return
+            yield
+            yield from self._insertXmlTag(element=child, rowParent=nextParent, fileKey=fileKey, document=document, depth=depth+1)
+
+    def _addLazyXmlTag(self, *, element: "XmlNode", row: str, fileKey: str) -> None:
+        self._addModification(treeItemID=row, xmlModification=XmlModification(element=element, fileKey=fileKey))
+        if len(element) or element.attrib or not element.isLoaded():
+            self.itemIdToElement[row] = element
+            self._addPlaceholder(row)
+
+    def _addPlaceholder(self, row) -> None:
+        self.tree.insert(row, tkinter.END, tags=(FileView.TAG_PLACEHOLDER_ROW,), text=FileView.TEXT_PLACEHOLDER_ROW)
+
+    def _isExpanded(self, row) -> bool:
+        children = self.tree.get_children(row)
+        return not (len(children) == 1 and self.tree.tag_has(FileView.TAG_PLACEHOLDER_ROW, children[0]))
+
+    def onOpenItem(self, event) -> None:
+        row = self.tree.focus()
+        self.insertionScheduler.prioritize(self.getFileRow(row))
+        if row in self.itemIdToElement and not self._isExpanded(row):
+            self._expandLazyRow(row)
+
+    def onCloseItem(self, event) -> None:
+        row = self.tree.focus()
+        if row in self.itemIdToElement and self._isExpanded(row):
+            self._collapseLazyRow(row)
+
+    def onSelectionChanged(self, event) -> None:
+        selections = self.tree.selection()
+        if selections:
+            self.insertionScheduler.prioritize(self.getFileRow(selections[0]))
+            modification = self.itemIdToXmlModification.get(selections[0])
+            if modification is not None:
+                self.onSelectModification(modification)
+
+    def getFileRow(self, row) -> str:
+        while row and not self.tree.tag_has(FileView.TAG_FILE, row):
+            row = self.tree.parent(row)
+        return row
+
+    def _expandLazyRow(self, row) -> None:
+        self.tree.delete(*self.tree.get_children(row))
+        element = self.itemIdToElement[row]
+        fileRow = self.getFileRow(row)
+        self.fileRowToDocument[fileRow].loadChildren(element)
+        self.insertionScheduler.add(InsertionJob(fileRow=fileRow, parentRow=row, rowCount=len(element.attrib) + len(element),
+                                                 steps=self._insertLazyChildren(row)))
+
+    def _insertLazyChildren(self, row):
+        element = self.itemIdToElement[row]
+        fileKey = self.itemIdToXmlModification[row].fileKey
 
+        for attributeName, attributeValue in element.attrib.items():
+            attributeListItem = self.tree.insert(row, tkinter.END, tags= (FileView.TAG_ATTRIBUTE_ROW,), text=f"{attributeName}: {attributeValue}")
+            self._addModification(treeItemID=attributeListItem, xmlModification= XmlModification(element=element, fileKey=fileKey, attributeName=attributeName))
+            yield
 
-    def buildXPath(self,* , parentsXPath, child, childCounts ):
-        baseXPath = f"{parentsXPath}/{child.tag}"
-        childIndex = childCounts.getNextIndex(baseXPath)
-        childCounts.increment(baseXPath)
-        return baseXPath + f"[{childIndex}]"
+        for child in iter(element):
+            childRow = self.tree.insert(row, tkinter.END, tags=(FileView.TAG_TAG_ROW,), text=f"<{child.tag}>")
+            self._addLazyXmlTag(element=child, row=childRow, fileKey=fileKey)
+            yield
+
+    def _collapseLazyRow(self, row) -> None:
+        children = self.tree.get_children(row)
+        forgottenRows = {row}
+        for child in children:
+            self._forgetRow(child, forgottenRows=forgottenRows)
+        #Indexing jobs belong to the document, not to the rows, and keep running
+        self.insertionScheduler.cancel(parentRows=forgottenRows, includeBackground=False)
+        self.tree.delete(*children)
+        self._addPlaceholder(row)
+        self.fileRowToDocument[self.getFileRow(row)].unloadChildren(self.itemIdToElement[row])
+
+    def _forgetRow(self, row, *, forgottenRows) -> None:
+        for child in self.tree.get_children(row):
+            self._forgetRow(child, forgottenRows=forgottenRows)
+        forgottenRows.add(row)
+        self.itemIdToXmlModification.pop(row, None)
+        self.itemIdToElement.pop(row, None)
+
+    def search(self, query):
+        results = []
+        for node in self.searchIndex.search(query):
+            document = self.searchIndex.getDocument(node)
+            if document is not None:
+                results.append((f"{self.getFileKey(document.filePath)}: {node.xPath}", node))
+        return results
+
+    def evaluateXPath(self, expression):
+        results = evaluateXPaths([expression], self.fileRowToDocument.values())[expression]
+        return [(self.getResultLabel(document, match), match[0] if isinstance(match, tuple) else match)
+                for document, match in results[:SearchIndex.MAX_RESULTS]]
+
+    def getResultLabel(self, document, match) -> str:
+        if isinstance(match, tuple):
+            node, attributeName = match
+            return f"{self.getFileKey(document.filePath)}: {node.xPath}/@{attributeName} = {node.attrib[attributeName]}"
+        return f"{self.getFileKey(document.filePath)}: {match.xPath}"
+
+    def revealNode(self, node: "XmlNode") -> None:
+        #Expands (and if needed creates) the rows down to the node, then selects it
+        document = self.searchIndex.getDocument(node)
+        row = next((fileRow for fileRow, fileDocument in self.fileRowToDocument.items() if fileDocument is document), None)
+        if row is None:
+            return
+        ancestors = []
+        while node.parent is not None:
+            ancestors.append(node)
+            node = node.parent
+        for ancestor in reversed(ancestors):
+            self._ensureChildRows(row)
+            self.tree.item(row, open=True)
+            row = next((child for child in self.tree.get_children(row) if self._isRowOfElement(child, ancestor)), None)
+            if row is None:
+                return
+        self.tree.see(row)
+        self.tree.selection_set(row)
+        self.tree.focus(row)
+
+    def _ensureChildRows(self, row) -> None:
+        if self.lazy and row in self.itemIdToElement and not self._isExpanded(row):
+            self._expandLazyRow(row)
+        if self.lazy:
+            self.insertionScheduler.flush(parentRows={row})
+        else:
+            self.insertionScheduler.flush(parentRows={self.getFileRow(row)})
+
+    def _isRowOfElement(self, row, element) -> bool:
+        modification = self.itemIdToXmlModification.get(row)
+        return modification is not None and modification.element is element and modification.attributeName is None
+
+    def getInheritedProperties(self, modification: "XmlModification"):
+        #For blocks, items and entity classes: (local properties, effective properties), otherwise None
+        resolver = self.fileKeyToResolver.get(modification.fileKey)
+        element = modification.element
+        if resolver is None or element.parent is None or element.parent is not resolver.document.root:
+            return None
+        name = resolver.getOwnerName(element)
+        if name is None:
+            return None
+        return (resolver.getLocalProperties(element), resolver.getEffectiveProperties(name))
+
+    def getDocumentsByFileKey(self) -> dict:
+        return {self.getFileKey(document.filePath): document for document in self.fileRowToDocument.values()}
+
+    def applyBulkEdit(self, bulkEdit: "BulkEdit") -> None:
+        changes = bulkEdit.getChanges()
+        for fileKey, node, name, _, newValue in changes:
+            modification = XmlModification(element=node, fileKey=fileKey)
+            self.edits.setAttribute(modification, name, newValue)
+            self.onElementEdited(modification)
+        editSets = bulkEdit.getEditSets()
+        for editSet in editSets:
+            self.edits.addEditSet(editSet)
+        self.instrumentation.log(f"Bulk edit {bulkEdit.selector} {bulkEdit.transform.text}: {len(changes)} value(s) changed, {len(editSets)} edit set(s)")
+
+    def onElementEdited(self, modification: "XmlModification") -> None:
+        resolver = self.fileKeyToResolver.get(modification.fileKey)
+        if resolver is not None:
+            resolver.onElementChanged(modification.element)
+
+    def getFileKey(self, filePath) -> str:
+        #The file's path relative to the config folder, e.g. "XUi/windows.xml". Shared by every row of the file.
+        return getFileKey(self.configFolder, filePath)
 
     def _addModification(self,*, treeItemID,xmlModification) -> None:
         self.itemIdToXmlModification[treeItemID] = xmlModification
 
     def clear(self) -> None:
+        if self.watchTask:
+            self.watchTask.cancel()
+            self.watchTask = None
+        if self.watcher:
+            self.watcher.close()
+            self.watcher = None
+        if self.parseTask:
+            self.parseTask.cancel()
+            self.parseTask = None
+        if self.modTask:
+            self.modTask.cancel()
+            self.modTask = None
+        self.modStack.clear()
+        self.insertionScheduler.cancel()
+        self.filesDone = 0
+        self.filesTotal = 0
         self.itemIdToXmlModification.clear()
+        self.itemIdToElement.clear()
+        self.filePathToRow.clear()
+        self.folderPathToRow.clear()
+        self.fileRowToDocument.clear()
+        self.fileRowToVanillaDocument.clear()
+        self.fileKeyToResolver.clear()
+        self.searchIndex.clear()
+        self.referenceIndex.clear()
         self.tree.delete(*self.tree.get_children())
+        self.updateStatus()
+
+    def updateStatus(self) -> None:
+        filesDone, filesTotal, rowsPending = self.getProgress()
+        if filesDone == filesTotal and not rowsPending:
+            text = f"{filesTotal} files loaded"
+        else:
+            text = f"Loading: {filesDone}/{filesTotal} files, {rowsPending} rows pending"
+        self.statusLabel.config(text=text)
+        self.onUpdate()
+
+    def getProgress(self):
+        return (self.filesDone, self.filesTotal, self.insertionScheduler.rowsPending)
+
+    def close(self) -> None:
+        self.clear()
+        self.parseExecutor.shutdown(wait=False, cancel_futures=True)
 
     def onOpenMenu(self, event) -> None:
         #sel =self.tree.selection_get()
@@ -312,52 +1020,207 @@ class FileView:
         if not selections:
             return
         itemId = selections[0]
-        print(itemId)
         t = self.itemIdToXmlModification[itemId]
-        print(t.xPath)
         contextMenu = tkinter.Menu(self.tree, tearoff=0)
-        contextMenu.add_command(label="kakka")
-        contextMenu.add_command(label="kököö")
+        contextMenu.add_command(label=FileView.LABEL_COPY_XPATH, command=lambda: self.copyToClipboard(t.xPath))
+        definedName = self.referenceIndex.getDefinedName(t.fileKey, t.element)
+        referencedNames = self.referenceIndex.getReferencedNames(t.fileKey, t.element)[:FileView.MAX_MENU_NAMES]
+        usageNames = [definedName] if definedName else referencedNames
+        for name in usageNames:
+            contextMenu.add_command(label=f"{FileView.LABEL_FIND_USAGES}: {name}", command=lambda name=name: self.findUsages(name))
+        for name in referencedNames:
+            contextMenu.add_command(label=f"{FileView.LABEL_FIND_DEFINITION}: {name}", command=lambda name=name: self.findDefinition(name))
+        if not usageNames:
+            contextMenu.add_command(label=FileView.LABEL_FIND_USAGES, state=tkinter.DISABLED)
+        if not referencedNames:
+            contextMenu.add_command(label=FileView.LABEL_FIND_DEFINITION, state=tkinter.DISABLED)
         contextMenu.post(event.x_root, event.y_root)
 
+    def findUsages(self, name) -> None:
+        self.onShowResults([(f"{reference.fileKey}: {reference.node.xPath}/@{reference.attributeName}", reference.node)
+                            for reference in self.referenceIndex.getUsages(name, limit=SearchIndex.MAX_RESULTS)])
+
+    def findDefinition(self, name) -> None:
+        definitions = self.referenceIndex.getDefinitions(name)
+        self.onShowResults([(f"{reference.fileKey}: {reference.node.xPath}", reference.node) for reference in definitions])
+        if len(definitions) == 1:
+            self.revealNode(definitions[0].node)
+
+    def copyToClipboard(self, text) -> None:
+        self.tree.clipboard_clear()
+        self.tree.clipboard_append(text)
+
     def onSelectItem(self, event) -> None:
         itemId = self.tree.identify_row(event.y)
         self.tree.selection_set(itemId)
 
-class ChildCounts:
-    def __init__(self) -> None:
-        self._defaultDict = defaultdict(lambda: 1)
-    def getNextIndex(self, xPath: str):
-        return self._defaultDict[xPath]
-    def increment(self, xPath: str):
-        self._defaultDict[xPath] += 1
-
-class XmlModification:
-    def __init__(self, *, element:ETree.Element, xPath, attributeChanges = dict(), contentChange = "", subFolder = ""):
-        self.originalAttributes = dict(element.items())
-        self.xPath = xPath
-        self.attributeChanges = attributeChanges
-        self.contentChange = contentChange
-        self.subFolder = subFolder
+class InsertionJob:
+    #Background jobs (e.g. indexing) only run when no rows are waiting to be inserted. The stage names the job's
+    #timer in the instrumentation.
+    __slots__ = ("fileRow", "parentRow", "steps", "rowsPending", "isBackground", "stage")
+    STAGE_ROWS = "row insertion"
+    STAGE_INDEXING = "indexing"
+    STAGE_INHERITANCE = "inheritance"
+    STAGE_REFERENCES = "references"
+
+    def __init__(self, *, fileRow, parentRow, steps, rowCount, isBackground = False, stage = STAGE_ROWS) -> None:
+        self.fileRow = fileRow
+        self.parentRow = parentRow
+        self.steps = steps
+        self.rowsPending = rowCount
+        self.isBackground = isBackground
+        self.stage = stage
+
+class InsertionScheduler:
+    #Owns every pending tree insertion. Each tick runs jobs for one frame budget, jobs of the prioritized file first.
+    def __init__(self, *, frameBudgetMs, onProgress = lambda: None, instrumentation: Instrumentation = None) -> None:
+        self.frameBudget = frameBudgetMs / 1000
+        self.onProgress = onProgress
+        self.instrumentation = instrumentation or Instrumentation()
+        self.jobs = []
+        self.task = None
+        self.priorityFileRow = None
+        self.rowsPending = 0
+
+    def add(self, job: InsertionJob) -> None:
+        self.jobs.append(job)
+        self.rowsPending += job.rowsPending
+        if self.task is None or self.task.done():
+            self.task = asyncio.get_event_loop().create_task(self._run())
+
+    def prioritize(self, fileRow) -> None:
+        self.priorityFileRow = fileRow
+
+    def cancel(self, *, parentRows = None, includeBackground = True) -> None:
+        #Without parentRows every job is cancelled
+        cancelled = [job for job in self.jobs if (parentRows is None or job.parentRow in parentRows)
+                     and (includeBackground or not job.isBackground)]
+        for job in cancelled:
+            self._removeJob(job)
+        if not self.jobs and self.task:
+            self.task.cancel()
+            self.task = None
+
+    def _removeJob(self, job: InsertionJob) -> None:
+        self.jobs.remove(job)
+        self.rowsPending -= job.rowsPending
+        job.steps.close()
+
+    def flush(self, *, parentRows) -> None:
+        #Runs the matching jobs to completion right away
+        for job in [job for job in self.jobs if job.parentRow in parentRows and not job.isBackground]:
+            start = time.perf_counter()
+            steps = sum(1 for _ in job.steps)
+            self.instrumentation.addTime(job.stage, time.perf_counter() - start, items=steps)
+            self._removeJob(job)
+        self.onProgress()
+
+    def _nextJob(self) -> InsertionJob:
+        foregroundJobs = [job for job in self.jobs if not job.isBackground] or self.jobs
+        for job in foregroundJobs:
+            if job.fileRow == self.priorityFileRow:
+                return job
+        return foregroundJobs[0]
+
+    async def _run(self) -> None:
+        while self.jobs:
+            deadline = time.perf_counter() + self.frameBudget
+            while self.jobs and time.perf_counter() < deadline:
+                job = self._nextJob()
+                if self._runJob(job, deadline=deadline):
+                    self._removeJob(job)
+            self.onProgress()
+            await asyncio.sleep(0)
+
+    def _runJob(self, job: InsertionJob, *, deadline) -> bool:
+        #Returns True once the job has inserted all of its rows
+        start = time.perf_counter()
+        steps = 0
+        isDone = True
+        for _ in job.steps:
+            steps += 1
+            if job.rowsPending:
+                job.rowsPending -= 1
+                self.rowsPending -= 1
+            if time.perf_counter() >= deadline:
+                isDone = False
+                break
+        self.instrumentation.addTime(job.stage, time.perf_counter() - start, items=steps)
+        return isDone
+
+def countRows(element, *, maxDepth, depth = 0) -> int:
+    if depth > maxDepth:
+        return 0
+    return len(element.attrib) + sum(1 + countRows(child, maxDepth=maxDepth, depth=depth+1) for child in element)
 
 class ChangesView:
     ATTRIBUTE_VALUE_INDEX = 1
 
-    def __init__(self,master: tkinter.Widget,*, outputFolder = ""):
+    ATTRIBUTE_NAME_INDEX = 0
+    TAG_DATA_ROW = "data_row"
+    TAG_PROPERTY_ROW = "property_row"
+    COLOR_PROPERTY_ROW = "#f4f4f4"
+    TAG_PREVIEW_ROW = "preview_row"
+    HEADINGS = ("Attribute", "Value", "Effective")
+    PREVIEW_HEADINGS = ("Attribute", "Old value", "New value")
+    MAX_PREVIEW_ROWS = 1000
+
+    def __init__(self,master: tkinter.Widget,*, outputFolder = "", onChangeAttribute = lambda modification, name, value: None):
         self.master = master
         self.highlightBox = None
+        self.modification = None
+        self.onChangeAttribute = onChangeAttribute
         self.label = tkinter.Label(master=master,height=1,text="Details:")
         self.label.pack(expand=False, fill="x",)
         
-        self.tree = ttk.Treeview(master=master,columns=("attribute","value"),show="headings", selectmode= "none")
-        self.tree.heading("attribute", text="Attribute")
-        self.tree.heading("value", text="Value")
-        # self.tree.pack(expand=True, fill="both")
-        # self.outputFolder = outputFolder
-        # self.tree.insert("",0,values=("attribute1", "value1"),tags=("data_row"))
-        # self.tree.insert("",1,values=("attribute2", "value2"),tags=("data_row"))
+        self.tree = ttk.Treeview(master=master,columns=("attribute","value","effective"),show="headings", selectmode= "none")
+        self.setHeadings(ChangesView.HEADINGS)
+        self.tree.tag_configure(ChangesView.TAG_PROPERTY_ROW, background=ChangesView.COLOR_PROPERTY_ROW)
+        self.tree.pack(expand=True, fill="both")
         
-        self.tree.tag_bind("data_row", "<Double-1>", self.onClick)
+        self.tree.tag_bind(ChangesView.TAG_DATA_ROW, "<Double-1>", self.onClick)
+
+    def showModification(self, modification, *, attributes, properties = None) -> None:
+        #properties: (local, effective) <property> values of elements that inherit through Extends. Those rows are
+        #read-only, the properties are edited on their own <property> elements.
+        self.clear()
+        self.modification = modification
+        self.setTitle(f"Details: <{modification.element.tag}>")
+        for name, value in attributes.items():
+            self.tree.insert("", tkinter.END, values=(name, value, value), tags=(ChangesView.TAG_DATA_ROW,))
+        if properties is None:
+            return
+        localProperties, effectiveProperties = properties
+        ownName = attributes.get("name")
+        for name, (value, source) in effectiveProperties.items():
+            effectiveText = value if source == ownName else f"{value} (from {source})"
+            self.tree.insert("", tkinter.END, values=(f"property {name}", localProperties.get(name, ""), effectiveText),
+                             tags=(ChangesView.TAG_PROPERTY_ROW,))
+
+    def showBulkPreview(self, bulkEdit: "BulkEdit") -> None:
+        #Read-only: one row per value the bulk edit would change, the first MAX_PREVIEW_ROWS of them
+        self.clear()
+        changes = bulkEdit.getChanges()
+        self.setTitle(f"Bulk edit preview: {len(changes)} of {len(bulkEdit.matches)} value(s) change")
+        self.setHeadings(ChangesView.PREVIEW_HEADINGS)
+        for fileKey, node, name, oldValue, newValue in changes[:ChangesView.MAX_PREVIEW_ROWS]:
+            self.tree.insert("", tkinter.END, values=(f"{fileKey}: {node.xPath}/@{name}", oldValue, newValue), tags=(ChangesView.TAG_PREVIEW_ROW,))
+        if len(changes) > ChangesView.MAX_PREVIEW_ROWS:
+            self.tree.insert("", tkinter.END, values=(f"... {len(changes) - ChangesView.MAX_PREVIEW_ROWS} more", "", ""), tags=(ChangesView.TAG_PREVIEW_ROW,))
+
+    def clear(self) -> None:
+        self.onPressedEscape(column=None, row=None)
+        self.modification = None
+        self.setTitle("Details:")
+        self.setHeadings(ChangesView.HEADINGS)
+        self.tree.delete(*self.tree.get_children())
+
+    def setTitle(self, text) -> None:
+        self.label.config(text=text)
+
+    def setHeadings(self, headings) -> None:
+        for column, text in zip(("attribute", "value", "effective"), headings):
+            self.tree.heading(column, text=text)
 
     def getHeadingText(self) -> str:
         return "Changes done:"
@@ -394,36 +1257,125 @@ class ChangesView:
 
         #note to self: "-1c" means "subtract one character"
         #"-1c" to soak the newline at the end:
-        self.tree.set(row, column=column, value=self.highlightBox.get("1.0","end-1c"))
+        value = self.highlightBox.get("1.0","end-1c")
+        if not self.isEditableRow(row):
+            return self.onPressedEscape(column=column, row=row)
+        self.tree.set(row, column=column, value=value)
+        self.tree.set(row, column="effective", value=value)
         self.highlightBox.destroy()
+        self.highlightBox = None
+        if self.modification is not None:
+            self.onChangeAttribute(self.modification, str(self.tree.item(row)["values"][ChangesView.ATTRIBUTE_NAME_INDEX]), value)
         return "break"
     
     def onPressedTab(self,  *,column: str, row: str):
-        allRows = self.tree.get_children()
-        thisIndex = allRows.index(row)
+        #Only attribute rows are visited, the property and preview rows are read-only
+        allRows = [child for child in self.tree.get_children() if self.isEditableRow(child)]
         self.onPressedEnter( column=column, row= row)
-        self.highlight(column=column, row=allRows[(thisIndex+1)%len(allRows)])
-
-        print(f"column: {column}")
-        print(f"row: {row}")
-        print(f"children: {allRows}")
+        if row in allRows:
+            self.highlight(column=column, row=allRows[(allRows.index(row)+1)%len(allRows)])
         return "break"
 
+    def isEditableRow(self, row) -> bool:
+        return self.tree.exists(row) and self.tree.tag_has(ChangesView.TAG_DATA_ROW, row)
+
     def onPressedEscape(self, *, column: str, row: str):
         self.highlightBox and self.highlightBox.destroy()
+        self.highlightBox = None
         return "break"
 
 
         
 
+class SearchView:
+    RESULT_LIST_HEIGHT = 8
+
+    def __init__(self, *, master: tkinter.Widget, onSearch, onSelectResult) -> None:
+        self.onSearch = onSearch
+        self.onSelectResult = onSelectResult
+        self.results = []
+        self.frame = tkinter.Frame(master=master)
+        self.frame.pack(side=tkinter.TOP, fill=tkinter.X)
+        self.query = tkinter.StringVar(master=master)
+        self.query.trace_add("write", lambda *_: self.onQueryChanged())
+        self.entry = tkinter.Entry(master=self.frame, textvariable=self.query)
+        self.entry.pack(side=tkinter.TOP, fill=tkinter.X)
+        self.resultList = tkinter.Listbox(master=self.frame, height=SearchView.RESULT_LIST_HEIGHT)
+        self.resultList.bind("<<ListboxSelect>>", lambda event: self.onResultSelected())
+
+    def onQueryChanged(self) -> None:
+        self.showResults(self.onSearch(self.query.get()))
+
+    def showResults(self, results) -> None:
+        self.results = results
+        self.resultList.delete(0, tkinter.END)
+        if not self.results:
+            self.resultList.pack_forget()
+            return
+        self.resultList.insert(tkinter.END, *(label for label, _ in self.results))
+        self.resultList.pack(side=tkinter.TOP, fill=tkinter.X)
+
+    def onResultSelected(self) -> None:
+        selection = self.resultList.curselection()
+        if selection:
+            self.onSelectResult(self.results[selection[0]][1])
+
+class StatusPanel:
+    #Window with the load pipeline's timers, counters and log, refreshed while it is open
+    REFRESH_INTERVAL_MS = 500
+    WINDOW_TITLE = "Load statistics"
+
+    def __init__(self, *, master: tkinter.Widget, instrumentation: Instrumentation) -> None:
+        self.instrumentation = instrumentation
+        self.shownText = None
+        self.window = tkinter.Toplevel(master)
+        self.window.title(StatusPanel.WINDOW_TITLE)
+        self.text = tkinter.Text(master=self.window, wrap=tkinter.NONE, font="TkFixedFont")
+        self.scrollbar = tkinter.Scrollbar(self.window, orient=tkinter.VERTICAL, command=self.text.yview)
+        self.scrollbar.pack(side=tkinter.RIGHT, fill=tkinter.Y)
+        self.text.configure(yscrollcommand=self.scrollbar.set)
+        self.text.pack(fill=tkinter.BOTH, expand=True)
+        self.refresh()
+
+    def isOpen(self) -> bool:
+        return bool(self.window.winfo_exists())
+
+    def lift(self) -> None:
+        self.window.lift()
+
+    def refresh(self) -> None:
+        if not self.isOpen():
+            return
+        text = self.instrumentation.getReport() + "\n\n" + "\n".join(self.instrumentation.logLines)
+        if text != self.shownText:
+            self.shownText = text
+            self.text.configure(state=tkinter.NORMAL)
+            self.text.delete("1.0", tkinter.END)
+            self.text.insert("1.0", text)
+            self.text.configure(state=tkinter.DISABLED)
+        self.window.after(StatusPanel.REFRESH_INTERVAL_MS, self.refresh)
+
 class TopMenu:
     LABEL_SELECT_GAME_FOLDER = "Select game folder"
     LABEL_SELECT_OUTPUT_FOLDER = "Select output folder"
     LABEL_WRITE_CHANGES = "Write changes to output folder"
+    LABEL_CACHE_STATISTICS = "Cache statistics"
+    LABEL_EVALUATE_XPATH = "Evaluate XPath..."
+    LABEL_BULK_EDIT = "Bulk edit..."
+    LABEL_APPLY_MODS = "Apply installed mods"
+    LABEL_RELOAD_MODS = "Reload mods"
+    LABEL_MOD_REPORT = "Mod load report"
+    LABEL_LOAD_STATISTICS = "Load statistics..."
+    LABEL_PROFILER = "Sampling profiler"
     LABEL_EXIT = "Exit"
 
-    def __init__(self, *,root:tkinter.Tk, onSelectConfigFolder, onSelectOutputFolder, onWriteChanges, onQuit = lambda: None):
+    def __init__(self, *,root:tkinter.Tk, onSelectConfigFolder, onSelectOutputFolder, onWriteChanges, onShowCacheStatistics, onEvaluateXPath,
+                 onBulkEdit, onToggleApplyMods, onReloadMods, onShowModReport, onShowLoadStatistics, onToggleProfiler, applyMods = True,
+                 onQuit = lambda: None):
         self.onSelectConfigFolder = onSelectConfigFolder
+        self.onEvaluateXPath = onEvaluateXPath
+        self.onToggleApplyMods = onToggleApplyMods
+        self.onShowCacheStatistics = onShowCacheStatistics
         self.onSelectOutputFolder = onSelectOutputFolder
         self.onWriteChanges = onWriteChanges
         self.onQuit = onQuit
@@ -433,9 +1385,27 @@ class TopMenu:
         self.fileMenu.add_command(label=TopMenu.LABEL_SELECT_GAME_FOLDER, command=self.selectGameFolder)
         self.fileMenu.add_command(label=TopMenu.LABEL_SELECT_OUTPUT_FOLDER, command=self.selectOutputFolder)
         self.fileMenu.add_command(label=TopMenu.LABEL_WRITE_CHANGES, command=self.onWriteChanges)
+        self.fileMenu.add_command(label=TopMenu.LABEL_EVALUATE_XPATH, command=self.onEvaluateXPath)
+        self.fileMenu.add_command(label=TopMenu.LABEL_BULK_EDIT, command=onBulkEdit)
+        self.fileMenu.add_command(label=TopMenu.LABEL_CACHE_STATISTICS, command=self.onShowCacheStatistics)
         self.fileMenu.add_command(label=TopMenu.LABEL_EXIT, command=lambda: (self.onQuit(), root.quit()))
 
         self.menuBar.add_cascade(label="File", menu=self.fileMenu)
+
+        self.applyMods = tkinter.BooleanVar(master=root, value=applyMods)
+        self.modsMenu = tkinter.Menu(self.menuBar,tearoff=False)
+        self.modsMenu.add_checkbutton(label=TopMenu.LABEL_APPLY_MODS, variable=self.applyMods,
+                                      command=lambda: self.onToggleApplyMods(self.applyMods.get()))
+        self.modsMenu.add_command(label=TopMenu.LABEL_RELOAD_MODS, command=onReloadMods)
+        self.modsMenu.add_command(label=TopMenu.LABEL_MOD_REPORT, command=onShowModReport)
+        self.menuBar.add_cascade(label="Mods", menu=self.modsMenu)
+
+        self.isProfiling = tkinter.BooleanVar(master=root, value=False)
+        self.diagnosticsMenu = tkinter.Menu(self.menuBar,tearoff=False)
+        self.diagnosticsMenu.add_command(label=TopMenu.LABEL_LOAD_STATISTICS, command=onShowLoadStatistics)
+        self.diagnosticsMenu.add_checkbutton(label=TopMenu.LABEL_PROFILER, variable=self.isProfiling,
+                                             command=lambda: onToggleProfiler(self.isProfiling.get()))
+        self.menuBar.add_cascade(label="Diagnostics", menu=self.diagnosticsMenu)
         self.disableWriteChangesItem()
 
 
@@ -457,6 +1427,79 @@ class TopMenu:
         self.fileMenu.entryconfigure(label, state=tkinter.NORMAL)
 
 
+class TkLoop:
+    #Drives Tk from inside the asyncio loop. Pending Tk events are handled for at most one frame budget per tick, after
+    #which the other tasks get their turn. With nothing to do it waits until the X display connection is readable or
+    #wake() is called (background tasks changed widgets). A timer backing off up to MAX_TIMER_SLEEP still runs Tk's own
+    #timers, e.g. after callbacks and the blinking cursor. Where the display connection cannot be watched (not X11),
+    #input is polled with that timer backing off only up to MAX_POLL_SLEEP.
+    MIN_IDLE_SLEEP = 0.001
+    MAX_POLL_SLEEP = 0.02
+    MAX_TIMER_SLEEP = 0.1
+    TK_EVENT_FLAGS = _tkinter.ALL_EVENTS | _tkinter.DONT_WAIT
+
+    def __init__(self, *, root: tkinter.Tk, frameBudgetMs: float) -> None:
+        self.root = root
+        self.frameBudget = frameBudgetMs / 1000
+        self.wakeEvent = asyncio.Event()
+
+    def wake(self) -> None:
+        self.wakeEvent.set()
+
+    @staticmethod
+    def getDisplayFileDescriptor(root: tkinter.Tk) -> int:
+        #The X11 connection Tk reads its events from, through Tk's and Xlib's C API. None on other windowing systems
+        #or when the libraries cannot be found.
+        import ctypes
+        import ctypes.util
+        try:
+            if root.tk.call("tk", "windowingsystem") != "x11":
+                return None
+            tk = ctypes.CDLL(_tkinter.__file__) #Resolves through _tkinter's own dependency on libtk
+            tk.Tk_MainWindow.argtypes = (ctypes.c_void_p,)
+            tk.Tk_MainWindow.restype = ctypes.c_void_p
+            mainWindow = tk.Tk_MainWindow(root.tk.interpaddr())
+            if not mainWindow:
+                return None
+            display = ctypes.c_void_p.from_address(mainWindow).value #Tk_Display(): the first field of every Tk window
+            xlib = ctypes.CDLL(ctypes.util.find_library("X11"))
+            xlib.XConnectionNumber.argtypes = (ctypes.c_void_p,)
+            return xlib.XConnectionNumber(display)
+        except (OSError, AttributeError, TypeError, tkinter.TclError):
+            return None
+
+    def processEvents(self) -> bool:
+        deadline = time.perf_counter() + self.frameBudget
+        processedAny = False
+        while self.root.tk.dooneevent(TkLoop.TK_EVENT_FLAGS):
+            processedAny = True
+            if time.perf_counter() >= deadline:
+                break
+        return processedAny
+
+    async def run(self, *, isRunning) -> None:
+        loop = asyncio.get_running_loop()
+        fileDescriptor = TkLoop.getDisplayFileDescriptor(self.root)
+        if fileDescriptor is not None:
+            loop.add_reader(fileDescriptor, self.wake)
+        maxIdleSleep = TkLoop.MAX_POLL_SLEEP if fileDescriptor is None else TkLoop.MAX_TIMER_SLEEP
+        idleSleep = TkLoop.MIN_IDLE_SLEEP
+        try:
+            while isRunning():
+                self.wakeEvent.clear()
+                if self.processEvents():
+                    idleSleep = TkLoop.MIN_IDLE_SLEEP
+                    await asyncio.sleep(0)
+                    continue
+                try:
+                    await asyncio.wait_for(self.wakeEvent.wait(), idleSleep)
+                    idleSleep = TkLoop.MIN_IDLE_SLEEP
+                except asyncio.TimeoutError:
+                    idleSleep = min(idleSleep * 2, maxIdleSleep)
+        finally:
+            if fileDescriptor is not None:
+                loop.remove_reader(fileDescriptor)
+
 class MainController:
     def __init__(self) -> None:
         pass
@@ -464,16 +1507,6 @@ class MainController:
         
         pass
 
-def isReadableFile(filePath) -> bool:
-    return os.path.isfile(filePath) and os.access(filePath, os.R_OK)
-
-def isReadableFolder(folderPath) -> bool:
-    isDir = os.path.isdir(folderPath)
-    accessOk = os.access(folderPath, os.R_OK)
-    return isDir and accessOk 
-
-def isWriteableFolder(folderPath) -> bool:
-    return os.path.isdir(folderPath) and os.access(folderPath, os.W_OK)
 
 async def main():
     gui = XPathModifierGUI()